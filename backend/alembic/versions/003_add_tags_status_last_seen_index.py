@@ -0,0 +1,34 @@
+"""add_tags_status_last_seen_index
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-16
+
+Add composite index on tags (status, last_seen) for the missing-person sweep.
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """
+    Create ix_tags_status_last_seen.
+
+    The sweep asks for "status = 'active' AND last_seen < cutoff", which this
+    index answers with one range scan instead of reading every tag.
+    """
+    op.create_index('ix_tags_status_last_seen', 'tags', ['status', 'last_seen'], unique=False)
+
+
+def downgrade():
+    """
+    Drop ix_tags_status_last_seen.
+    """
+    op.drop_index('ix_tags_status_last_seen', table_name='tags')
@@ -0,0 +1,35 @@
+"""add_untracked_tags_marked_at_index
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-16
+
+Add composite index on untracked_tags (marked_untracked_at, id) for keyset pagination.
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """
+    Create ix_untracked_tags_marked_at_id.
+
+    The untracked page reads "ORDER BY marked_untracked_at DESC, id DESC"
+    from a (marked_untracked_at, id) cursor; a backward scan of this index
+    returns each page without sorting the table.
+    """
+    op.create_index('ix_untracked_tags_marked_at_id', 'untracked_tags', ['marked_untracked_at', 'id'], unique=False)
+
+
+def downgrade():
+    """
+    Drop ix_untracked_tags_marked_at_id.
+    """
+    op.drop_index('ix_untracked_tags_marked_at_id', table_name='untracked_tags')
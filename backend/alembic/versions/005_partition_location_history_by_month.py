@@ -0,0 +1,119 @@
+"""partition_location_history_by_month
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-16
+
+Convert location_history into a table range-partitioned by month on entered_at.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from datetime import datetime, timezone
+
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+# Months created past the current one (the application keeps extending this)
+PARTITIONS_AHEAD = 2
+
+
+def _add_months(value, months):
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def upgrade():
+    """
+    Rebuild location_history as a partitioned table and copy the data over.
+
+    - Primary key becomes (id, entered_at): PostgreSQL requires the partition
+      key in every unique constraint. ids keep coming from one sequence.
+    - One partition per month (location_history_YYYY_MM) from the oldest
+      visit up to PARTITIONS_AHEAD months from now, plus
+      location_history_default for anything outside those ranges.
+    - ix_location_history_tag_entered is recreated on the parent (and so on
+      every partition); the separate index on id is dropped, the primary
+      key covers it.
+
+    Takes an exclusive lock on location_history for the duration of the copy.
+    """
+    op.execute("ALTER TABLE location_history RENAME TO location_history_unpartitioned")
+    op.execute("ALTER INDEX location_history_pkey RENAME TO location_history_unpartitioned_pkey")
+    op.execute("ALTER INDEX ix_location_history_tag_entered RENAME TO ix_location_history_unpartitioned_tag_entered")
+    op.execute("ALTER SEQUENCE location_history_id_seq RENAME TO location_history_unpartitioned_id_seq")
+    op.execute("DROP INDEX IF EXISTS ix_location_history_id")
+
+    op.create_table(
+        'location_history',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('tag_id', sa.String(), nullable=False, comment='Foreign key to tags table'),
+        sa.Column('room_id', sa.Integer(), nullable=True, comment='Room where tag was located (nullable if room is deleted)'),
+        sa.Column('entered_at', sa.DateTime(timezone=True), nullable=False, comment='Timestamp when tag entered this room (partition key)'),
+        sa.Column('exited_at', sa.DateTime(timezone=True), nullable=True, comment='Timestamp when tag exited this room (NULL if still in room)'),
+        sa.PrimaryKeyConstraint('id', 'entered_at'),
+        sa.ForeignKeyConstraint(['tag_id'], ['tags.tag_id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['room_id'], ['rooms.id'], ondelete='SET NULL'),
+        postgresql_partition_by='RANGE (entered_at)'
+    )
+
+    oldest = op.get_bind().execute(sa.text("SELECT min(entered_at) FROM location_history_unpartitioned")).scalar()
+    now = datetime.now(timezone.utc)
+    month = _add_months((oldest or now).astimezone(timezone.utc), 0)
+    last = _add_months(now, PARTITIONS_AHEAD)
+    while month <= last:
+        upper = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE location_history_{month.year:04d}_{month.month:02d} PARTITION OF location_history "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+        month = upper
+    op.execute("CREATE TABLE location_history_default PARTITION OF location_history DEFAULT")
+
+    op.execute(
+        "INSERT INTO location_history (id, tag_id, room_id, entered_at, exited_at) "
+        "SELECT id, tag_id, room_id, entered_at, exited_at FROM location_history_unpartitioned"
+    )
+    op.execute(
+        "SELECT setval('location_history_id_seq', "
+        "COALESCE((SELECT max(id) FROM location_history), 0) + 1, false)"
+    )
+    op.create_index('ix_location_history_tag_entered', 'location_history', ['tag_id', 'entered_at'], unique=False)
+    op.drop_table('location_history_unpartitioned')
+
+
+def downgrade():
+    """
+    Copy location_history back into a single heap table (primary key id).
+    """
+    op.execute("ALTER TABLE location_history RENAME TO location_history_partitioned")
+    op.execute("ALTER INDEX location_history_pkey RENAME TO location_history_partitioned_pkey")
+    op.execute("ALTER INDEX ix_location_history_tag_entered RENAME TO ix_location_history_partitioned_tag_entered")
+    op.execute("ALTER SEQUENCE location_history_id_seq RENAME TO location_history_partitioned_id_seq")
+
+    op.create_table(
+        'location_history',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('tag_id', sa.String(), nullable=False, comment='Foreign key to tags table'),
+        sa.Column('room_id', sa.Integer(), nullable=True, comment='Room where tag was located (nullable if room is deleted)'),
+        sa.Column('entered_at', sa.DateTime(timezone=True), nullable=False, comment='Timestamp when tag entered this room'),
+        sa.Column('exited_at', sa.DateTime(timezone=True), nullable=True, comment='Timestamp when tag exited this room (NULL if still in room)'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.ForeignKeyConstraint(['tag_id'], ['tags.tag_id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['room_id'], ['rooms.id'], ondelete='SET NULL')
+    )
+    op.execute(
+        "INSERT INTO location_history (id, tag_id, room_id, entered_at, exited_at) "
+        "SELECT id, tag_id, room_id, entered_at, exited_at FROM location_history_partitioned"
+    )
+    op.execute(
+        "SELECT setval('location_history_id_seq', "
+        "COALESCE((SELECT max(id) FROM location_history), 0) + 1, false)"
+    )
+    op.create_index('ix_location_history_id', 'location_history', ['id'], unique=False)
+    op.create_index('ix_location_history_tag_entered', 'location_history', ['tag_id', 'entered_at'], unique=False)
+    op.drop_table('location_history_partitioned')
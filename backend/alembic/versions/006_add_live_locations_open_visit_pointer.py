@@ -0,0 +1,70 @@
+"""add_live_locations_open_visit_pointer
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-17
+
+Point each live_locations row at its tag's open location_history row.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """
+    Add open_history_id/open_entered_at and backfill them.
+
+    The pointer is the open visit's primary key (id, entered_at), so closing
+    a visit no longer searches the tag's history for exited_at IS NULL. No
+    foreign key: history partitions are dropped whole by retention.
+
+    Backfill takes each tag's latest open visit. Older open visits of the
+    same tag (left behind by earlier bugs or crashes) are closed at the
+    moment the latest one began, so at most one visit per tag stays open.
+    """
+    op.add_column('live_locations', sa.Column(
+        'open_history_id', sa.Integer(), nullable=True,
+        comment='id of the open location_history row (NULL if no visit is open)'
+    ))
+    op.add_column('live_locations', sa.Column(
+        'open_entered_at', sa.DateTime(timezone=True), nullable=True,
+        comment='entered_at of the open location_history row (completes its primary key)'
+    ))
+
+    op.execute("""
+        CREATE TEMPORARY TABLE latest_open_visit ON COMMIT DROP AS
+        SELECT DISTINCT ON (tag_id) tag_id, id, entered_at
+        FROM location_history
+        WHERE exited_at IS NULL
+        ORDER BY tag_id, entered_at DESC, id DESC
+    """)
+    op.execute("""
+        UPDATE live_locations l
+        SET open_history_id = v.id, open_entered_at = v.entered_at
+        FROM latest_open_visit v
+        WHERE v.tag_id = l.tag_id
+    """)
+    op.execute("""
+        UPDATE location_history h
+        SET exited_at = v.entered_at
+        FROM latest_open_visit v
+        WHERE h.tag_id = v.tag_id
+          AND h.exited_at IS NULL
+          AND h.id <> v.id
+    """)
+
+
+def downgrade():
+    """
+    Drop the open-visit pointer.
+    """
+    op.drop_column('live_locations', 'open_entered_at')
+    op.drop_column('live_locations', 'open_history_id')
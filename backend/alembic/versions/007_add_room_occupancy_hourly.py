@@ -0,0 +1,49 @@
+"""add_room_occupancy_hourly
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-17
+
+Add room_occupancy_hourly, the hourly per-room rollup of location_history.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """
+    Create room_occupancy_hourly.
+
+    The table starts empty and fills as visits close; run
+    scripts/backfill_room_rollup.py once to add the existing history.
+    """
+    op.create_table(
+        'room_occupancy_hourly',
+        sa.Column('room_id', sa.Integer(), nullable=False, comment='Room (rollup rows are deleted with the room)'),
+        sa.Column('hour_start', sa.DateTime(timezone=True), nullable=False, comment='Start of the UTC hour bucket'),
+        sa.Column('visits', sa.Integer(), nullable=False, comment='Closed visits that started in this hour'),
+        sa.Column('distinct_tags', sa.Integer(), nullable=False, comment='Different tags with a closed visit in this hour'),
+        sa.Column('dwell_seconds', sa.Float(), nullable=False, comment='Time spent in the room during this hour, summed over closed visits'),
+        sa.Column('peak_occupancy', sa.Integer(), nullable=False, comment='Most tags in the room at once during this hour'),
+        sa.PrimaryKeyConstraint('room_id', 'hour_start'),
+        sa.ForeignKeyConstraint(['room_id'], ['rooms.id'], ondelete='CASCADE')
+    )
+
+    # Dashboards read time ranges across many rooms
+    op.create_index('ix_room_occupancy_hourly_hour_start', 'room_occupancy_hourly', ['hour_start'], unique=False)
+
+
+def downgrade():
+    """
+    Drop room_occupancy_hourly.
+    """
+    op.drop_index('ix_room_occupancy_hourly_hour_start', table_name='room_occupancy_hourly')
+    op.drop_table('room_occupancy_hourly')
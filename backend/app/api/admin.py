@@ -0,0 +1,46 @@
+"""
+Admin/diagnostic endpoints.
+"""
+from fastapi import APIRouter
+
+from app.schemas.admin import RoomCacheStats
+from app.services.room_cache import room_cache
+
+router = APIRouter()
+
+
+def _room_cache_stats() -> RoomCacheStats:
+    stats = room_cache.stats()
+    return RoomCacheStats(
+        hits=stats["hits"],
+        misses=stats["misses"],
+        negativeHits=stats["negative_hits"],
+        evictions=stats["evictions"],
+        reloads=stats["reloads"],
+        hitRatio=stats["hit_ratio"],
+        rooms=stats["rooms"],
+        negativeEntries=stats["negative_entries"],
+        snapshotAgeSeconds=stats["snapshot_age_seconds"],
+        positiveTtlSeconds=stats["positive_ttl_seconds"],
+        negativeTtlSeconds=stats["negative_ttl_seconds"],
+        negativeMaxsize=stats["negative_maxsize"]
+    )
+
+
+@router.get("/room-cache", response_model=RoomCacheStats)
+async def get_room_cache_stats():
+    """
+    Get room cache hit/miss/eviction counters.
+
+    Use these to tune ROOM_CACHE_* settings.
+    """
+    return _room_cache_stats()
+
+
+@router.post("/room-cache/reset-stats", response_model=RoomCacheStats)
+async def reset_room_cache_stats():
+    """
+    Reset room cache counters (e.g., before a load test).
+    """
+    room_cache.reset_stats()
+    return _room_cache_stats()
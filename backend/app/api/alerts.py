@@ -0,0 +1,37 @@
+"""
+Alert endpoints - currently open missing-person episodes.
+"""
+from fastapi import APIRouter
+from datetime import datetime, timezone
+
+from app.schemas.alert import MissingPersonEpisodesResponse, MissingPersonEpisodeItem
+from app.services.location_index import location_index
+from app.services.missing_person_detector import missing_person_detector
+
+router = APIRouter()
+
+
+@router.get("/missing-persons", response_model=MissingPersonEpisodesResponse)
+async def get_missing_persons():
+    """
+    Get open missing-person episodes (raised and not yet cleared), longest missing first.
+
+    Served from the detector's in-memory episode state (no database query).
+    """
+    now = datetime.now(timezone.utc)
+    episodes = []
+
+    for episode in missing_person_detector.open_episodes():
+        location = location_index.get(episode.room_id)
+        episodes.append(MissingPersonEpisodeItem(
+            tagId=episode.tag_id,
+            userName=episode.user_name or "Unknown",
+            lastRoom=episode.room_name,
+            fullLocation=location.full_location if location else None,
+            lastSeen=episode.last_seen,
+            raisedAt=episode.raised_at,
+            checkedAt=episode.checked_at,
+            missingDurationSeconds=int((now - episode.last_seen).total_seconds())
+        ))
+
+    return MissingPersonEpisodesResponse(episodes=episodes, total=len(episodes))
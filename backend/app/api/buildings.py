@@ -7,6 +7,10 @@ from typing import List
 
 from app.schemas.building import Building, BuildingCreate, BuildingUpdate
 from app.models.building import Building as BuildingModel
+from app.services.room_cache import room_cache
+from app.services.location_index import location_index
+from app.services.tag_state import tag_state_store
+from app.services.cache_invalidation import LOCATIONS, cache_invalidation
 from app.api.deps import get_db
 
 router = APIRouter()
@@ -50,6 +54,10 @@ async def update_building(building_id: int, building_update: BuildingUpdate, db:
 
     db.commit()
     db.refresh(building)
+
+    # Building name is part of each room's fullLocation
+    location_index.refresh(db, building_id=building_id)
+    await cache_invalidation.publish(LOCATIONS)
     return building
 
 
@@ -60,6 +68,13 @@ async def delete_building(building_id: int, db: Session = Depends(get_db)):
     if not building:
         raise HTTPException(status_code=404, detail="Building not found")
 
+    room_ids = set(location_index.room_ids(building_id=building_id))
     db.delete(building)
     db.commit()
+
+    # Rooms in this building were deleted with it
+    room_cache.reload(db)
+    location_index.remove(building_id=building_id)
+    tag_state_store.forget_rooms(room_ids)
+    await cache_invalidation.publish(LOCATIONS)
     return None
@@ -1,23 +1,38 @@
 """
-Dashboard statistics endpoint.
+Dashboard statistics and room occupancy endpoints.
 """
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
 
-from app.schemas.dashboard import DashboardStats
+from app.schemas.dashboard import (
+    DashboardStats,
+    RoomOccupancyHour,
+    RoomOccupancyHourlyResponse,
+    RoomOccupancySummary,
+    RoomOccupancySummaryResponse
+)
 from app.models.user import User
 from app.models.building import Building
 from app.models.room import Room
 from app.models.anchor import Anchor
 from app.models.tag import Tag
+from app.models.room_occupancy_hourly import RoomOccupancyHourly
+from app.services.location_index import location_index
 from app.utils.enums import TagStatus
-from app.api.deps import get_db
+from app.utils.timestamps import as_utc
+from app.api.deps import get_async_db
 
 router = APIRouter()
 
+# Default occupancy range: the last day
+OCCUPANCY_DEFAULT_RANGE = timedelta(hours=24)
+
 
 @router.get("/stats", response_model=DashboardStats)
-async def get_dashboard_stats(db: Session = Depends(get_db)):
+async def get_dashboard_stats(db: AsyncSession = Depends(get_async_db)):
     """
     Get dashboard statistics.
 
@@ -28,12 +43,144 @@ async def get_dashboard_stats(db: Session = Depends(get_db)):
     - totalDevices: Count of all anchors
     - activeTags: Count of tags with status='active'
     - offlineTags: Count of tags with status='offline'
+
+    All counts are fetched in one round-trip (scalar subqueries).
     """
+    result = await db.execute(select(
+        select(func.count()).select_from(User).scalar_subquery().label("total_users"),
+        select(func.count()).select_from(Building).scalar_subquery().label("total_buildings"),
+        select(func.count()).select_from(Room).scalar_subquery().label("total_rooms"),
+        select(func.count()).select_from(Anchor).scalar_subquery().label("total_devices"),
+        select(func.count()).select_from(Tag).where(Tag.status == TagStatus.active).scalar_subquery().label("active_tags"),
+        select(func.count()).select_from(Tag).where(Tag.status == TagStatus.offline).scalar_subquery().label("offline_tags")
+    ))
+    counts = result.one()
+
     return DashboardStats(
-        totalUsers=db.query(User).count(),
-        totalBuildings=db.query(Building).count(),
-        totalRooms=db.query(Room).count(),
-        totalDevices=db.query(Anchor).count(),
-        activeTags=db.query(Tag).filter(Tag.status == TagStatus.active).count(),
-        offlineTags=db.query(Tag).filter(Tag.status == TagStatus.offline).count()
+        totalUsers=counts.total_users,
+        totalBuildings=counts.total_buildings,
+        totalRooms=counts.total_rooms,
+        totalDevices=counts.total_devices,
+        activeTags=counts.active_tags,
+        offlineTags=counts.offline_tags
     )
+
+
+def _occupancy_filters(building_id: Optional[int], floor_id: Optional[int], room_id: Optional[int],
+                       hour_from: Optional[datetime], hour_to: Optional[datetime]) -> Tuple[list, datetime, datetime]:
+    """
+    WHERE clauses for a rollup query, and the resolved range.
+
+    Raises:
+        HTTPException: 400 if the range is empty
+    """
+    # Buckets are UTC hours; timestamps without an offset are taken as UTC
+    hour_to = as_utc(hour_to) or datetime.now(timezone.utc)
+    hour_from = as_utc(hour_from) or hour_to - OCCUPANCY_DEFAULT_RANGE
+    if hour_from >= hour_to:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+
+    filters = [
+        RoomOccupancyHourly.hour_start >= hour_from,
+        RoomOccupancyHourly.hour_start < hour_to
+    ]
+    if building_id is not None or floor_id is not None:
+        filters.append(RoomOccupancyHourly.room_id.in_(
+            location_index.room_ids(floor_id=floor_id, building_id=building_id)
+        ))
+    if room_id is not None:
+        filters.append(RoomOccupancyHourly.room_id == room_id)
+    return filters, hour_from, hour_to
+
+
+def _room_fields(room_id: int) -> dict:
+    """Room name, building and floor number from the location index."""
+    location = location_index.get(room_id)
+    return {
+        "roomId": room_id,
+        "roomName": location.room_name if location else None,
+        "building": location.building_name if location else None,
+        "floor": location.floor_number if location else None
+    }
+
+
+@router.get("/occupancy/hourly", response_model=RoomOccupancyHourlyResponse)
+async def get_hourly_occupancy(
+    building_id: Optional[int] = Query(None, description="Filter by building ID"),
+    floor_id: Optional[int] = Query(None, description="Filter by floor ID"),
+    room_id: Optional[int] = Query(None, description="Filter by room ID"),
+    hour_from: Optional[datetime] = Query(None, alias="from", description="Hours starting at or after (default: to - 24h)"),
+    hour_to: Optional[datetime] = Query(None, alias="to", description="Hours starting before (default: now)"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Hourly occupancy per room, from the room_occupancy_hourly rollup.
+
+    Rows are ordered by hour, then room. Room-hours without any visit or
+    occupancy have no row. Read from the rollup (one index range scan on
+    hour_start), never from location_history.
+    """
+    filters, _, _ = _occupancy_filters(building_id, floor_id, room_id, hour_from, hour_to)
+    result = await db.execute(
+        select(RoomOccupancyHourly).where(*filters).order_by(
+            RoomOccupancyHourly.hour_start,
+            RoomOccupancyHourly.room_id
+        )
+    )
+
+    items: List[RoomOccupancyHour] = [
+        RoomOccupancyHour(
+            **_room_fields(row.room_id),
+            hourStart=row.hour_start,
+            visits=row.visits,
+            distinctTags=row.distinct_tags,
+            dwellSeconds=row.dwell_seconds,
+            peakOccupancy=row.peak_occupancy
+        )
+        for row in result.scalars()
+    ]
+    return RoomOccupancyHourlyResponse(items=items, total=len(items))
+
+
+@router.get("/occupancy/rooms", response_model=RoomOccupancySummaryResponse)
+async def get_room_occupancy(
+    building_id: Optional[int] = Query(None, description="Filter by building ID"),
+    floor_id: Optional[int] = Query(None, description="Filter by floor ID"),
+    room_id: Optional[int] = Query(None, description="Filter by room ID"),
+    hour_from: Optional[datetime] = Query(None, alias="from", description="Hours starting at or after (default: to - 24h)"),
+    hour_to: Optional[datetime] = Query(None, alias="to", description="Hours starting before (default: now)"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Occupancy totals per room over a time range, from the rollup.
+
+    Returns visits, dwell time, average occupancy (dwell time divided by the
+    range length) and the highest hourly peak, busiest rooms (by dwell time)
+    first. Distinct tags are not additive across hours and are only
+    available per hour.
+    """
+    filters, hour_from, hour_to = _occupancy_filters(building_id, floor_id, room_id, hour_from, hour_to)
+    dwell = func.sum(RoomOccupancyHourly.dwell_seconds).label("dwell_seconds")
+    result = await db.execute(
+        select(
+            RoomOccupancyHourly.room_id,
+            func.sum(RoomOccupancyHourly.visits).label("visits"),
+            dwell,
+            func.max(RoomOccupancyHourly.peak_occupancy).label("peak_occupancy")
+        ).where(*filters).group_by(
+            RoomOccupancyHourly.room_id
+        ).order_by(dwell.desc(), RoomOccupancyHourly.room_id)
+    )
+
+    range_seconds = (hour_to - hour_from).total_seconds()
+    items: List[RoomOccupancySummary] = [
+        RoomOccupancySummary(
+            **_room_fields(row.room_id),
+            visits=row.visits,
+            dwellSeconds=row.dwell_seconds,
+            averageOccupancy=round(row.dwell_seconds / range_seconds, 3),
+            peakOccupancy=row.peak_occupancy
+        )
+        for row in result
+    ]
+    return RoomOccupancySummaryResponse(items=items, total=len(items))
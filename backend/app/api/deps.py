@@ -1,7 +1,12 @@
 """
 Dependency injection functions for API routes.
 """
-from app.database import SessionLocal
+from fastapi import HTTPException, Query
+from datetime import datetime
+from typing import Optional, Tuple
+
+from app.database import SessionLocal, AsyncSessionLocal
+from app.utils.cursor import decode_cursor
 
 
 def get_db():
@@ -20,3 +25,39 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """
+    Dependency for async database session (asyncpg).
+
+    Use in handlers on hot paths so queries do not block the event loop.
+
+    Usage in route:
+        @router.get("/items")
+        async def get_items(db: AsyncSession = Depends(get_async_db)):
+            result = await db.execute(select(Item))
+            return result.scalars().all()
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def get_cursor(
+    cursor: Optional[str] = Query(None, description="Keyset cursor: next_cursor of the previous page")
+) -> Optional[Tuple[datetime, int]]:
+    """
+    Dependency for keyset-paginated endpoints over (timestamp, id).
+
+    Returns:
+        (timestamp, id) of the last row of the previous page, or None for the first page
+
+    Raises:
+        HTTPException: 400 if the cursor is malformed
+    """
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
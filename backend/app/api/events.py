@@ -3,20 +3,19 @@ Event ingestion endpoint - receives location events from Python MQTT service.
 CRITICAL: This is the main entry point for all location data.
 """
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
 
-from app.schemas.location import LocationEvent, LocationEventResponse
-from app.services.location_service import location_service
-from app.api.deps import get_db
+from app.config import settings
+from app.schemas.location import LocationEvent, LocationEventResponse, LocationEventBatchResponse
+from app.services.event_dispatcher import event_dispatcher
+from app.api.deps import get_async_db
 
 router = APIRouter()
 
 
 @router.post("/location-event", response_model=LocationEventResponse)
-async def ingest_location_event(
-    event: LocationEvent,
-    db: Session = Depends(get_db)
-):
+async def ingest_location_event(event: LocationEvent):
     """
     Ingest location event from Python MQTT service.
 
@@ -25,9 +24,12 @@ async def ingest_location_event(
     - INITIAL_LOCATION: First time seeing tag
     - TAG_LOST: Tag not seen for X seconds
 
+    The event is queued on its tag's dispatcher worker, so events for one
+    tag are applied one at a time in order. An event older than the last
+    applied event for the tag is not applied (status 'rejected').
+
     Args:
         event: Location event data
-        db: Database session
 
     Returns:
         LocationEventResponse with status and message
@@ -36,7 +38,7 @@ async def ingest_location_event(
         HTTPException: If event processing fails
     """
     try:
-        result = await location_service.process_event(db, event)
+        result = await event_dispatcher.submit(event)
         return LocationEventResponse(
             status=result["status"],
             message=result["message"],
@@ -46,3 +48,49 @@ async def ingest_location_event(
         raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+@router.post("/location-event/batch", response_model=LocationEventBatchResponse)
+async def ingest_location_events_batch(
+    events: List[LocationEvent],
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Ingest a batch of location events in a single transaction.
+
+    Use this instead of /location-event when many tags move at once
+    (e.g. shift change): all events share one commit and each table is
+    written with one bulk statement. The batch is ordered with events
+    queued on /location-event for the same tags (it waits for earlier ones,
+    later ones wait for it). Events older than the last applied event for
+    their tag are rejected, as on /location-event.
+
+    Args:
+        events: Array of location events (same format as /location-event)
+        db: Async database session
+
+    Returns:
+        LocationEventBatchResponse with one result per event (in request order)
+        plus processed/failed counts. Events with status 'error' can be retried.
+
+    Raises:
+        HTTPException: If the batch exceeds EVENT_BATCH_MAX_SIZE
+    """
+    if len(events) > settings.EVENT_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(events)} events (max {settings.EVENT_BATCH_MAX_SIZE})"
+        )
+
+    results = await event_dispatcher.submit_batch(db, events)
+    responses = [
+        LocationEventResponse(status=result["status"], message=result["message"], tag_id=event.tag_id)
+        for event, result in zip(events, results)
+    ]
+    failed = sum(1 for response in responses if response.status != "success")
+
+    return LocationEventBatchResponse(
+        results=responses,
+        processed=len(responses) - failed,
+        failed=failed
+    )
@@ -7,6 +7,10 @@ from typing import List, Optional
 
 from app.schemas.floor import Floor, FloorCreate, FloorUpdate
 from app.models.floor import Floor as FloorModel
+from app.services.room_cache import room_cache
+from app.services.location_index import location_index
+from app.services.tag_state import tag_state_store
+from app.services.cache_invalidation import LOCATIONS, cache_invalidation
 from app.api.deps import get_db
 
 router = APIRouter()
@@ -56,6 +60,11 @@ async def update_floor(floor_id: int, floor_update: FloorUpdate, db: Session = D
 
     db.commit()
     db.refresh(floor)
+
+    # Rooms on this floor may have moved to another building or floor number
+    room_cache.reload(db)
+    location_index.refresh(db, floor_id=floor_id)
+    await cache_invalidation.publish(LOCATIONS)
     return floor
 
 
@@ -66,6 +75,13 @@ async def delete_floor(floor_id: int, db: Session = Depends(get_db)):
     if not floor:
         raise HTTPException(status_code=404, detail="Floor not found")
 
+    room_ids = set(location_index.room_ids(floor_id=floor_id))
     db.delete(floor)
     db.commit()
+
+    # Rooms on this floor were deleted with it
+    room_cache.reload(db)
+    location_index.remove(floor_id=floor_id)
+    tag_state_store.forget_rooms(room_ids)
+    await cache_invalidation.publish(LOCATIONS)
     return None
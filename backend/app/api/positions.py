@@ -2,93 +2,116 @@
 Live positions endpoint - provides current location for all active tags.
 CRITICAL: This is queried frequently by the frontend.
 """
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from datetime import datetime, timezone
-
-from app.schemas.live_position import LivePositionsResponse, LivePositionItem, LivePositionStats
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import Response
+from sqlalchemy import Integer, cast, extract, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+from typing import Optional, Tuple
+
+from app.schemas.live_position import LivePositionsResponse, LivePositionItem
 from app.schemas.untracked_tag import UntrackedTagsResponse, UntrackedTagItem
-from app.models.tag import Tag
-from app.models.live_location import LiveLocation
-from app.models.user import User
-from app.models.room import Room
-from app.models.floor import Floor
-from app.models.building import Building
 from app.models.untracked_tag import UntrackedTag
+from app.services.live_view import LiveFilter, live_view
+from app.services.location_index import location_index
 from app.utils.enums import TagStatus
-from app.api.deps import get_db
+from app.utils.cursor import encode_cursor
+from app.utils.json_encoding import encode_json
+from app.api.deps import get_async_db, get_cursor
 
 router = APIRouter()
 
+# Page sizes when the client does not pass limit
+LIVE_PAGE_SIZE = 500
+UNTRACKED_PAGE_SIZE = 100
+
+# Largest pages a client may request
+LIVE_PAGE_MAX = 5000
+UNTRACKED_PAGE_MAX = 1000
+
 
 @router.get("/live", response_model=LivePositionsResponse)
-async def get_live_positions(db: Session = Depends(get_db)):
+async def get_live_positions(
+    since: Optional[int] = None,
+    epoch: Optional[str] = None,
+    building_id: Optional[int] = Query(None, description="Filter by building ID"),
+    floor_id: Optional[int] = Query(None, description="Filter by floor ID"),
+    room_id: Optional[int] = Query(None, description="Filter by room ID"),
+    role: Optional[str] = Query(None, description="Filter by assigned user's role"),
+    status: TagStatus = Query(TagStatus.active, description="Filter by tag status"),
+    after: Optional[str] = Query(None, description="Keyset cursor: nextCursor of the previous page"),
+    limit: int = Query(LIVE_PAGE_SIZE, ge=1, le=LIVE_PAGE_MAX, description="Page size"),
+    export: bool = Query(False, description="Return every matching position in one response (ignores limit)"),
+    fields: Optional[str] = Query(None, description="Comma-separated item fields to return")
+):
     """
     Get live positions for all active tags.
 
     Returns:
     - positions: List of users with current locations
-    - stats: trackedUsers, roomsDetected
-
-    Note: Only includes tags with assigned users and status='active'.
+    - stats: trackedUsers, roomsDetected (hospital-wide, not filtered)
+    - version/epoch: live-state version to poll from next time
+    - nextCursor: pass as after= for the next page (null on the last page)
+
+    Filters (building_id, floor_id, room_id, role, status) and the optional
+    fields projection (e.g. fields=handbandSerial,fullLocation) are applied
+    server-side. Pages are ordered by handbandSerial and hold LIVE_PAGE_SIZE
+    (500) positions unless limit says otherwise; export=true returns them all.
+
+    With since=<version> and the epoch it came from, only positions that
+    changed after that version are returned (full=false, not paginated),
+    plus the tag ids that were removed or no longer match the filters. If
+    the version is unknown to this server (restart, other worker, too old)
+    the full list is returned.
+
+    Note: Only includes tags with assigned users (status='active' by default).
+    Served from the in-memory live view: no database query, and each
+    position is pre-encoded JSON that only changes when its tag does.
     """
-    # Query active tags with assigned users and live locations
-    # Add joins to Floor and Building for full hierarchy
-    query = db.query(
-        Tag, LiveLocation, User, Room, Floor, Building
-    ).join(
-        LiveLocation, Tag.tag_id == LiveLocation.tag_id
-    ).outerjoin(
-        User, Tag.assigned_user_id == User.user_id
-    ).outerjoin(
-        Room, LiveLocation.room_id == Room.id
-    ).outerjoin(
-        Floor, Room.floor_id == Floor.id
-    ).outerjoin(
-        Building, Floor.building_id == Building.id
-    ).filter(
-        Tag.status == TagStatus.active
-    ).all()
-
-    positions = []
-    unique_rooms = set()
-
-    for tag, live_loc, user, room, floor, building in query:
-        if user:  # Only include tags with assigned users
-            # Build fullLocation string: "Building > Floor N > Room"
-            full_location = None
-            building_name = None
-            floor_number = None
-
-            if room and floor and building:
-                full_location = f"{building.name} > Floor {floor.floor_number} > {room.room_name}"
-                building_name = building.name
-                floor_number = floor.floor_number
-
-            positions.append(LivePositionItem(
-                id=user.user_id,
-                userName=user.name,
-                handbandSerial=tag.tag_id,
-                lastSeenRoom=room.room_name if room else None,
-                building=building_name,
-                floor=floor_number,
-                fullLocation=full_location,
-                lastRSSI=None,  # Backend doesn't store RSSI
-                updatedAt=live_loc.updated_at.strftime("%b %d, %Y, %I:%M:%S %p")
-            ))
-            if room:
-                unique_rooms.add(room.room_name)
-
-    stats = LivePositionStats(
-        trackedUsers=len(positions),
-        roomsDetected=len(unique_rooms)
+    projection = None
+    if fields:
+        projection = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [field for field in projection if field not in LivePositionItem.model_fields]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    live_filter = LiveFilter(
+        building_id=building_id, floor_id=floor_id, room_id=room_id, role=role, status=status
     )
 
-    return LivePositionsResponse(positions=positions, stats=stats)
+    # Version first: a change racing with the read is re-sent on the next poll
+    version = live_view.version
+    delta = None
+    if since is not None and epoch == live_view.epoch:
+        delta = live_view.delta(since, live_filter, projection)
+    if delta is None:
+        frames, next_cursor = live_view.frames(live_filter, after, None if export else limit, projection)
+        removed, full = [], True
+    else:
+        (frames, removed), next_cursor, full = delta, None, False
+
+    head = encode_json({
+        "stats": live_view.stats(),
+        "version": version,
+        "epoch": live_view.epoch,
+        "full": full,
+        "removed": removed,
+        "nextCursor": next_cursor
+    })
+    body = '{"positions":[' + ",".join(frames) + "]," + head[1:]
+    return Response(content=body, media_type="application/json")
 
 
 @router.get("/untracked", response_model=UntrackedTagsResponse)
-async def get_untracked_users(db: Session = Depends(get_db)):
+async def get_untracked_users(
+    building_id: Optional[int] = Query(None, description="Filter by building of the last known room"),
+    floor_id: Optional[int] = Query(None, description="Filter by floor of the last known room"),
+    user_id: Optional[str] = Query(None, description="Filter by user"),
+    cursor: Optional[Tuple[datetime, int]] = Depends(get_cursor),
+    limit: int = Query(UNTRACKED_PAGE_SIZE, ge=1, le=UNTRACKED_PAGE_MAX, description="Page size"),
+    export: bool = Query(False, description="Return every matching row in one response (ignores limit)"),
+    db: AsyncSession = Depends(get_async_db)
+):
     """
     Get all untracked/missing tags.
 
@@ -98,54 +121,82 @@ async def get_untracked_users(db: Session = Depends(get_db)):
     - User information (if assigned)
     - Duration since marked as lost
 
-    Ordered by most recently marked as untracked first.
+    Ordered by most recently marked as untracked first, paginated by the
+    (marked_untracked_at, id) keyset (ix_untracked_tags_marked_at_id);
+    pages hold UNTRACKED_PAGE_SIZE (100) rows unless limit says otherwise,
+    export=true returns every row.
+    Durations and display timestamps are computed by the database; total
+    counts every row matching the filters, not just this page.
     """
-    # Query untracked tags with room, floor, and building information
-    query = db.query(
-        UntrackedTag, Room, Floor, Building
-    ).outerjoin(
-        Room, UntrackedTag.last_room_id == Room.id
-    ).outerjoin(
-        Floor, Room.floor_id == Floor.id
-    ).outerjoin(
-        Building, Floor.building_id == Building.id
-    ).order_by(
-        UntrackedTag.marked_untracked_at.desc()
-    ).all()
-
+    filters = []
+    if building_id is not None or floor_id is not None:
+        filters.append(UntrackedTag.last_room_id.in_(
+            location_index.room_ids(floor_id=floor_id, building_id=building_id)
+        ))
+    if user_id is not None:
+        filters.append(UntrackedTag.user_id == user_id)
+
+    query = select(
+        UntrackedTag.id,
+        UntrackedTag.tag_id,
+        UntrackedTag.user_id,
+        UntrackedTag.user_name,
+        UntrackedTag.last_room_id,
+        UntrackedTag.last_room_name,
+        UntrackedTag.marked_untracked_at,
+        _display_timestamp(UntrackedTag.last_seen_at).label("last_seen_display"),
+        _display_timestamp(UntrackedTag.marked_untracked_at).label("marked_display"),
+        cast(
+            func.floor(extract("epoch", func.now() - UntrackedTag.marked_untracked_at) / 60), Integer
+        ).label("duration_lost_minutes")
+    ).where(*filters).order_by(
+        UntrackedTag.marked_untracked_at.desc(),
+        UntrackedTag.id.desc()
+    )
+    if cursor is not None:
+        marked_at, last_id = cursor
+        query = query.where(tuple_(UntrackedTag.marked_untracked_at, UntrackedTag.id) < tuple_(marked_at, last_id))
+    if export:
+        limit = None
+    else:
+        query = query.limit(limit + 1)  # One extra row tells us whether there is a next page
+
+    rows = (await db.execute(query)).all()
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].marked_untracked_at, rows[-1].id)
+
+    total = (await db.execute(
+        select(func.count()).select_from(UntrackedTag).where(*filters)
+    )).scalar_one()
+
+    # Building/floor come from the in-memory location index
     untracked_tags = []
-
-    for untracked, room, floor, building in query:
-        # Build full location string
-        full_location = None
-        building_name = None
-        floor_number = None
-
-        if room and floor and building:
-            full_location = f"{building.name} > Floor {floor.floor_number} > {room.room_name}"
-            building_name = building.name
-            floor_number = floor.floor_number
-
-        # Calculate duration lost in minutes
-        now = datetime.now(timezone.utc)
-        duration_lost = now - untracked.marked_untracked_at
-        duration_lost_minutes = int(duration_lost.total_seconds() / 60)
-
+    for row in rows:
+        location = location_index.get(row.last_room_id)
         untracked_tags.append(UntrackedTagItem(
-            id=untracked.id,
-            tag_id=untracked.tag_id,
-            user_id=untracked.user_id,
-            user_name=untracked.user_name or "Unknown",
-            last_room_name=untracked.last_room_name,
-            building=building_name,
-            floor=floor_number,
-            full_location=full_location,
-            last_seen_at=untracked.last_seen_at.strftime("%b %d, %Y, %I:%M:%S %p"),
-            marked_untracked_at=untracked.marked_untracked_at.strftime("%b %d, %Y, %I:%M:%S %p"),
-            duration_lost_minutes=duration_lost_minutes
+            id=row.id,
+            tag_id=row.tag_id,
+            user_id=row.user_id,
+            user_name=row.user_name or "Unknown",
+            last_room_name=row.last_room_name,
+            building=location.building_name if location else None,
+            floor=location.floor_number if location else None,
+            full_location=location.full_location if location else None,
+            last_seen_at=row.last_seen_display,
+            marked_untracked_at=row.marked_display,
+            duration_lost_minutes=row.duration_lost_minutes
         ))
 
     return UntrackedTagsResponse(
         untracked_tags=untracked_tags,
-        total=len(untracked_tags)
+        total=total,
+        next_cursor=next_cursor
     )
+
+
+def _display_timestamp(column):
+    """SQL equivalent of strftime("%b %d, %Y, %I:%M:%S %p") on the UTC value."""
+    return func.to_char(func.timezone("UTC", column), "Mon DD, YYYY, HH12:MI:SS AM")
+
@@ -8,6 +8,9 @@ from typing import List, Optional
 from app.schemas.room import Room, RoomCreate, RoomUpdate
 from app.models.room import Room as RoomModel
 from app.services.room_cache import room_cache
+from app.services.location_index import location_index
+from app.services.tag_state import tag_state_store
+from app.services.cache_invalidation import LOCATIONS, cache_invalidation
 from app.api.deps import get_db
 
 router = APIRouter()
@@ -52,8 +55,10 @@ async def create_room(room: RoomCreate, db: Session = Depends(get_db)):
     # Add building_id from floor relationship
     db_room.building_id = floor.building_id
 
-    # Invalidate room cache for this room name
-    room_cache.invalidate(db_room.room_name)
+    # Rebuild room directory used by event processing
+    room_cache.reload(db)
+    location_index.refresh(db, room_id=db_room.id)
+    await cache_invalidation.publish(LOCATIONS)
 
     return db_room
 
@@ -84,9 +89,6 @@ async def update_room(room_id: int, room_update: RoomUpdate, db: Session = Depen
         if not floor:
             raise HTTPException(status_code=404, detail="Floor not found")
 
-    # Store old room name for cache invalidation
-    old_room_name = room.room_name
-
     update_data = room_update.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(room, key, value)
@@ -98,10 +100,11 @@ async def update_room(room_id: int, room_update: RoomUpdate, db: Session = Depen
     if room.floor:
         room.building_id = room.floor.building_id
 
-    # Invalidate cache for both old and new room names
-    room_cache.invalidate(old_room_name)
-    if room.room_name != old_room_name:
-        room_cache.invalidate(room.room_name)
+    # Rebuild room directory used by event processing
+    room_cache.reload(db)
+    location_index.refresh(db, room_id=room.id)
+    tag_state_store.rename_room(room.id, room.room_name)
+    await cache_invalidation.publish(LOCATIONS)
 
     return room
 
@@ -113,9 +116,12 @@ async def delete_room(room_id: int, db: Session = Depends(get_db)):
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
 
-    # Invalidate cache
-    room_cache.invalidate(room.room_name)
-
     db.delete(room)
     db.commit()
+
+    # Rebuild room directory used by event processing
+    room_cache.reload(db)
+    location_index.remove(room_id=room_id)
+    tag_state_store.forget_rooms({room_id})
+    await cache_invalidation.publish(LOCATIONS)
     return None
@@ -1,13 +1,23 @@
 """
 Tag CRUD endpoints.
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from datetime import datetime
+from typing import List, Optional, Tuple
 
 from app.schemas.tag import Tag, TagCreate, TagUpdate
+from app.schemas.location import TagLocationHistoryResponse
 from app.models.tag import Tag as TagModel
-from app.api.deps import get_db
+from app.services.event_dispatcher import event_dispatcher
+from app.services.cache_invalidation import TAG, cache_invalidation
+from app.services.history_stream import HISTORY_PAGE_MAX, HISTORY_PAGE_SIZE, history_query, stream_history
+from app.services.tag_state import tag_state_store
+from app.utils.timestamps import as_utc
+from app.api.deps import get_async_db, get_cursor, get_db
 
 router = APIRouter()
 
@@ -25,6 +35,8 @@ async def create_tag(tag: TagCreate, db: Session = Depends(get_db)):
     db.add(db_tag)
     db.commit()
     db.refresh(db_tag)
+    _sync_tag_state(db_tag)
+    await cache_invalidation.publish(TAG, db_tag.tag_id)
     return db_tag
 
 
@@ -50,6 +62,8 @@ async def update_tag(tag_id: str, tag_update: TagUpdate, db: Session = Depends(g
 
     db.commit()
     db.refresh(tag)
+    _sync_tag_state(tag)
+    await cache_invalidation.publish(TAG, tag.tag_id)
     return tag
 
 
@@ -62,4 +76,49 @@ async def delete_tag(tag_id: str, db: Session = Depends(get_db)):
 
     db.delete(tag)
     db.commit()
+    tag_state_store.remove(tag_id)
+    event_dispatcher.forget(tag_id)
+    await cache_invalidation.publish(TAG, tag_id)
     return None
+
+
+# Streamed: documented with responses= since response_model would not apply
+@router.get("/{tag_id}/location-history", responses={200: {"model": TagLocationHistoryResponse}})
+async def get_tag_location_history(
+    tag_id: str,
+    entered_from: Optional[datetime] = Query(None, alias="from", description="Visits entered at or after"),
+    entered_to: Optional[datetime] = Query(None, alias="to", description="Visits entered before"),
+    cursor: Optional[Tuple[datetime, int]] = Depends(get_cursor),
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_PAGE_MAX, description="Page size"),
+    export: bool = Query(False, description="Stream every visit in the from/to range in one response (ignores limit)"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get location history for a single tag, newest first.
+
+    Same bounds, page size, export, keyset pagination and streaming as
+    GET /api/users/{user_id}/location-history; a straight range scan of
+    ix_location_history_tag_entered.
+    """
+    exists = (await db.execute(select(TagModel.tag_id).where(TagModel.tag_id == tag_id))).first()
+    if not exists:
+        raise HTTPException(status_code=404, detail="Tag not found")
+
+    page_size = None if export else limit
+    # Timestamps without an offset are taken as UTC (as on the dashboard endpoints)
+    query = history_query([tag_id], as_utc(entered_from), as_utc(entered_to), cursor, page_size)
+    return StreamingResponse(
+        stream_history({"tag_id": tag_id}, query, page_size),
+        media_type="application/json"
+    )
+
+
+def _sync_tag_state(tag: TagModel):
+    """Mirror a CRUD change into the in-memory tag state used by event processing."""
+    tag_state_store.sync_tag(
+        tag.tag_id,
+        status=tag.status,
+        last_seen=tag.last_seen,
+        assigned_user_id=tag.assigned_user_id,
+        user_name=tag.assigned_user.name if tag.assigned_user else None
+    )
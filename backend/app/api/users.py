@@ -1,19 +1,25 @@
 """
 User CRUD endpoints.
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from datetime import datetime
+from typing import List, Optional, Tuple
 
 from app.schemas.user import User, UserCreate, UserUpdate
-from app.schemas.location import LocationHistoryResponse, LocationHistoryItem
+from app.schemas.location import LocationHistoryResponse
 from app.models.user import User as UserModel
 from app.models.tag import Tag as TagModel
-from app.models.location_history import LocationHistory as LocationHistoryModel
-from app.models.room import Room as RoomModel
-from app.models.floor import Floor as FloorModel
-from app.models.building import Building as BuildingModel
-from app.api.deps import get_db
+from app.services.event_dispatcher import event_dispatcher
+from app.services.cache_invalidation import TAG, USER, cache_invalidation
+from app.services.live_view import live_view
+from app.services.history_stream import HISTORY_PAGE_MAX, HISTORY_PAGE_SIZE, history_query, stream_history
+from app.services.tag_state import tag_state_store
+from app.utils.timestamps import as_utc
+from app.api.deps import get_async_db, get_cursor, get_db
 
 router = APIRouter()
 
@@ -36,6 +42,8 @@ async def create_user(user: UserCreate, db: Session = Depends(get_db)):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    live_view.set_user_role(db_user.user_id, db_user.role)
+    await cache_invalidation.publish(USER, db_user.user_id)
     return db_user
 
 
@@ -61,6 +69,11 @@ async def update_user(user_id: str, user_update: UserUpdate, db: Session = Depen
 
     db.commit()
     db.refresh(user)
+
+    # Keep user names used in live broadcasts (and roles used by /live filters) current
+    live_view.set_user_role(user.user_id, user.role)
+    tag_state_store.rename_user(user.user_id, user.name)
+    await cache_invalidation.publish(USER, user.user_id)
     return user
 
 
@@ -71,65 +84,59 @@ async def delete_user(user_id: str, db: Session = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
+    # Tags are deleted with the user (relationship cascade)
+    tag_ids = [tag.tag_id for tag in user.tags]
+
     db.delete(user)
     db.commit()
+    for tag_id in tag_ids:
+        tag_state_store.remove(tag_id)
+        event_dispatcher.forget(tag_id)
+        await cache_invalidation.publish(TAG, tag_id)
+    live_view.forget_user(user_id)
+    await cache_invalidation.publish(USER, user_id)
     return None
 
 
-@router.get("/{user_id}/location-history", response_model=LocationHistoryResponse)
-async def get_user_location_history(user_id: str, db: Session = Depends(get_db)):
+# Streamed: documented with responses= since response_model would not apply
+@router.get("/{user_id}/location-history", responses={200: {"model": LocationHistoryResponse}})
+async def get_user_location_history(
+    user_id: str,
+    entered_from: Optional[datetime] = Query(None, alias="from", description="Visits entered at or after"),
+    entered_to: Optional[datetime] = Query(None, alias="to", description="Visits entered before"),
+    cursor: Optional[Tuple[datetime, int]] = Depends(get_cursor),
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_PAGE_MAX, description="Page size"),
+    export: bool = Query(False, description="Stream every visit in the from/to range in one response (ignores limit)"),
+    db: AsyncSession = Depends(get_async_db)
+):
     """
     Get location history for a specific user.
 
-    Returns all location history records for tags assigned to this user,
-    with full building hierarchy information (Building > Floor > Room).
+    Returns location history records for tags assigned to this user,
+    newest first, with full building hierarchy information (Building > Floor > Room).
+
+    Bounded by from/to (entered_at) and paginated by the (entered_at, id)
+    keyset: pass next_cursor back as cursor. Pages hold HISTORY_PAGE_SIZE
+    (100) records unless limit says otherwise; export=true returns the
+    whole range instead. The response is streamed as rows are read;
+    total_records counts the records in this response.
     """
     # First, verify user exists
-    user = db.query(UserModel).filter(UserModel.user_id == user_id).first()
+    user = (await db.execute(
+        select(UserModel.user_id, UserModel.name).where(UserModel.user_id == user_id)
+    )).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # Query location history with joins to get full building hierarchy
-    # Join: LocationHistory -> Tag -> Room -> Floor -> Building
-    history_records = (
-        db.query(
-            LocationHistoryModel.id,
-            RoomModel.room_name,
-            BuildingModel.name.label("building_name"),
-            FloorModel.floor_number,
-            LocationHistoryModel.entered_at,
-            LocationHistoryModel.exited_at
-        )
-        .join(TagModel, LocationHistoryModel.tag_id == TagModel.tag_id)
-        .outerjoin(RoomModel, LocationHistoryModel.room_id == RoomModel.id)
-        .outerjoin(FloorModel, RoomModel.floor_id == FloorModel.id)
-        .outerjoin(BuildingModel, FloorModel.building_id == BuildingModel.id)
-        .filter(TagModel.assigned_user_id == user_id)
-        .order_by(LocationHistoryModel.entered_at.desc())
-        .all()
-    )
-
-    # Build response with duration calculation
-    history_items = []
-    for record in history_records:
-        duration_minutes = None
-        if record.exited_at and record.entered_at:
-            duration_seconds = (record.exited_at - record.entered_at).total_seconds()
-            duration_minutes = int(duration_seconds / 60)
-
-        history_items.append(LocationHistoryItem(
-            id=record.id,
-            room_name=record.room_name or "Unknown Room",
-            building_name=record.building_name or "Unknown Building",
-            floor_number=record.floor_number or 0,
-            entered_at=record.entered_at,
-            exited_at=record.exited_at,
-            duration_minutes=duration_minutes
-        ))
-
-    return LocationHistoryResponse(
-        user_id=user.user_id,
-        user_name=user.name,
-        history=history_items,
-        total_records=len(history_items)
+    # The user's tags, so the history query can use ix_location_history_tag_entered
+    tag_ids = (await db.execute(
+        select(TagModel.tag_id).where(TagModel.assigned_user_id == user_id)
+    )).scalars().all()
+
+    page_size = None if export else limit
+    # Timestamps without an offset are taken as UTC (as on the dashboard endpoints)
+    query = history_query(tag_ids, as_utc(entered_from), as_utc(entered_to), cursor, page_size)
+    return StreamingResponse(
+        stream_history({"user_id": user.user_id, "user_name": user.name}, query, page_size),
+        media_type="application/json"
     )
@@ -2,8 +2,11 @@
 WebSocket endpoint for live tracking updates.
 """
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+from typing import Optional
 import logging
 
+from app.schemas.websocket import SubscriptionRequest
 from app.services.websocket_manager import websocket_manager
 
 logger = logging.getLogger(__name__)
@@ -11,26 +14,66 @@ router = APIRouter()
 
 
 @router.websocket("/live-tracking")
-async def websocket_live_tracking(websocket: WebSocket):
+async def websocket_live_tracking(websocket: WebSocket, resume_from: Optional[int] = None,
+                                  epoch: Optional[str] = None):
     """
     WebSocket endpoint for live tracking updates.
 
     Clients connect and receive real-time location updates.
 
     Protocol:
-    - Server sends location updates as JSON
+    - First message is the initial sync:
+        {"type": "SNAPSHOT", "epoch": "...", "seq": N, "positions": [...]}
+      or, when reconnecting with ?resume_from=<seq>&epoch=<epoch> and the
+      missed events are still buffered:
+        {"type": "REPLAY", "epoch": "...", "seq": N, "messages": [...]}
+    - Events (LOCATION_UPDATE, TAG_LOST, MISSING_PERSON, MISSING_PERSON_CLEARED)
+      carry "seq"; clients
+      keep the highest seq seen, ignore events at or below it, and send it as
+      resume_from when reconnecting
+    - Server sends location updates as JSON (with room_id, floor_id and
+      building_id when the room is known)
+    - With WS_COALESCE_WINDOW_MS set, location updates arrive as
+        {"type": "LOCATION_BATCH", "updates": [LOCATION_UPDATE, ...], "timestamp": ...}
+      (latest update per tag in the window, seq = highest seq in it); an
+      alert ends the window early, so it still follows the batch in seq order
+    - Events always arrive in seq order, so the rule above never drops one
     - Server sends periodic heartbeats to keep connection alive
-    - Client can send messages (currently just echoed for debugging)
+    - Client may narrow what it receives (default: everything):
+        {"action": "subscribe", "buildings": [1], "floors": [3], "rooms": [12],
+         "tags": ["AA:BB:CC:DD:EE:FF"], "types": ["TAG_LOST", "MISSING_PERSON"]}
+        {"action": "unsubscribe", "floors": [3]}
+        {"action": "unsubscribe"}  (clear all)
+      Server replies {"type": "SUBSCRIPTIONS", "subscriptions": {...}} or
+      {"type": "ERROR", "message": "..."}
     """
-    connection_id = await websocket_manager.connect(websocket)
+    connection_id = await websocket_manager.connect(websocket, resume_from=resume_from, epoch=epoch)
 
     try:
-        # Keep connection alive and handle messages
         while True:
             data = await websocket.receive_text()
-            # Echo back (optional, for debugging)
             logger.debug(f"Received from {connection_id}: {data}")
 
+            try:
+                request = SubscriptionRequest.model_validate_json(data)
+            except ValidationError as e:
+                await websocket_manager.send(connection_id, {
+                    "type": "ERROR",
+                    "message": f"Invalid subscription request: {e.errors()[0]['msg']}"
+                })
+                continue
+
+            topics = request.model_dump(exclude={"action"})
+            if request.action == "subscribe":
+                subscriptions = websocket_manager.subscribe(connection_id, topics)
+            else:
+                subscriptions = websocket_manager.unsubscribe(connection_id, topics)
+
+            await websocket_manager.send(connection_id, {
+                "type": "SUBSCRIPTIONS",
+                "subscriptions": subscriptions
+            })
+
     except WebSocketDisconnect:
         websocket_manager.disconnect(connection_id)
         logger.info(f"Client {connection_id} disconnected")
@@ -22,9 +22,42 @@ class Settings(BaseSettings):
     # Missing Person Detection Settings
     MISSING_PERSON_THRESHOLD_SECONDS: int = 300  # 5 minutes
     MISSING_PERSON_CHECK_INTERVAL_SECONDS: int = 30
+    MISSING_PERSON_DETECTION_MODE: str = "poll"  # "poll" (DB sweep every interval) or "deadline" (timer heap)
+
+    # Batch Event Ingestion
+    EVENT_BATCH_MAX_SIZE: int = 1000
+
+    # Event Dispatcher (per-tag ordered ingestion)
+    EVENT_DISPATCHER_WORKERS: int = 8
+    EVENT_DISPATCHER_QUEUE_SIZE: int = 1000
+
+    # In-memory tag state / write-behind
+    LOCATION_WRITE_BEHIND_ENABLED: bool = False  # Single-process deployments only
+    LOCATION_FLUSH_INTERVAL_MS: int = 200
+    LOCATION_FLUSH_MAX_RETRIES: int = 5         # Failed batch flushes before events are written one by one
+    LOCATION_PENDING_MAX: int = 50000           # Unwritten write-behind events before new ones are refused
+
+    # Location History Partitioning (monthly partitions on entered_at)
+    LOCATION_HISTORY_PARTITIONS_AHEAD: int = 2          # Future months kept created
+    LOCATION_HISTORY_RETENTION_MONTHS: int = 0          # Whole months kept before dropping (0 = keep forever)
+    LOCATION_HISTORY_MAINTENANCE_INTERVAL_SECONDS: int = 3600
+
+    # Occupancy rollup (room_occupancy_hourly)
+    ROLLUP_FLUSH_INTERVAL_SECONDS: int = 60  # Peak occupancy write interval
+
+    # Room Cache Policy
+    ROOM_CACHE_POSITIVE_TTL_SECONDS: int = 300  # Room snapshot max age (0 = only CRUD reloads)
+    ROOM_CACHE_NEGATIVE_TTL_SECONDS: int = 30   # How long an unknown room name stays unknown
+    ROOM_CACHE_NEGATIVE_MAXSIZE: int = 1024     # LRU bound for unknown room names
 
     # WebSocket Configuration
     WS_HEARTBEAT_INTERVAL_SECONDS: int = 30
+    WS_SEND_QUEUE_SIZE: int = 256         # Messages buffered per client before it is dropped
+    WS_SEND_TIMEOUT_SECONDS: float = 5.0  # Max time for one send before the client is dropped
+    WS_COALESCE_WINDOW_MS: int = 0        # Batch LOCATION_UPDATEs per window, latest per tag (0 = off)
+    WS_REPLAY_BUFFER_SIZE: int = 1000     # Recent events kept for clients resuming after a reconnect
+    WS_BROADCAST_BACKEND: str = "memory"  # "memory" (one worker) or "postgres" (LISTEN/NOTIFY across workers)
+    WS_BROADCAST_CHANNEL: str = "rtls_broadcast"
 
     # Database Connection Pool Settings
     DB_POOL_SIZE: int = 20
@@ -35,6 +68,21 @@ class Settings(BaseSettings):
     # Optional: API Key for Python service authentication
     PYTHON_SERVICE_API_KEY: str = ""
 
+    @property
+    def async_database_url(self) -> str:
+        """DATABASE_URL rewritten for the asyncpg driver (used by the async engine)."""
+        url = self.DATABASE_URL
+        for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+            if url.startswith(prefix):
+                return "postgresql+asyncpg://" + url[len(prefix):]
+        return url
+
+    @property
+    def asyncpg_dsn(self) -> str:
+        """DATABASE_URL as a plain DSN for direct asyncpg connections (LISTEN/NOTIFY)."""
+        url = self.async_database_url
+        return "postgresql://" + url[len("postgresql+asyncpg://"):] if url.startswith("postgresql+asyncpg://") else url
+
     @property
     def cors_origins_list(self) -> List[str]:
         """Parse CORS_ORIGINS from comma-separated string to list."""
@@ -1,8 +1,15 @@
 """
 Database connection and session management.
 Uses SQLAlchemy with PostgreSQL.
+
+Two engines share the same database:
+- engine / SessionLocal: synchronous (psycopg2), used by CRUD endpoints and scripts
+- async_engine / AsyncSessionLocal: asyncio (asyncpg), used by the event
+  ingestion path, background tasks and read-heavy endpoints so queries
+  do not block the event loop
 """
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
@@ -20,5 +27,24 @@ engine = create_engine(
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine (asyncpg) with the same pool settings
+async_engine = create_async_engine(
+    settings.async_database_url,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    echo=False
+)
+
+# Async session factory
+# expire_on_commit=False: objects stay readable after commit without an implicit (blocking) refresh
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # Base class for all ORM models
 Base = declarative_base()
@@ -9,7 +9,7 @@ import asyncio
 import logging
 
 from app.config import settings
-from app.database import engine, Base, SessionLocal
+from app.database import engine, async_engine, AsyncSessionLocal, Base
 from app.api import (
     users,
     buildings,
@@ -20,9 +20,18 @@ from app.api import (
     positions,
     dashboard,
     events,
-    websocket
+    websocket,
+    admin,
+    alerts
 )
+from app.services.cache_invalidation import cache_invalidation
+from app.services.event_dispatcher import event_dispatcher
+from app.services.history_partitions import history_partition_manager
+from app.services.location_service import location_service
+from app.services.room_cache import room_cache
+from app.services.location_index import location_index
 from app.services.missing_person_detector import missing_person_detector
+from app.services.occupancy_rollup import occupancy_rollup
 from app.services.websocket_manager import websocket_manager
 
 # Configure logging
@@ -40,11 +49,18 @@ async def lifespan(app: FastAPI):
 
     Startup:
     - Create database tables (if not exists)
+    - Create upcoming location_history partitions, drop expired ones
+    - Load room directory, location index, in-memory tag state and live view
+    - Start event dispatcher workers and location flusher
+    - Start cross-worker broadcast backend (other workers' events, cache invalidations)
     - Start missing person detection background task
+    - Start history partition maintenance task
+    - Start occupancy rollup flush task
     - Start WebSocket heartbeat task
 
     Shutdown:
     - Cancel background tasks
+    - Flush pending location state and peak occupancy
     - Close database connections
     """
     # Startup
@@ -54,10 +70,26 @@ async def lifespan(app: FastAPI):
     Base.metadata.create_all(bind=engine)
     logger.info("Database tables verified")
 
+    # Partitions must exist before the first visit is recorded
+    await history_partition_manager.ensure()
+    await history_partition_manager.drop_expired()
+
+    # Load room directory, location index and in-memory tag state
+    async with AsyncSessionLocal() as db:
+        await room_cache.load(db)
+        await location_index.load(db)
+        await location_service.load_state(db)
+
     # Start background tasks
-    db = SessionLocal()
-    missing_person_task = asyncio.create_task(missing_person_detector.run(db))
+    event_dispatcher.start()
+    websocket_manager.add_listener(missing_person_detector.apply_broadcast)
+    websocket_manager.add_control_handler(cache_invalidation.apply)
+    await websocket_manager.start()
+    flusher_task = asyncio.create_task(location_service.run_flusher())
+    missing_person_task = asyncio.create_task(missing_person_detector.run())
     heartbeat_task = asyncio.create_task(websocket_manager.send_heartbeat())
+    partition_task = asyncio.create_task(history_partition_manager.run())
+    rollup_task = asyncio.create_task(occupancy_rollup.run())
     logger.info("Background tasks started")
 
     yield
@@ -66,7 +98,18 @@ async def lifespan(app: FastAPI):
     logger.info("Shutting down RTLS Backend...")
     missing_person_task.cancel()
     heartbeat_task.cancel()
-    db.close()
+    partition_task.cancel()
+    rollup_task.cancel()
+    await event_dispatcher.stop()
+    await websocket_manager.close()
+    flusher_task.cancel()
+    await asyncio.gather(flusher_task, return_exceptions=True)
+    await location_service.flush()
+    try:
+        await occupancy_rollup.flush()
+    except Exception as e:
+        logger.error(f"Error flushing occupancy rollup at shutdown: {e}")
+    await async_engine.dispose()
     logger.info("Shutdown complete")
 
 
@@ -98,6 +141,8 @@ app.include_router(positions.router, prefix="/api/positions", tags=["Live Positi
 app.include_router(dashboard.router, prefix="/api/dashboard", tags=["Dashboard"])
 app.include_router(events.router, prefix="/api/events", tags=["Events"])
 app.include_router(websocket.router, prefix="/ws", tags=["WebSocket"])
+app.include_router(alerts.router, prefix="/api/alerts", tags=["Alerts"])
+app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
 
 
 # Health check endpoint
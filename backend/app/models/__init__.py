@@ -9,6 +9,8 @@ from app.models.tag import Tag
 from app.models.anchor import Anchor
 from app.models.live_location import LiveLocation
 from app.models.location_history import LocationHistory
+from app.models.untracked_tag import UntrackedTag
+from app.models.room_occupancy_hourly import RoomOccupancyHourly
 
 __all__ = [
     "User",
@@ -19,4 +21,6 @@ __all__ = [
     "Anchor",
     "LiveLocation",
     "LocationHistory",
+    "UntrackedTag",
+    "RoomOccupancyHourly",
 ]
@@ -16,6 +16,10 @@ class LiveLocation(Base):
     - One row per tag (tag_id is primary key)
     - Updated on every LOCATION_CHANGE or INITIAL_LOCATION event
     - Provides fast lookups for "where is this tag right now?"
+    - open_history_id/open_entered_at point at the tag's open location_history
+      row (its primary key), so closing a visit is a primary-key update rather
+      than a search of the tag's history. No foreign key: location_history is
+      partitioned and expired partitions are dropped whole.
 
     This table is separate from location_history to optimize queries.
     """
@@ -39,6 +43,16 @@ class LiveLocation(Base):
         onupdate=func.now(),
         comment="Last update timestamp (auto-updated on modification)"
     )
+    open_history_id = Column(
+        Integer,
+        nullable=True,
+        comment="id of the open location_history row (NULL if no visit is open)"
+    )
+    open_entered_at = Column(
+        DateTime(timezone=True),
+        nullable=True,
+        comment="entered_at of the open location_history row (completes its primary key)"
+    )
 
     # Relationships
     # CASCADE delete: if tag is deleted, its live location is deleted
@@ -16,6 +16,10 @@ class LocationHistory(Base):
     - entered_at: timestamp when tag entered the room
     - exited_at: NULL while tag is still in room, set when tag leaves
     - Composite index on (tag_id, entered_at) for efficient history queries
+    - Range-partitioned by month on entered_at (see HistoryPartitionManager):
+      the primary key is (id, entered_at) because PostgreSQL requires the
+      partition key in every unique constraint; id alone is still unique
+      (one sequence), and time-bounded queries only read matching months
 
     Example:
     - Tag enters Room 101 at 10:00 -> (tag_id='TAG_123', room_id=101, entered_at='10:00', exited_at=NULL)
@@ -24,7 +28,7 @@ class LocationHistory(Base):
     """
     __tablename__ = "location_history"
 
-    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     tag_id = Column(
         String,
         ForeignKey("tags.tag_id", ondelete="CASCADE"),
@@ -39,8 +43,9 @@ class LocationHistory(Base):
     )
     entered_at = Column(
         DateTime(timezone=True),
+        primary_key=True,
         nullable=False,
-        comment="Timestamp when tag entered this room"
+        comment="Timestamp when tag entered this room (partition key)"
     )
     exited_at = Column(
         DateTime(timezone=True),
@@ -51,6 +56,7 @@ class LocationHistory(Base):
     # Composite index for efficient queries like "show me tag's history"
     __table_args__ = (
         Index('ix_location_history_tag_entered', 'tag_id', 'entered_at'),
+        {'postgresql_partition_by': 'RANGE (entered_at)'},
     )
 
     # Relationships
@@ -0,0 +1,49 @@
+"""
+RoomOccupancyHourly model - hourly per-room rollup of location_history for capacity planning.
+"""
+from sqlalchemy import Column, Integer, Float, ForeignKey, DateTime, Index
+from app.database import Base
+
+
+class RoomOccupancyHourly(Base):
+    """
+    RoomOccupancyHourly table - one row per room per UTC hour.
+
+    DESIGN:
+    - visits, distinct_tags and dwell_seconds come from CLOSED visits:
+      LocationService adds each visit as it closes (same transaction),
+      splitting its dwell time across the hours it overlaps
+    - visits counts visits by the hour they started in
+    - distinct_tags counts different tags with a closed visit overlapping the hour
+    - peak_occupancy is the most tags in the room at once during the hour,
+      including visits still open (raised with GREATEST, never lowered)
+    - scripts/backfill_room_rollup.py rebuilds everything from location_history
+
+    Example: a tag in Room 101 from 10:40 to 11:10 adds 1 visit and 1200 s
+    to 10:00, and 600 s to 11:00 (distinct tag in both hours).
+    """
+    __tablename__ = "room_occupancy_hourly"
+
+    room_id = Column(
+        Integer,
+        ForeignKey("rooms.id", ondelete="CASCADE"),
+        primary_key=True,
+        comment="Room (rollup rows are deleted with the room)"
+    )
+    hour_start = Column(
+        DateTime(timezone=True),
+        primary_key=True,
+        comment="Start of the UTC hour bucket"
+    )
+    visits = Column(Integer, nullable=False, default=0, comment="Closed visits that started in this hour")
+    distinct_tags = Column(Integer, nullable=False, default=0, comment="Different tags with a closed visit in this hour")
+    dwell_seconds = Column(Float, nullable=False, default=0, comment="Time spent in the room during this hour, summed over closed visits")
+    peak_occupancy = Column(Integer, nullable=False, default=0, comment="Most tags in the room at once during this hour")
+
+    # Dashboards read time ranges across many rooms
+    __table_args__ = (
+        Index('ix_room_occupancy_hourly_hour_start', 'hour_start'),
+    )
+
+    def __repr__(self):
+        return f"<RoomOccupancyHourly(room_id={self.room_id}, hour_start={self.hour_start}, visits={self.visits}, peak={self.peak_occupancy})>"
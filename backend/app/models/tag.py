@@ -1,7 +1,7 @@
 """
 Tag model - represents BLE beacons worn by tracked individuals.
 """
-from sqlalchemy import Column, String, Integer, ForeignKey, Enum, DateTime
+from sqlalchemy import Column, String, Integer, ForeignKey, Enum, DateTime, Index
 from sqlalchemy.orm import relationship
 from app.database import Base
 from app.utils.enums import TagStatus
@@ -39,6 +39,11 @@ class Tag(Base):
         comment="Last time tag was detected (updated on every event)"
     )
 
+    # Composite index for the missing-person sweep: "active tags not seen since X"
+    __table_args__ = (
+        Index('ix_tags_status_last_seen', 'status', 'last_seen'),
+    )
+
     # Relationships
     # SET NULL: if user is deleted, tag becomes unassigned (not deleted)
     assigned_user = relationship("User", back_populates="tags")
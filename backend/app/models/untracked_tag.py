@@ -1,7 +1,7 @@
 """
 UntrackedTag model - stores information about tags that went offline/missing.
 """
-from sqlalchemy import Column, String, Integer, ForeignKey, DateTime
+from sqlalchemy import Column, String, Integer, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -65,6 +65,11 @@ class UntrackedTag(Base):
         comment="When the tag was marked as untracked/lost"
     )
 
+    # Composite index for newest-first keyset pagination of the untracked page
+    __table_args__ = (
+        Index('ix_untracked_tags_marked_at_id', 'marked_untracked_at', 'id'),
+    )
+
     # Relationships
     tag = relationship("Tag", back_populates="untracked_records")
     user = relationship("User")
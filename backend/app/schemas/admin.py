@@ -0,0 +1,20 @@
+"""
+Pydantic schemas for admin/diagnostic endpoints.
+"""
+from pydantic import BaseModel
+
+
+class RoomCacheStats(BaseModel):
+    """Room cache effectiveness counters and policy."""
+    hits: int
+    misses: int            # Looked up in the database
+    negativeHits: int      # Answered "unknown room" from the negative cache
+    evictions: int         # Negative entries dropped by the LRU bound
+    reloads: int           # Snapshot rebuilds (startup, CRUD, positive TTL)
+    hitRatio: float
+    rooms: int
+    negativeEntries: int
+    snapshotAgeSeconds: float
+    positiveTtlSeconds: int
+    negativeTtlSeconds: int
+    negativeMaxsize: int
@@ -0,0 +1,27 @@
+"""
+Pydantic schemas for missing-person alert episodes.
+"""
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime
+
+
+class MissingPersonEpisodeItem(BaseModel):
+    """
+    One open missing-person episode.
+    CRITICAL: Uses camelCase to match frontend schema.
+    """
+    tagId: str
+    userName: str
+    lastRoom: Optional[str] = None
+    fullLocation: Optional[str] = None  # "Building > Floor N > Room"
+    lastSeen: datetime
+    raisedAt: datetime
+    checkedAt: datetime  # Last time the tag was confirmed still missing
+    missingDurationSeconds: int
+
+
+class MissingPersonEpisodesResponse(BaseModel):
+    """Response for GET /api/alerts/missing-persons."""
+    episodes: List[MissingPersonEpisodeItem]
+    total: int
@@ -1,7 +1,9 @@
 """
-Pydantic schemas for dashboard statistics.
+Pydantic schemas for dashboard statistics and room occupancy.
 """
 from pydantic import BaseModel
+from datetime import datetime
+from typing import List, Optional
 
 
 class DashboardStats(BaseModel):
@@ -12,3 +14,40 @@ class DashboardStats(BaseModel):
     totalDevices: int  # Total anchors
     activeTags: int    # Tags with status='active'
     offlineTags: int   # Tags with status='offline'
+
+
+class RoomOccupancyHour(BaseModel):
+    """One room-hour of the occupancy rollup."""
+    roomId: int
+    roomName: Optional[str] = None
+    building: Optional[str] = None
+    floor: Optional[int] = None
+    hourStart: datetime        # Start of the UTC hour
+    visits: int                # Closed visits that started in this hour
+    distinctTags: int          # Different tags with a closed visit in this hour
+    dwellSeconds: float        # Time spent in the room during this hour (closed visits)
+    peakOccupancy: int         # Most tags in the room at once
+
+
+class RoomOccupancyHourlyResponse(BaseModel):
+    """Hourly occupancy rollup for a time range."""
+    items: List[RoomOccupancyHour]
+    total: int
+
+
+class RoomOccupancySummary(BaseModel):
+    """One room's occupancy over a time range."""
+    roomId: int
+    roomName: Optional[str] = None
+    building: Optional[str] = None
+    floor: Optional[int] = None
+    visits: int
+    dwellSeconds: float
+    averageOccupancy: float    # dwellSeconds / range length: mean tags in the room
+    peakOccupancy: int         # Highest hourly peak in the range
+
+
+class RoomOccupancySummaryResponse(BaseModel):
+    """Per-room occupancy totals for a time range."""
+    items: List[RoomOccupancySummary]
+    total: int
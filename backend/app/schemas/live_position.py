@@ -29,6 +29,17 @@ class LivePositionStats(BaseModel):
 
 
 class LivePositionsResponse(BaseModel):
-    """Complete response for GET /api/positions/live endpoint."""
+    """
+    Complete response for GET /api/positions/live endpoint.
+
+    With ?since=<version>&epoch=<epoch>, positions holds only the changed
+    entries, removed the tag ids that left the list, and full is false.
+    With ?fields=..., position items only carry the requested fields.
+    """
     positions: List[LivePositionItem]
     stats: LivePositionStats
+    version: int = 0  # Pass back as ?since= on the next poll
+    epoch: str = ""   # Pass back as ?epoch= (versions restart with the server)
+    full: bool = True
+    removed: List[str] = []  # handbandSerial of entries to drop (delta responses)
+    nextCursor: Optional[str] = None  # Pass as ?after= for the next page
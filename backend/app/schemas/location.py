@@ -34,6 +34,18 @@ class LocationEventResponse(BaseModel):
     tag_id: str
 
 
+class LocationEventBatchResponse(BaseModel):
+    """
+    Response schema for batch location event ingestion.
+
+    results has one entry per submitted event, in submission order,
+    so callers can retry only the events that failed.
+    """
+    results: List[LocationEventResponse]
+    processed: int
+    failed: int
+
+
 class LocationHistoryItem(BaseModel):
     """Schema for a single location history record."""
     id: int
@@ -50,4 +62,13 @@ class LocationHistoryResponse(BaseModel):
     user_id: str
     user_name: str
     history: List[LocationHistoryItem]
-    total_records: int
+    total_records: int  # Records in this response (page)
+    next_cursor: Optional[str] = None  # Pass as ?cursor= for the next page
+
+
+class TagLocationHistoryResponse(BaseModel):
+    """Schema for tag location history response."""
+    tag_id: str
+    history: List[LocationHistoryItem]
+    total_records: int  # Records in this response (page)
+    next_cursor: Optional[str] = None  # Pass as ?cursor= for the next page
@@ -24,4 +24,5 @@ class UntrackedTagItem(BaseModel):
 class UntrackedTagsResponse(BaseModel):
     """Schema for untracked tags response."""
     untracked_tags: List[UntrackedTagItem]
-    total: int
+    total: int  # All rows matching the filters
+    next_cursor: Optional[str] = None  # Pass as ?cursor= for the next page
@@ -0,0 +1,25 @@
+"""
+Pydantic schemas for client messages on the live-tracking WebSocket.
+"""
+from pydantic import BaseModel
+from typing import List, Literal
+
+
+class SubscriptionRequest(BaseModel):
+    """
+    Subscribe to / unsubscribe from topics.
+
+    Examples:
+    - {"action": "subscribe", "floors": [3]}
+    - {"action": "subscribe", "tags": ["AA:BB:CC:DD:EE:FF"], "types": ["TAG_LOST"]}
+    - {"action": "unsubscribe"}  (no topics: clear all, receive everything again)
+
+    A client receives an event if it matches any of its building/floor/room/tag
+    topics (or it has none) and its type is subscribed (or it has no types).
+    """
+    action: Literal["subscribe", "unsubscribe"]
+    buildings: List[int] = []
+    floors: List[int] = []
+    rooms: List[int] = []
+    tags: List[str] = []
+    types: List[Literal["LOCATION_UPDATE", "TAG_LOST", "MISSING_PERSON", "MISSING_PERSON_CLEARED"]] = []
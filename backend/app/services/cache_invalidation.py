@@ -0,0 +1,111 @@
+"""
+Cache invalidation - propagates CRUD changes to the in-memory state of every worker.
+CRUD endpoints update their own worker directly; other workers reload from the database.
+"""
+from sqlalchemy import select
+from typing import Optional
+import logging
+
+from app.database import AsyncSessionLocal
+from app.models.tag import Tag
+from app.models.user import User
+from app.services.event_dispatcher import event_dispatcher
+from app.services.live_view import live_view
+from app.services.location_index import location_index
+from app.services.room_cache import room_cache
+from app.services.tag_state import tag_state_store
+from app.services.websocket_manager import websocket_manager
+
+logger = logging.getLogger(__name__)
+
+# Invalidation scopes
+LOCATIONS = "locations"  # Buildings, floors or rooms changed
+TAG = "tag"              # One tag changed (key: tag_id)
+USER = "user"            # One user changed (key: user_id)
+
+
+class CacheInvalidation:
+    """
+    Sends and applies INVALIDATE control messages on the broadcast backend.
+
+    Design:
+    - publish(): called by CRUD endpoints after commit (and after updating
+      their own worker); other workers receive the message as a control
+      message, never forwarded to WebSocket clients
+    - apply(): reloads only what the scope names, from the database:
+      - locations: room directory and location index (both small, full reload);
+        rooms that disappeared are dropped from tag state and occupancy,
+        renamed rooms are renamed in tag state
+      - tag: the tag's status, last_seen and assignment (removed if deleted)
+      - user: the user's name and role (forgotten if deleted)
+    - With the in-memory backend (one worker) nothing is ever received
+    """
+
+    async def publish(self, scope: str, key: Optional[str] = None):
+        """
+        Tell the other workers to reload part of their state.
+
+        Args:
+            scope: LOCATIONS, TAG or USER
+            key: tag_id / user_id for TAG and USER
+        """
+        await websocket_manager.publish_control({"type": "INVALIDATE", "scope": scope, "key": key})
+
+    async def apply(self, message: dict):
+        """
+        Apply an INVALIDATE control message from another worker.
+
+        Args:
+            message: {"type": "INVALIDATE", "scope": ..., "key": ...}
+        """
+        if message.get("type") != "INVALIDATE":
+            return
+
+        scope, key = message.get("scope"), message.get("key")
+        async with AsyncSessionLocal() as db:
+            if scope == LOCATIONS:
+                names = {room_id: location_index.get(room_id).room_name for room_id in location_index.room_ids()}
+                await room_cache.load(db)
+                await location_index.load(db)
+                tag_state_store.forget_rooms(set(names) - set(location_index.room_ids()))
+                for room_id in location_index.room_ids():
+                    room_name = location_index.get(room_id).room_name
+                    if names.get(room_id) != room_name:
+                        tag_state_store.rename_room(room_id, room_name)
+            elif scope == TAG:
+                row = (await db.execute(
+                    select(
+                        Tag.status,
+                        Tag.last_seen,
+                        Tag.assigned_user_id,
+                        User.name.label("user_name")
+                    ).outerjoin(
+                        User, Tag.assigned_user_id == User.user_id
+                    ).where(Tag.tag_id == key)
+                )).first()
+                if row is None:
+                    tag_state_store.remove(key)
+                    event_dispatcher.forget(key)
+                else:
+                    tag_state_store.sync_tag(
+                        key,
+                        status=row.status,
+                        last_seen=row.last_seen,
+                        assigned_user_id=row.assigned_user_id,
+                        user_name=row.user_name
+                    )
+            elif scope == USER:
+                row = (await db.execute(select(User.name, User.role).where(User.user_id == key))).first()
+                if row is None:
+                    live_view.forget_user(key)
+                else:
+                    live_view.set_user_role(key, row.role)
+                    tag_state_store.rename_user(key, row.name)
+            else:
+                logger.warning(f"Unknown invalidation scope: {scope}")
+                return
+        logger.debug(f"Applied invalidation from another worker: {scope} {key or ''}")
+
+
+# Global cache invalidation instance
+cache_invalidation = CacheInvalidation()
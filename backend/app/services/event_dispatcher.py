@@ -0,0 +1,232 @@
+"""
+Event dispatcher - ordered, parallel ingestion of location events.
+CRITICAL: All location events pass through here before LocationService.
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import asyncio
+import logging
+import zlib
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.schemas.location import LocationEvent
+from app.services.location_service import location_service
+from app.services.tag_state import tag_state_store
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Barrier:
+    """Queue item that parks a worker while a batch touching its tags is applied."""
+    ready: asyncio.Event = field(default_factory=asyncio.Event)  # Set by the worker on arrival
+    done: asyncio.Event = field(default_factory=asyncio.Event)   # Set by the batch when finished
+
+
+class EventDispatcher:
+    """
+    Routes location events to a pool of asyncio workers, partitioned by tag.
+
+    Design:
+    - N worker queues; an event goes to queue crc32(tag_id) % N
+    - Each worker applies its queue in arrival order with its own DB session,
+      so events for one tag are never applied concurrently
+    - Different tags land on different workers and are processed in parallel
+    - Per-tag watermark (last applied timestamp): an event older than the
+      watermark is rejected instead of corrupting location_history intervals;
+      seeded from the tag state store at startup, advanced after each commit
+    - Batches go through the same workers: a barrier is queued on every
+      worker owning one of the batch's tags, and the batch is applied once
+      all of them reached it (events queued before it are done, later ones
+      wait), so a tag is never applied by a batch and a worker at once
+
+    The gateway fires every event on its own thread, so two events for the
+    same tag can reach the API out of order; the watermark catches that.
+
+    Queues and watermarks are per process. With several ingesting workers
+    (WS_BROADCAST_BACKEND=postgres) LocationService also locks each tag in
+    the database and checks staleness against the committed last_seen.
+    """
+
+    def __init__(self, workers: int = 8, queue_size: int = 1000):
+        """
+        Initialize event dispatcher.
+
+        Args:
+            workers: Number of worker queues/tasks
+            queue_size: Maximum pending events per queue (submit waits when full)
+        """
+        self.workers = workers
+        self.queue_size = queue_size
+        self._queues: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+        self._last_applied: Dict[str, int] = {}
+        self._batch_lock: Optional[asyncio.Lock] = None
+
+    def start(self):
+        """
+        Create worker queues and start worker tasks (call from app startup,
+        after the tag state store is loaded).
+        """
+        # Resume the watermarks where the previous process left them
+        self._last_applied = {
+            state.tag_id: int(state.last_seen.timestamp())
+            for state in tag_state_store.all() if state.last_seen is not None
+        }
+        self._batch_lock = asyncio.Lock()
+        self._queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(self.workers)]
+        self._tasks = [
+            asyncio.create_task(self._worker(index, queue))
+            for index, queue in enumerate(self._queues)
+        ]
+        logger.info(f"Event dispatcher started ({self.workers} workers, queue size {self.queue_size})")
+
+    async def stop(self):
+        """Cancel worker tasks (call from app shutdown)."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queues = []
+        logger.info("Event dispatcher stopped")
+
+    async def submit(self, event: LocationEvent) -> Dict[str, str]:
+        """
+        Queue an event on its tag's worker and wait for the result.
+
+        Args:
+            event: Location event from Python service
+
+        Returns:
+            dict: Response with status and message (status 'rejected' for stale events)
+
+        Raises:
+            Exception: Whatever LocationService.process_event raised
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue_for(event.tag_id).put((event, future))
+        return await future
+
+    async def submit_batch(self, db: AsyncSession, events: List[LocationEvent]) -> List[Dict[str, str]]:
+        """
+        Apply a batch of events in one transaction, in order with queued events.
+
+        Waits until every worker owning one of the batch's tags is parked at
+        the batch's barrier; then stale events are rejected, the rest go to
+        LocationService.process_batch and advance the watermarks once it
+        has committed.
+
+        Args:
+            db: Async database session
+            events: Location events from Python service
+
+        Returns:
+            list: One response dict per event, in input order
+        """
+        results: List[Optional[Dict[str, str]]] = [None] * len(events)
+        if not events:
+            return results
+
+        barriers = []
+        try:
+            # Barriers are queued under one lock, in queue order, so two batches
+            # sharing workers are queued in the same order everywhere (no deadlock)
+            async with self._batch_lock:
+                for queue_index in sorted({self._queue_index(event.tag_id) for event in events}):
+                    barrier = _Barrier()
+                    await self._queues[queue_index].put(barrier)
+                    barriers.append(barrier)
+            for barrier in barriers:
+                await barrier.ready.wait()
+
+            accepted = []
+            for index, event in enumerate(events):
+                rejection = self._check_stale(event)
+                if rejection:
+                    results[index] = rejection
+                else:
+                    accepted.append(index)
+
+            batch_results = await location_service.process_batch(db, [events[index] for index in accepted])
+            for index, result in zip(accepted, batch_results):
+                results[index] = result
+                if result["status"] == "success":
+                    self._mark_applied(events[index])
+        finally:
+            for barrier in barriers:
+                barrier.done.set()
+
+        return results
+
+    def forget(self, tag_id: str):
+        """Drop a deleted tag's watermark."""
+        self._last_applied.pop(tag_id, None)
+
+    def _queue_index(self, tag_id: str) -> int:
+        """Pick the worker queue for a tag (stable across restarts)."""
+        if not self._queues:
+            raise RuntimeError("Event dispatcher is not running")
+        return zlib.crc32(tag_id.encode()) % len(self._queues)
+
+    def _queue_for(self, tag_id: str) -> asyncio.Queue:
+        return self._queues[self._queue_index(tag_id)]
+
+    def _check_stale(self, event: LocationEvent) -> Optional[Dict[str, str]]:
+        """Return a rejection response if the event is older than the tag's watermark."""
+        last_applied = self._last_applied.get(event.tag_id)
+        if last_applied is not None and event.timestamp < last_applied:
+            logger.warning(
+                f"Rejected stale {event.event_type.value} for tag {event.tag_id}: "
+                f"timestamp {event.timestamp} < last applied {last_applied}"
+            )
+            return {"status": "rejected", "message": f"Stale event (last applied timestamp: {last_applied})"}
+        return None
+
+    def _mark_applied(self, event: LocationEvent):
+        """Advance the tag's watermark after the event was applied."""
+        if event.timestamp > self._last_applied.get(event.tag_id, event.timestamp - 1):
+            self._last_applied[event.tag_id] = event.timestamp
+
+    async def _worker(self, index: int, queue: asyncio.Queue):
+        """
+        Worker loop: apply queued events one at a time; wait at batch barriers.
+
+        Args:
+            index: Worker number (for logging)
+            queue: Queue owned by this worker
+        """
+        while True:
+            item = await queue.get()
+            if isinstance(item, _Barrier):
+                try:
+                    item.ready.set()
+                    await item.done.wait()
+                finally:
+                    queue.task_done()
+                continue
+
+            event, future = item
+            try:
+                result = self._check_stale(event)
+                if not result:
+                    async with AsyncSessionLocal() as db:
+                        result = await location_service.process_event(db, event)
+                    if result["status"] == "success":
+                        self._mark_applied(event)
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                logger.exception(f"Worker {index} failed event for tag {event.tag_id}: {e}")
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                queue.task_done()
+
+
+# Global event dispatcher instance
+event_dispatcher = EventDispatcher(
+    workers=settings.EVENT_DISPATCHER_WORKERS,
+    queue_size=settings.EVENT_DISPATCHER_QUEUE_SIZE
+)
@@ -0,0 +1,188 @@
+"""
+History partition manager - creates and retires monthly location_history partitions.
+CRITICAL: Rows can only be inserted into months that have a partition (or the default one).
+"""
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import asyncio
+import logging
+import re
+
+from app.config import settings
+from app.database import async_engine
+
+logger = logging.getLogger(__name__)
+
+PARENT = "location_history"
+DEFAULT_PARTITION = "location_history_default"
+PARTITION_NAME = re.compile(r"^location_history_(\d{4})_(\d{2})$")
+
+# Serializes maintenance across backend workers (arbitrary app-wide key)
+ADVISORY_LOCK_KEY = 7_240_001
+
+
+def month_start(value: datetime) -> datetime:
+    """First instant (UTC) of the month containing value."""
+    value = value.astimezone(timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    """Shift a month start by a number of months."""
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(month: datetime) -> str:
+    """location_history_YYYY_MM."""
+    return f"{PARENT}_{month.year:04d}_{month.month:02d}"
+
+
+class HistoryPartitionManager:
+    """
+    Keeps location_history's monthly RANGE partitions in step with time.
+
+    Design:
+    - ensure(): creates the partitions for this month and the next
+      LOCATION_HISTORY_PARTITIONS_AHEAD months, plus a DEFAULT partition
+      that catches out-of-range timestamps instead of failing the insert
+    - If the default partition already holds rows for a month being created,
+      they are moved into the new partition before it is attached
+    - drop_expired(): with LOCATION_HISTORY_RETENTION_MONTHS > 0, detaches and
+      drops whole partitions older than the retention window (no row DELETEs,
+      no VACUUM debt); visits still open in a dropped month go with it
+    - Runs at startup and then every LOCATION_HISTORY_MAINTENANCE_INTERVAL_SECONDS;
+      an advisory lock keeps several workers from racing on DDL
+    - Does nothing if location_history is not partitioned (migration 005 not applied)
+    """
+
+    async def _is_partitioned(self, conn: AsyncConnection) -> bool:
+        result = await conn.execute(text(
+            "SELECT c.relkind = 'p' FROM pg_class c "
+            "WHERE c.oid = to_regclass(:parent)"
+        ), {"parent": PARENT})
+        return bool(result.scalar())
+
+    async def _partitions(self, conn: AsyncConnection) -> Dict[datetime, str]:
+        """Existing monthly partitions: month start -> table name."""
+        result = await conn.execute(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:parent)"
+        ), {"parent": PARENT})
+
+        partitions = {}
+        for (name,) in result:
+            match = PARTITION_NAME.match(name)
+            if match:
+                month = datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=timezone.utc)
+                partitions[month] = name
+        return partitions
+
+    async def _create_partition(self, conn: AsyncConnection, month: datetime):
+        """Create one month's partition, adopting any of its rows from the default partition."""
+        name = partition_name(month)
+        bounds = {"lower": month, "upper": add_months(month, 1)}
+        lower, upper = (f"'{value.isoformat()}'" for value in (month, add_months(month, 1)))
+
+        stray = await conn.execute(text(
+            f"SELECT 1 FROM {DEFAULT_PARTITION} WHERE entered_at >= :lower AND entered_at < :upper LIMIT 1"
+        ), bounds)
+        if stray.first() is None:
+            await conn.execute(text(
+                f"CREATE TABLE {name} PARTITION OF {PARENT} FOR VALUES FROM ({lower}) TO ({upper})"
+            ))
+        else:
+            # Attaching would fail while the default partition holds rows for this range
+            await conn.execute(text(f"CREATE TABLE {name} (LIKE {PARENT} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+            moved = await conn.execute(text(
+                f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+                f"WHERE entered_at >= :lower AND entered_at < :upper RETURNING *) "
+                f"INSERT INTO {name} SELECT * FROM moved"
+            ), bounds)
+            await conn.execute(text(
+                f"ALTER TABLE {PARENT} ATTACH PARTITION {name} FOR VALUES FROM ({lower}) TO ({upper})"
+            ))
+            logger.warning(f"Moved {moved.rowcount} rows from {DEFAULT_PARTITION} into {name}")
+        logger.info(f"Created history partition {name}")
+
+    async def ensure(self, now: Optional[datetime] = None) -> List[str]:
+        """
+        Create missing partitions up to LOCATION_HISTORY_PARTITIONS_AHEAD months ahead.
+
+        Args:
+            now: Reference time (default: current time)
+
+        Returns:
+            Names of the partitions created
+        """
+        current = month_start(now or datetime.now(timezone.utc))
+        created = []
+        async with async_engine.begin() as conn:
+            if not await self._is_partitioned(conn):
+                logger.warning(f"{PARENT} is not partitioned; skipping partition maintenance")
+                return created
+            await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+
+            await conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT} DEFAULT"))
+            existing = await self._partitions(conn)
+            for offset in range(settings.LOCATION_HISTORY_PARTITIONS_AHEAD + 1):
+                month = add_months(current, offset)
+                if month not in existing:
+                    await self._create_partition(conn, month)
+                    created.append(partition_name(month))
+        return created
+
+    async def drop_expired(self, now: Optional[datetime] = None) -> List[str]:
+        """
+        Drop partitions that ended before the retention window.
+
+        Args:
+            now: Reference time (default: current time)
+
+        Returns:
+            Names of the partitions dropped
+        """
+        if settings.LOCATION_HISTORY_RETENTION_MONTHS <= 0:
+            return []
+
+        cutoff = add_months(
+            month_start(now or datetime.now(timezone.utc)),
+            -settings.LOCATION_HISTORY_RETENTION_MONTHS
+        )
+        dropped = []
+        async with async_engine.begin() as conn:
+            if not await self._is_partitioned(conn):
+                return dropped
+            await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+
+            for month, name in sorted((await self._partitions(conn)).items()):
+                if add_months(month, 1) > cutoff:
+                    break
+                await conn.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+                await conn.execute(text(f"DROP TABLE {name}"))
+                dropped.append(name)
+                logger.info(f"Dropped history partition {name} (older than {cutoff:%Y-%m})")
+
+            # Expired strays in the default partition are few; delete them row by row
+            await conn.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE entered_at < :cutoff"), {"cutoff": cutoff})
+        return dropped
+
+    async def run(self):
+        """
+        Maintenance loop: ensure upcoming partitions, drop expired ones.
+        Runs indefinitely until cancelled.
+        """
+        while True:
+            await asyncio.sleep(settings.LOCATION_HISTORY_MAINTENANCE_INTERVAL_SECONDS)
+            try:
+                await self.ensure()
+                await self.drop_expired()
+            except Exception as e:
+                logger.error(f"Error in history partition maintenance: {e}", exc_info=True)
+
+
+# Global history partition manager instance
+history_partition_manager = HistoryPartitionManager()
@@ -0,0 +1,124 @@
+"""
+Location history streaming - keyset-paginated history pages written as they are read.
+Used by the per-user and per-tag location-history endpoints.
+"""
+from sqlalchemy import and_, or_, select
+from datetime import datetime
+from typing import AsyncIterator, Optional, Tuple
+
+from app.database import AsyncSessionLocal
+from app.models.location_history import LocationHistory
+from app.schemas.location import LocationHistoryItem
+from app.services.location_index import location_index
+from app.utils.cursor import encode_cursor
+from app.utils.json_encoding import encode_json
+
+# Items serialized per chunk written to the client
+CHUNK_SIZE = 500
+
+# Page size when the client does not pass limit
+HISTORY_PAGE_SIZE = 100
+
+# Largest page a client may request
+HISTORY_PAGE_MAX = 10000
+
+
+def history_query(tag_ids, entered_from: Optional[datetime] = None, entered_to: Optional[datetime] = None,
+                  cursor: Optional[Tuple[datetime, int]] = None, limit: Optional[int] = None):
+    """
+    Newest-first history of some tags, one keyset page.
+
+    Filters on tag_id and entered_at, so ix_location_history_tag_entered
+    (tag_id, entered_at) serves both the bounds and the order.
+
+    Args:
+        tag_ids: Tags whose visits to return
+        entered_from: Only visits entered at or after this time
+        entered_to: Only visits entered before this time
+        cursor: (entered_at, id) of the previous page's last row
+        limit: Page size (None: everything); one extra row is selected to detect a next page
+    """
+    query = select(
+        LocationHistory.id,
+        LocationHistory.room_id,
+        LocationHistory.entered_at,
+        LocationHistory.exited_at
+    ).where(
+        LocationHistory.tag_id.in_(tag_ids)
+    ).order_by(
+        LocationHistory.entered_at.desc(),
+        LocationHistory.id.desc()
+    )
+
+    if entered_from is not None:
+        query = query.where(LocationHistory.entered_at >= entered_from)
+    if entered_to is not None:
+        query = query.where(LocationHistory.entered_at < entered_to)
+    if cursor is not None:
+        # Spelled out (rather than a row comparison) so entered_at stays an index bound
+        entered_at, last_id = cursor
+        query = query.where(or_(
+            LocationHistory.entered_at < entered_at,
+            and_(LocationHistory.entered_at == entered_at, LocationHistory.id < last_id)
+        ))
+    if limit is not None:
+        query = query.limit(limit + 1)
+    return query
+
+
+def _item(row) -> str:
+    """One history row as LocationHistoryItem JSON."""
+    duration_minutes = None
+    if row.exited_at and row.entered_at:
+        duration_minutes = int((row.exited_at - row.entered_at).total_seconds() / 60)
+
+    location = location_index.get(row.room_id)
+    return LocationHistoryItem(
+        id=row.id,
+        room_name=location.room_name if location else "Unknown Room",
+        building_name=location.building_name if location else "Unknown Building",
+        floor_number=location.floor_number if location else 0,
+        entered_at=row.entered_at,
+        exited_at=row.exited_at,
+        duration_minutes=duration_minutes
+    ).model_dump_json()
+
+
+async def stream_history(header: dict, query, limit: Optional[int]) -> AsyncIterator[str]:
+    """
+    Write a history response as JSON while rows arrive from a server-side cursor.
+
+    Output: {<header fields>, "history": [...], "total_records": N, "next_cursor": ...}
+    where total_records counts the items in this response.
+
+    Opens its own session: request-scoped dependencies are closed before a
+    streaming body is sent.
+
+    Args:
+        header: Leading response fields (user or tag)
+        query: history_query() result
+        limit: Page size the query was built with (None: everything)
+    """
+    yield encode_json(header)[:-1] + (',"history":[' if header else '"history":[')
+
+    count = 0
+    last = None
+    next_cursor = None
+    chunk = []
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query)
+        async for row in result:
+            if limit is not None and count == limit:
+                next_cursor = encode_cursor(last.entered_at, last.id)
+                break
+            chunk.append(_item(row))
+            count += 1
+            last = row
+            if len(chunk) == CHUNK_SIZE:
+                yield ("," if count > CHUNK_SIZE else "") + ",".join(chunk)
+                chunk = []
+        await result.close()
+
+    if chunk:
+        yield ("," if count > len(chunk) else "") + ",".join(chunk)
+    yield "]," + encode_json({"total_records": count, "next_cursor": next_cursor})[1:]
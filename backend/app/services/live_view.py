@@ -0,0 +1,322 @@
+"""
+Live view - materialized GET /api/positions/live rows, kept current per event.
+CRITICAL: /live serves from this view without touching the database.
+"""
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import itertools
+import logging
+import threading
+import uuid
+
+from app.services.location_index import location_index
+from app.utils.enums import TagStatus
+from app.utils.json_encoding import encode_json
+
+logger = logging.getLogger(__name__)
+
+# Deleted tags remembered for delta responses; older deltas fall back to a full list
+MAX_TOMBSTONES = 10000
+
+
+@dataclass
+class LiveEntry:
+    """One row of the live view: the frontend item and its pre-encoded JSON."""
+    tag_id: str
+    status: TagStatus
+    room_id: Optional[int]
+    floor_id: Optional[int]
+    building_id: Optional[int]
+    counted_room_id: Optional[int]  # room_id if the room is in the location index
+    role: Optional[str]  # Assigned user's role
+    item: dict  # LivePositionItem fields (camelCase)
+    frame: str  # encode_json(item)
+    version: int = 0  # View version at which this entry last changed
+
+    def key(self) -> tuple:
+        """Everything a client can see or filter on (unchanged key: no new version)."""
+        return (self.frame, self.status, self.room_id, self.floor_id, self.building_id, self.role)
+
+
+@dataclass(frozen=True)
+class LiveFilter:
+    """Server-side filters for /live (None: any)."""
+    building_id: Optional[int] = None
+    floor_id: Optional[int] = None
+    room_id: Optional[int] = None
+    role: Optional[str] = None
+    status: Optional[TagStatus] = TagStatus.active
+
+    def matches(self, entry: LiveEntry) -> bool:
+        return (
+            (self.status is None or entry.status == self.status)
+            and (self.building_id is None or entry.building_id == self.building_id)
+            and (self.floor_id is None or entry.floor_id == self.floor_id)
+            and (self.room_id is None or entry.room_id == self.room_id)
+            and (self.role is None or entry.role == self.role)
+        )
+
+
+class LiveView:
+    """
+    In-memory table of live positions keyed by tag_id.
+
+    Design:
+    - Fed by TagStateStore: every put/remove/sync/rename/broadcast re-renders
+      only the affected tag, so LocationService and the users/tags CRUD
+      endpoints keep it current without extra calls
+    - A tag has an entry once it has an assigned user and a live location
+      (the rows the old tags/live_locations/users join returned)
+    - Each entry is encoded to JSON once, when it changes; /live joins frames
+    - trackedUsers / roomsDetected are running counters over active entries
+    - Building/floor strings come from the location index; entries are
+      re-rendered lazily when the index version changes
+    - version increases on every visible change (move, loss, assignment,
+      rename, delete); delta() returns only what changed since a version,
+      walking a change log ordered by version instead of every entry
+    - Versions restart with the process; the epoch tells clients when that
+      happened (and which worker a version came from)
+    - Tag ids are also kept sorted, for keyset pagination (after=<tag_id>)
+    - User roles (for filtering) are kept here, loaded with the tag state
+      and updated by the users CRUD endpoints
+    - Mutations and reads take a lock, so a reader on another thread
+      never sees counters and entries out of step
+    """
+
+    def __init__(self):
+        """Initialize empty view (filled by TagStateStore.load() at startup)."""
+        self._entries: Dict[str, LiveEntry] = {}
+        self._order: List[str] = []  # Sorted tag ids of _entries
+        self._roles: Dict[str, Optional[str]] = {}  # user_id -> role
+        self._room_counts: Dict[int, int] = {}
+        self._tracked = 0
+        self._index_version = location_index.version
+        self._lock = threading.Lock()
+        self.epoch = uuid.uuid4().hex
+        self.version = 0
+        self._changes: "OrderedDict[str, int]" = OrderedDict()  # tag_id -> version, oldest first
+        self._tombstones: "OrderedDict[str, int]" = OrderedDict()  # deleted tag_id -> version
+        self._oldest_delta = 0  # Deltas from before this version cannot be answered
+
+    @staticmethod
+    def _format_timestamp(value: datetime) -> str:
+        return value.strftime("%b %d, %Y, %I:%M:%S %p")
+
+    def _render(self, state) -> Optional[LiveEntry]:
+        """Build a tag's entry from its TagState (None if it does not belong in the view)."""
+        if state.assigned_user_id is None or state.user_name is None or state.room_updated_at is None:
+            return None
+
+        location = location_index.get(state.room_id)
+        item = {
+            "id": state.assigned_user_id,
+            "userName": state.user_name,
+            "handbandSerial": state.tag_id,
+            "lastSeenRoom": location.room_name if location else None,
+            "building": location.building_name if location else None,
+            "floor": location.floor_number if location else None,
+            "fullLocation": location.full_location if location else None,
+            "lastRSSI": None,  # Backend doesn't store RSSI
+            "updatedAt": self._format_timestamp(state.room_updated_at)
+        }
+        return LiveEntry(
+            tag_id=state.tag_id,
+            status=state.status,
+            room_id=state.room_id,
+            floor_id=location.floor_id if location else None,
+            building_id=location.building_id if location else None,
+            counted_room_id=location.room_id if location else None,
+            role=self._roles.get(state.assigned_user_id),
+            item=item,
+            frame=encode_json(item)
+        )
+
+    def _count(self, entry: Optional[LiveEntry], delta: int):
+        """Add (+1) or remove (-1) an entry's contribution to the counters."""
+        if entry is None or entry.status != TagStatus.active:
+            return
+        self._tracked += delta
+        if entry.counted_room_id is None:
+            return
+        count = self._room_counts.get(entry.counted_room_id, 0) + delta
+        if count:
+            self._room_counts[entry.counted_room_id] = count
+        else:
+            self._room_counts.pop(entry.counted_room_id, None)
+
+    def _replace(self, tag_id: str, entry: Optional[LiveEntry]):
+        previous = self._entries.get(tag_id)
+        if previous is None and entry is None:
+            return
+        if previous is not None and entry is not None and previous.key() == entry.key():
+            return
+
+        self.version += 1
+        self._count(previous, -1)
+        if entry is None:
+            del self._entries[tag_id]
+            del self._order[bisect_left(self._order, tag_id)]
+            self._changes.pop(tag_id, None)
+            self._tombstones[tag_id] = self.version
+            self._tombstones.move_to_end(tag_id)
+            if len(self._tombstones) > MAX_TOMBSTONES:
+                _, dropped_version = self._tombstones.popitem(last=False)
+                self._oldest_delta = dropped_version
+            return
+
+        if previous is None:
+            insort(self._order, tag_id)
+        entry.version = self.version
+        self._entries[tag_id] = entry
+        self._changes[tag_id] = self.version
+        self._changes.move_to_end(tag_id)
+        self._tombstones.pop(tag_id, None)
+        self._count(entry, 1)
+
+    def rebuild(self, states: Iterable, roles: Dict[str, Optional[str]]):
+        """
+        Replace the whole view (startup, after the tag state store is loaded).
+
+        Args:
+            states: Every TagState
+            roles: user_id -> role for every user
+        """
+        with self._lock:
+            self._entries = {}
+            self._order = []
+            self._roles = dict(roles)
+            self._room_counts = {}
+            self._tracked = 0
+            self._changes = OrderedDict()
+            self._tombstones = OrderedDict()
+            self._oldest_delta = self.version
+            self._index_version = location_index.version
+            for state in states:
+                self._replace(state.tag_id, self._render(state))
+        logger.info(f"Live view built: {len(self._entries)} positions, {self._tracked} tracked")
+
+    def apply(self, state):
+        """Re-render one tag after its TagState changed."""
+        with self._lock:
+            self._replace(state.tag_id, self._render(state))
+
+    def remove(self, tag_id: str):
+        """Drop a tag (deleted, or its user was deleted)."""
+        with self._lock:
+            self._replace(tag_id, None)
+
+    def set_user_role(self, user_id: str, role: Optional[str]):
+        """
+        Record a user's role (users CRUD). Call before the user's tags are
+        re-rendered (TagStateStore.rename_user) so filters see the new role.
+        """
+        with self._lock:
+            self._roles[user_id] = role
+
+    def forget_user(self, user_id: str):
+        """Drop a deleted user's role."""
+        with self._lock:
+            self._roles.pop(user_id, None)
+
+    def _refresh_locations(self):
+        """Re-render room/building strings after rooms, floors or buildings changed."""
+        from app.services.tag_state import tag_state_store
+
+        self._index_version = location_index.version
+        for tag_id in list(self._entries):
+            state = tag_state_store.get(tag_id)
+            self._replace(tag_id, self._render(state) if state else None)
+
+    def _check_locations(self):
+        if self._index_version != location_index.version:
+            self._refresh_locations()
+
+    @staticmethod
+    def _encode(entry: LiveEntry, fields: Optional[Sequence[str]]) -> str:
+        if fields is None:
+            return entry.frame
+        return encode_json({field: entry.item[field] for field in fields})
+
+    def frames(self, live_filter: LiveFilter = LiveFilter(), after: Optional[str] = None,
+               limit: Optional[int] = None, fields: Optional[Sequence[str]] = None
+               ) -> Tuple[List[str], Optional[str]]:
+        """
+        Position items ordered by tag id, one keyset page at a time.
+
+        Args:
+            live_filter: Which entries to include
+            after: Start after this tag id (the previous page's cursor)
+            limit: Max items (None: all)
+            fields: Only these item fields (None: all, pre-encoded)
+
+        Returns:
+            (items as JSON text, cursor for the next page or None if this is the last)
+        """
+        with self._lock:
+            self._check_locations()
+            start = bisect_right(self._order, after) if after is not None else 0
+            frames, last = [], None
+            for tag_id in itertools.islice(self._order, start, None):
+                entry = self._entries[tag_id]
+                if not live_filter.matches(entry):
+                    continue
+                if limit is not None and len(frames) == limit:
+                    return frames, last  # Another match exists: there is a next page
+                frames.append(self._encode(entry, fields))
+                last = tag_id
+            return frames, None
+
+    def delta(self, since: int, live_filter: LiveFilter = LiveFilter(),
+              fields: Optional[Sequence[str]] = None) -> Optional[Tuple[List[str], List[str]]]:
+        """
+        What changed after a version.
+
+        A tag that changed but no longer matches the filter (e.g. went
+        offline, moved to another floor) is reported as removed, like a
+        deleted tag.
+
+        Args:
+            since: Version the client last saw
+            live_filter: Which entries to include
+            fields: Only these item fields (None: all, pre-encoded)
+
+        Returns:
+            (changed items as JSON text, removed tag ids), or None if the
+            version is too old or from the future (the client needs the full list)
+        """
+        with self._lock:
+            self._check_locations()
+            if since < self._oldest_delta or since > self.version:
+                return None
+
+            frames, removed = [], []
+            for tag_id in reversed(self._changes):
+                if self._changes[tag_id] <= since:
+                    break
+                entry = self._entries[tag_id]
+                if live_filter.matches(entry):
+                    frames.append(self._encode(entry, fields))
+                else:
+                    removed.append(tag_id)
+            for tag_id in reversed(self._tombstones):
+                if self._tombstones[tag_id] <= since:
+                    break
+                removed.append(tag_id)
+            frames.reverse()
+            return frames, removed
+
+    def stats(self) -> Dict[str, int]:
+        """Running counters in LivePositionStats form (all active tags, unfiltered)."""
+        with self._lock:
+            self._check_locations()
+            return {"trackedUsers": self._tracked, "roomsDetected": len(self._room_counts)}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Global live view instance
+live_view = LiveView()
@@ -0,0 +1,167 @@
+"""
+Location index - precomputed Building > Floor > Room hierarchy keyed by room id.
+Used by read endpoints so they do not join rooms/floors/buildings per row.
+"""
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import logging
+
+from app.models.room import Room
+from app.models.floor import Floor
+from app.models.building import Building
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RoomLocation:
+    """Where a room is, with the display string the frontend shows."""
+    room_id: int
+    room_name: str
+    floor_id: int
+    floor_number: int
+    building_id: int
+    building_name: str
+    full_location: str  # "Building > Floor N > Room"
+
+
+class LocationIndex:
+    """
+    In-memory index: room_id -> RoomLocation.
+
+    Design:
+    - Loaded once at startup
+    - Updated incrementally by the rooms/floors/buildings CRUD endpoints:
+      only the rooms under the changed room/floor/building are re-read
+      or removed
+    - Lookups never touch the database
+    - version increases on every change, so views rendered from the
+      index (live_view) know when to re-render
+    """
+
+    def __init__(self):
+        """Initialize empty index (call load() at startup)."""
+        self._by_room: Dict[int, RoomLocation] = {}
+        self.version = 0
+
+    @staticmethod
+    def _query():
+        """Rooms with their floor and building."""
+        return select(
+            Room.id,
+            Room.room_name,
+            Room.floor_id,
+            Floor.floor_number,
+            Floor.building_id,
+            Building.name.label("building_name")
+        ).join(
+            Floor, Room.floor_id == Floor.id
+        ).join(
+            Building, Floor.building_id == Building.id
+        )
+
+    @staticmethod
+    def _to_location(row) -> RoomLocation:
+        return RoomLocation(
+            room_id=row.id,
+            room_name=row.room_name,
+            floor_id=row.floor_id,
+            floor_number=row.floor_number,
+            building_id=row.building_id,
+            building_name=row.building_name,
+            full_location=f"{row.building_name} > Floor {row.floor_number} > {row.room_name}"
+        )
+
+    async def load(self, db: AsyncSession):
+        """
+        Build the full index (startup).
+
+        Args:
+            db: Async database session
+        """
+        result = await db.execute(self._query())
+        self._by_room = {row.id: self._to_location(row) for row in result}
+        self.version += 1
+        logger.info(f"Location index loaded: {len(self._by_room)} rooms")
+
+    def refresh(self, db: Session, room_id: Optional[int] = None, floor_id: Optional[int] = None,
+                building_id: Optional[int] = None):
+        """
+        Re-read the rooms under one room, floor or building (after create/update).
+
+        Args:
+            db: Database session (CRUD endpoints)
+            room_id: Refresh this room
+            floor_id: Refresh all rooms on this floor
+            building_id: Refresh all rooms in this building
+        """
+        query = self._query()
+        if room_id is not None:
+            query = query.where(Room.id == room_id)
+        elif floor_id is not None:
+            query = query.where(Room.floor_id == floor_id)
+        elif building_id is not None:
+            query = query.where(Floor.building_id == building_id)
+
+        for row in db.execute(query):
+            self._by_room[row.id] = self._to_location(row)
+        self.version += 1
+
+    def remove(self, room_id: Optional[int] = None, floor_id: Optional[int] = None,
+               building_id: Optional[int] = None):
+        """
+        Drop the rooms under one room, floor or building (after delete).
+
+        Args:
+            room_id: Remove this room
+            floor_id: Remove all rooms on this floor
+            building_id: Remove all rooms in this building
+        """
+        if room_id is not None:
+            self._by_room.pop(room_id, None)
+            self.version += 1
+            return
+
+        stale = [
+            location.room_id for location in self._by_room.values()
+            if (floor_id is not None and location.floor_id == floor_id)
+            or (building_id is not None and location.building_id == building_id)
+        ]
+        for stale_id in stale:
+            del self._by_room[stale_id]
+        self.version += 1
+
+    def room_ids(self, floor_id: Optional[int] = None, building_id: Optional[int] = None) -> List[int]:
+        """
+        Ids of the rooms on a floor and/or in a building (for room_id IN (...) filters).
+
+        Args:
+            floor_id: Only rooms on this floor
+            building_id: Only rooms in this building
+        """
+        return [
+            location.room_id for location in self._by_room.values()
+            if (floor_id is None or location.floor_id == floor_id)
+            and (building_id is None or location.building_id == building_id)
+        ]
+
+    def get(self, room_id: Optional[int]) -> Optional[RoomLocation]:
+        """
+        Get a room's location.
+
+        Args:
+            room_id: Room primary key (None allowed: returns None)
+
+        Returns:
+            RoomLocation if known, None otherwise
+        """
+        if room_id is None:
+            return None
+        return self._by_room.get(room_id)
+
+
+# Global location index instance
+location_index = LocationIndex()
@@ -2,31 +2,76 @@
 Location service - handles all location event processing.
 CRITICAL: This is the core business logic of the RTLS system.
 """
-from sqlalchemy.orm import Session
+from sqlalchemy import DateTime, Integer, bindparam, delete, func, insert, literal, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timezone
-from typing import Dict
+from typing import Dict, List, Optional, Set
+import asyncio
 import logging
 
+from app.config import settings
+from app.database import AsyncSessionLocal
 from app.models.tag import Tag
 from app.models.live_location import LiveLocation
 from app.models.location_history import LocationHistory
 from app.models.untracked_tag import UntrackedTag
+from app.models.user import User
+from app.models.room import Room
 from app.schemas.location import LocationEvent
 from app.utils.enums import EventType, TagStatus
-from app.services.room_cache import room_cache
+from app.services.room_cache import RoomRecord, room_cache
+from app.services.missing_person_detector import missing_person_detector
+from app.services.occupancy_rollup import ClosedVisit, occupancy_rollup
+from app.services.tag_state import TagState, tag_state_store
 from app.services.websocket_manager import websocket_manager
 
 logger = logging.getLogger(__name__)
 
+# pg_advisory_xact_lock namespace for per-tag locks (second key: hashtext(tag_id))
+TAG_LOCK_NAMESPACE = 7_240_003
+
 
 class LocationService:
     """
     Processes location events from Python MQTT service.
 
     All operations are performed within database transactions to ensure consistency.
+
+    Tag state:
+    - tag_state_store holds every tag's current state in memory (rebuilt at startup)
+    - No-op events (tag already in that room / already lost) are answered from
+      memory; only last_seen is recorded, in a coalesced flush
+    - Write-through (default): real changes are written before returning
+    - Write-behind (LOCATION_WRITE_BEHIND_ENABLED): real changes are applied to
+      memory, broadcast immediately and written by the flusher in batches
+
+    Several ingesting workers (WS_BROADCAST_BACKEND=postgres): each worker's
+    memory lags the others' writes, and the dispatcher only orders events
+    within one process. The database orders them instead: every transaction
+    takes its tags' advisory locks first, then rejects stale events and
+    answers no-ops from the committed rows. Write-behind is disabled.
     """
 
-    async def process_event(self, db: Session, event: LocationEvent) -> Dict[str, str]:
+    def __init__(self):
+        """Initialize location service."""
+        self._pending: List[LocationEvent] = []      # write-behind events not yet in the DB
+        self._touches: Dict[str, datetime] = {}      # tag_id -> newest last_seen from no-op events
+        self._flush_lock = asyncio.Lock()
+        self._flush_failures = 0                     # consecutive failed flushes of pending events
+
+    async def load_state(self, db: AsyncSession):
+        """
+        Rebuild the in-memory tag state from the database (call at startup).
+
+        Args:
+            db: Async database session
+        """
+        await tag_state_store.load(db)
+
+    async def process_event(self, db: AsyncSession, event: LocationEvent) -> Dict[str, str]:
         """
         Process incoming location event atomically within a transaction.
 
@@ -41,6 +86,16 @@ class LocationService:
             Exception: If event processing fails (transaction will be rolled back)
         """
         try:
+            if self.shared_ingestion:
+                answered = await self._answer_from_database(db, event)
+            else:
+                answered = self._answer_from_memory(event)
+            if answered:
+                return answered
+
+            if self._write_behind_active():
+                return await self._defer_event(db, event)
+
             if event.event_type == EventType.LOCATION_CHANGE:
                 return await self._handle_location_change(db, event)
             elif event.event_type == EventType.INITIAL_LOCATION:
@@ -52,95 +107,682 @@ class LocationService:
 
         except Exception as e:
             logger.error(f"Error processing event {event.event_type} for tag {event.tag_id}: {e}", exc_info=True)
-            db.rollback()
+            await db.rollback()
             raise
 
-    async def _handle_location_change(self, db: Session, event: LocationEvent) -> Dict[str, str]:
+    async def process_batch(self, db: AsyncSession, events: List[LocationEvent]) -> List[Dict[str, str]]:
         """
-        Handle LOCATION_CHANGE event.
+        Process a batch of location events in a single transaction.
 
-        Steps:
-        1. Lookup from_room and to_room by name
-        2. Get or create tag
-        3. Update tag: last_seen, status='active'
-        4. Update live_locations: SET room_id = to_room
-        5. Close previous location_history row: SET exited_at = timestamp
-        6. Insert new location_history row
-        7. Broadcast WebSocket event
+        In write-behind mode the events are applied to memory one by one
+        (in timestamp order) and left to the flusher.
+
+        Args:
+            db: Database session
+            events: Location events from Python service
+
+        Returns:
+            list: One response dict (status, message) per event, in input order.
+            Events that fail validation get status 'error'; if the transaction
+            itself fails every event is reported as 'error' so it can be retried.
+        """
+        if self._write_behind_active():
+            results: List[Dict[str, str]] = [None] * len(events)
+            for index in sorted(range(len(events)), key=lambda i: events[i].timestamp):
+                event = events[index]
+                results[index] = self._answer_from_memory(event) or await self._defer_event(db, event)
+            return results
+
+        try:
+            return await self._write_batch(db, events)
+        except Exception as e:
+            logger.error(f"Error processing batch of {len(events)} events: {e}", exc_info=True)
+            await db.rollback()
+            return [{"status": "error", "message": f"Batch transaction failed: {str(e)}"} for _ in events]
+
+    async def run_flusher(self):
+        """
+        Background task: write coalesced state changes every LOCATION_FLUSH_INTERVAL_MS.
+
+        Flushes last_seen updates from no-op events and, in write-behind
+        mode, all deferred events. Runs indefinitely until cancelled.
+        """
+        interval = settings.LOCATION_FLUSH_INTERVAL_MS / 1000
+        if settings.LOCATION_WRITE_BEHIND_ENABLED and self.shared_ingestion:
+            logger.warning("Write-behind is disabled: several workers ingest (WS_BROADCAST_BACKEND=postgres)")
+        logger.info(
+            f"Location flusher started (interval: {settings.LOCATION_FLUSH_INTERVAL_MS}ms, "
+            f"write-behind: {settings.LOCATION_WRITE_BEHIND_ENABLED and not self.shared_ingestion})"
+        )
+
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing location state: {e}", exc_info=True)
+
+    async def flush(self):
+        """
+        Write all pending events and last_seen updates to the database.
+
+        Pending events are written with the same bulk statements as the
+        batch endpoint. On failure they are put back for the next flush;
+        after LOCATION_FLUSH_MAX_RETRIES failures in a row they are written
+        one by one (see _isolate_pending), so one bad event cannot block the rest.
+        """
+        async with self._flush_lock:
+            if self._pending and self._flush_failures >= settings.LOCATION_FLUSH_MAX_RETRIES:
+                await self._isolate_pending()
+
+            pending, self._pending = self._pending, []
+            touches, self._touches = self._touches, {}
+            if not pending and not touches:
+                return
+            flushed_events = len(pending)
+
+            async with AsyncSessionLocal() as db:
+                try:
+                    if pending:
+                        await self._write_batch(db, pending, from_memory=True)
+                        pending = []
+                    if touches:
+                        tags = Tag.__table__
+                        await db.execute(
+                            update(tags).where(
+                                tags.c.tag_id == bindparam("b_tag_id")
+                            ).values(last_seen=func.greatest(tags.c.last_seen, bindparam("b_last_seen"))),
+                            [{"b_tag_id": tag_id, "b_last_seen": last_seen} for tag_id, last_seen in touches.items()]
+                        )
+                        await db.commit()
+                except BaseException as e:
+                    # BaseException: a cancelled flush (shutdown) must not lose its data
+                    await db.rollback()
+                    if pending and isinstance(e, Exception):
+                        self._flush_failures += 1
+                    # Put back whatever was not written; newer touches win
+                    self._pending[:0] = pending
+                    for tag_id, last_seen in touches.items():
+                        if tag_id not in self._touches or last_seen > self._touches[tag_id]:
+                            self._touches[tag_id] = last_seen
+                    raise
+
+            self._flush_failures = 0
+            logger.debug(f"Flushed {flushed_events} events and {len(touches)} last_seen updates")
+
+    async def _isolate_pending(self):
+        """
+        Write pending events one per transaction, in order (flush lock held).
+
+        An event the database rejects on its own (constraint or data error,
+        e.g. its room was deleted) is logged and dropped. Any other error
+        (database unreachable) stops here and keeps the remaining events.
+        """
+        logger.warning(
+            f"Write-behind flush failed {self._flush_failures} times; "
+            f"writing {len(self._pending)} pending events one by one"
+        )
+        async with AsyncSessionLocal() as db:
+            while self._pending:
+                event = self._pending[0]
+                try:
+                    await self._write_batch(db, [event], from_memory=True)
+                except (IntegrityError, DataError) as e:
+                    await db.rollback()
+                    logger.error(
+                        f"Dropped write-behind event {event.event_type.value} for tag {event.tag_id} "
+                        f"at {event.timestamp} (rejected by the database): {e}"
+                    )
+                except BaseException:
+                    await db.rollback()
+                    raise
+                self._pending.pop(0)
+        self._flush_failures = 0
+
+    @property
+    def shared_ingestion(self) -> bool:
+        """Several workers ingest events: the database orders them, not memory."""
+        return settings.WS_BROADCAST_BACKEND == "postgres"
+
+    def _write_behind_active(self) -> bool:
+        """Write-behind needs the in-memory state to be loaded, and a single ingesting worker."""
+        return settings.LOCATION_WRITE_BEHIND_ENABLED and tag_state_store.loaded and not self.shared_ingestion
+
+    @staticmethod
+    async def _lock_tags(db: AsyncSession, tag_ids: Set[str]):
+        """
+        Take the tags' transaction-level advisory locks (released on commit/rollback).
+
+        Locks are taken in tag_id order, so two batches cannot deadlock.
+        """
+        await db.execute(
+            text(
+                "SELECT pg_advisory_xact_lock(:namespace, hashtext(tag_id)) "
+                "FROM (SELECT unnest(CAST(:tag_ids AS text[])) AS tag_id ORDER BY 1) AS ordered"
+            ),
+            {"namespace": TAG_LOCK_NAMESPACE, "tag_ids": sorted(tag_ids)}
+        )
+
+    async def _answer_from_database(self, db: AsyncSession, event: LocationEvent) -> Optional[Dict[str, str]]:
+        """
+        Several workers ingest: lock the tag, then answer stale and no-op events.
+
+        The database counterpart of _answer_from_memory (plus the dispatcher's
+        stale check, which only sees this process). The tag's lock is kept
+        until the caller commits, so the event is applied against the state
+        it was checked against.
+
+        Returns:
+            dict: Response if the event is stale or a no-op, None otherwise
         """
+        await self._lock_tags(db, {event.tag_id})
+        context = (await self._load_tag_context(db, {event.tag_id})).get(event.tag_id)
+        if not context:
+            return None
+
         timestamp = datetime.fromtimestamp(event.timestamp, tz=timezone.utc)
+        if context.last_seen is not None and timestamp < context.last_seen:
+            await db.rollback()
+            logger.warning(
+                f"Rejected stale {event.event_type.value} for tag {event.tag_id}: "
+                f"{timestamp.isoformat()} < last seen {context.last_seen.isoformat()}"
+            )
+            return {"status": "rejected", "message": f"Stale event (last seen: {context.last_seen.isoformat()})"}
 
-        # Lookup rooms (using cache)
-        from_room = await room_cache.get_room_by_name(db, event.from_room) if event.from_room else None
-        to_room = await room_cache.get_room_by_name(db, event.to_room) if event.to_room else None
+        if event.event_type == EventType.TAG_LOST:
+            if context.status == TagStatus.offline:
+                await db.rollback()
+                return {"status": "success", "message": "Tag already marked as lost"}
+            return None
+
+        if context.status == TagStatus.active and event.to_room and context.room_name == event.to_room:
+            await db.execute(update(Tag).where(Tag.tag_id == event.tag_id).values(last_seen=timestamp))
+            await db.commit()
+            state = tag_state_store.get(event.tag_id)
+            if state and (state.last_seen is None or timestamp > state.last_seen):
+                state.last_seen = timestamp
+            missing_person_detector.schedule(event.tag_id, timestamp)
+            return {"status": "success", "message": "Tag already in room"}
+
+        return None
+
+    def _answer_from_memory(self, event: LocationEvent) -> Optional[Dict[str, str]]:
+        """
+        Answer an event that changes nothing without touching the database.
+
+        - INITIAL_LOCATION / LOCATION_CHANGE into the room the tag is already in
+        - TAG_LOST for a tag that is already offline
+
+        Returns:
+            dict: Response if the event is a no-op, None otherwise
+        """
+        state = tag_state_store.get(event.tag_id)
+        if not state:
+            return None
+
+        if event.event_type == EventType.TAG_LOST:
+            if state.status == TagStatus.offline:
+                return {"status": "success", "message": "Tag already marked as lost"}
+            return None
+
+        if state.status == TagStatus.active and event.to_room and state.room_name == event.to_room:
+            timestamp = datetime.fromtimestamp(event.timestamp, tz=timezone.utc)
+            if state.last_seen is None or timestamp > state.last_seen:
+                state.last_seen = timestamp
+                self._touches[event.tag_id] = timestamp
+                missing_person_detector.schedule(event.tag_id, timestamp)  # Clears an open missing alert
+            return {"status": "success", "message": "Tag already in room"}
+
+        return None
+
+    async def _defer_event(self, db: AsyncSession, event: LocationEvent) -> Dict[str, str]:
+        """
+        Write-behind: apply an event to memory, broadcast it and queue it for the flusher.
+
+        Args:
+            db: Database session (only used on room cache misses)
+            event: Location event from Python service
+
+        Returns:
+            dict: Response with status and message
+        """
+        if len(self._pending) >= settings.LOCATION_PENDING_MAX:
+            # The database is not keeping up (or unreachable): refuse rather than grow without bound
+            logger.warning(f"Write-behind queue full ({len(self._pending)} events); refused event for tag {event.tag_id}")
+            return {"status": "error", "message": "Write-behind queue full, retry later"}
+
+        timestamp = datetime.fromtimestamp(event.timestamp, tz=timezone.utc)
+        state = tag_state_store.get(event.tag_id)
+
+        if event.event_type == EventType.TAG_LOST:
+            if not state:
+                logger.warning(f"TAG_LOST event for unknown tag: {event.tag_id}")
+                return {"status": "error", "message": "Tag not found"}
 
+            # Last known room: same precedence as _handle_tag_lost, id and name from one source
+            last_room_id, last_room_name = state.room_id, state.room_name
+            if not last_room_name and event.last_room:
+                last_room = await room_cache.get_room_by_name(db, event.last_room)
+                last_room_id = last_room.id if last_room else None
+                last_room_name = event.last_room
+            state.status = TagStatus.offline
+            tag_state_store.put(state)
+            self._pending.append(event)
+
+            await websocket_manager.broadcast({
+                "type": "TAG_LOST",
+                "tag_id": event.tag_id,
+                "user_name": state.user_name or "Unknown",
+                "last_room": last_room_name or "Unknown",
+                "room_id": last_room_id,
+                "timestamp": event.timestamp
+            })
+            return {"status": "success", "message": "Tag marked as lost"}
+
+        to_room = await room_cache.get_room_by_name(db, event.to_room) if event.to_room else None
         if not to_room and event.to_room:
             logger.warning(f"Unknown room: {event.to_room} for tag {event.tag_id}")
-            # Continue processing with room_id=None
 
-        # Get or create tag
-        tag = db.query(Tag).filter(Tag.tag_id == event.tag_id).first()
-        if not tag:
+        if not state:
             logger.info(f"Creating new tag: {event.tag_id}")
-            tag = Tag(tag_id=event.tag_id, status=TagStatus.active, last_seen=timestamp)
-            db.add(tag)
-        else:
-            tag.last_seen = timestamp
-            tag.status = TagStatus.active
-
-        # Remove from untracked_tags if it was marked as lost before
-        db.query(UntrackedTag).filter(UntrackedTag.tag_id == event.tag_id).delete()
-
-        # Update live location
-        live_loc = db.query(LiveLocation).filter(LiveLocation.tag_id == event.tag_id).first()
-        if live_loc:
-            live_loc.room_id = to_room.id if to_room else None
-            live_loc.updated_at = timestamp
-        else:
-            live_loc = LiveLocation(
-                tag_id=event.tag_id,
-                room_id=to_room.id if to_room else None,
-                updated_at=timestamp
+            state = TagState(tag_id=event.tag_id)
+
+        state.status = TagStatus.active
+        state.last_seen = timestamp
+        state.room_id = to_room.id if to_room else None
+        state.room_name = to_room.room_name if to_room else None
+        state.room_updated_at = timestamp
+        tag_state_store.put(state)
+        self._pending.append(event)
+        missing_person_detector.schedule(event.tag_id, timestamp)
+
+        await self._broadcast_location_update(
+            event.tag_id, state.user_name, state.room_name or "Unknown", state.room_id, timestamp
+        )
+
+        if event.event_type == EventType.LOCATION_CHANGE:
+            return {"status": "success", "message": "Location updated"}
+        return {"status": "success", "message": "Initial location recorded"}
+
+    async def _write_batch(self, db: AsyncSession, events: List[LocationEvent],
+                           from_memory: bool = False) -> List[Dict[str, str]]:
+        """
+        Write a batch of location events in a single transaction.
+
+        Events are applied per tag in timestamp order and the net effect is
+        written with one bulk statement per table:
+        1. Upsert tags (get-or-create, status, last_seen)
+        2. Delete untracked_tags rows for tags that were seen again
+        3. Close previously open location_history rows by primary key
+           (live_locations.open_history_id/open_entered_at)
+        4. Insert new location_history rows (intermediate visits already closed)
+        5. Add every visit closed by the batch to room_occupancy_hourly
+        6. Upsert live_locations with each tag's final room and open visit;
+           clear the open visit of tags that ended the batch lost
+        7. Insert untracked_tags rows for tags that ended the batch lost
+        8. Broadcast WebSocket events after commit
+
+        Args:
+            db: Database session
+            events: Location events
+            from_memory: True when flushing write-behind events; they were
+                already broadcast and applied to the tag state store
+
+        Returns:
+            list: One response dict (status, message) per event, in input order
+
+        Raises:
+            Exception: If the transaction fails (caller rolls back)
+        """
+        results: List[Dict[str, str]] = [None] * len(events)
+        if not events:
+            return results
+
+        if self.shared_ingestion:
+            await self._lock_tags(db, {event.tag_id for event in events})
+
+        # Load current state of every tag in the batch with one query
+        known_tags = await self._load_tag_context(db, {event.tag_id for event in events})
+
+        states = {
+            row.tag_id: {
+                "user_id": row.assigned_user_id,
+                "user_name": row.user_name,
+                "status": row.status,
+                "touched": False,
+                "last_seen": row.last_seen,
+                "room_id": row.room_id,
+                "room_name": row.room_name,
+                "room_updated_at": row.updated_at,
+                "seen_in_batch": False,
+                "existing_visit": (
+                    (row.open_history_id, row.open_entered_at) if row.open_history_id is not None else None
+                ),
+                "open_visit": None,
+                "lost_records": [],
+            }
+            for row in known_tags.values()
+        }
+
+        new_visits = []
+        closed_existing = []
+        closed_visits = []
+        broadcasts = []
+
+        # Apply events per tag in timestamp order (stable for equal timestamps)
+        for index in sorted(range(len(events)), key=lambda i: events[i].timestamp):
+            event = events[index]
+            timestamp = datetime.fromtimestamp(event.timestamp, tz=timezone.utc)
+            state = states.get(event.tag_id)
+
+            if self.shared_ingestion and state and state["last_seen"] and timestamp < state["last_seen"]:
+                # Another worker applied a newer event for this tag (see _answer_from_database)
+                results[index] = {
+                    "status": "rejected",
+                    "message": f"Stale event (last seen: {state['last_seen'].isoformat()})"
+                }
+                continue
+
+            if event.event_type == EventType.TAG_LOST:
+                if not state:
+                    logger.warning(f"TAG_LOST event for unknown tag: {event.tag_id}")
+                    results[index] = {"status": "error", "message": "Tag not found"}
+                    continue
+                if state["status"] == TagStatus.offline:
+                    results[index] = {"status": "success", "message": "Tag already marked as lost"}
+                    continue
+
+                last_room_id = state["room_id"]
+                last_room_name = state["room_name"]
+                last_seen_at = state["last_seen"] or timestamp
+                if last_room_name:
+                    last_seen_at = state["room_updated_at"] or last_seen_at
+                elif event.last_room:
+                    last_room = await room_cache.get_room_by_name(db, event.last_room)
+                    last_room_id = last_room.id if last_room else None
+                    last_room_name = event.last_room
+
+                self._close_batch_visit(state, event.tag_id, timestamp, new_visits, closed_existing, closed_visits)
+                state["status"] = TagStatus.offline
+                state["touched"] = True
+                state["lost_records"].append({
+                    "tag_id": event.tag_id,
+                    "user_id": state["user_id"],
+                    "user_name": state["user_name"],
+                    "last_room_id": last_room_id,
+                    "last_room_name": last_room_name,
+                    "last_seen_at": last_seen_at,
+                    "marked_untracked_at": timestamp
+                })
+
+                results[index] = {"status": "success", "message": "Tag marked as lost"}
+                broadcasts.append({
+                    "type": "TAG_LOST",
+                    "tag_id": event.tag_id,
+                    "user_name": state["user_name"] or "Unknown",
+                    "last_room": last_room_name or "Unknown",
+                    "room_id": last_room_id,
+                    "timestamp": event.timestamp
+                })
+                continue
+
+            if state and state["status"] == TagStatus.active and event.to_room \
+                    and state["room_name"] == event.to_room:
+                # Already in this room: only last_seen moves
+                if state["last_seen"] is None or timestamp > state["last_seen"]:
+                    state["last_seen"] = timestamp
+                    state["touched"] = True
+                results[index] = {"status": "success", "message": "Tag already in room"}
+                continue
+
+            to_room = await room_cache.get_room_by_name(db, event.to_room) if event.to_room else None
+            if not to_room and event.to_room:
+                logger.warning(f"Unknown room: {event.to_room} for tag {event.tag_id}")
+
+            if not state:
+                logger.info(f"Creating new tag: {event.tag_id}")
+                state = states[event.tag_id] = {
+                    "user_id": None,
+                    "user_name": None,
+                    "status": None,
+                    "touched": False,
+                    "last_seen": None,
+                    "room_id": None,
+                    "room_name": None,
+                    "room_updated_at": None,
+                    "seen_in_batch": False,
+                    "existing_visit": None,
+                    "open_visit": None,
+                    "lost_records": [],
+                }
+
+            self._close_batch_visit(state, event.tag_id, timestamp, new_visits, closed_existing, closed_visits)
+
+            state["status"] = TagStatus.active
+            state["touched"] = True
+            state["last_seen"] = timestamp
+            state["room_id"] = to_room.id if to_room else None
+            state["room_name"] = to_room.room_name if to_room else None
+            state["room_updated_at"] = timestamp
+            state["seen_in_batch"] = True
+            # Seeing the tag again removes it from untracked_tags, including
+            # records produced earlier in this same batch
+            state["lost_records"] = []
+
+            state["open_visit"] = len(new_visits)
+            new_visits.append({
+                "tag_id": event.tag_id,
+                "room_id": state["room_id"],
+                "entered_at": timestamp,
+                "exited_at": None
+            })
+
+            if event.event_type == EventType.LOCATION_CHANGE:
+                results[index] = {"status": "success", "message": "Location updated"}
+            else:
+                results[index] = {"status": "success", "message": "Initial location recorded"}
+            broadcasts.append({
+                "type": "LOCATION_UPDATE",
+                "tag_id": event.tag_id,
+                "user_name": state["user_name"] or "Unknown",
+                "room": state["room_name"] or "Unknown",
+                "room_id": state["room_id"],
+                "timestamp": event.timestamp
+            })
+
+        touched = {tag_id: state for tag_id, state in states.items() if state["touched"]}
+        seen = [tag_id for tag_id, state in touched.items() if state["seen_in_batch"]]
+        visit_ids = []
+
+        if touched:
+            # 1. Get-or-create tags and set final status/last_seen
+            tag_upsert = pg_insert(Tag)
+            await db.execute(
+                tag_upsert.on_conflict_do_update(
+                    index_elements=[Tag.tag_id],
+                    set_={"status": tag_upsert.excluded.status, "last_seen": tag_upsert.excluded.last_seen}
+                ),
+                [
+                    {"tag_id": tag_id, "status": state["status"], "last_seen": state["last_seen"]}
+                    for tag_id, state in touched.items()
+                ]
             )
-            db.add(live_loc)
-
-        # Close previous history entry
-        prev_history = db.query(LocationHistory).filter(
-            LocationHistory.tag_id == event.tag_id,
-            LocationHistory.exited_at.is_(None)
-        ).first()
-        if prev_history:
-            prev_history.exited_at = timestamp
-
-        # Insert new history entry
-        new_history = LocationHistory(
-            tag_id=event.tag_id,
-            room_id=to_room.id if to_room else None,
-            entered_at=timestamp
+
+        if seen:
+            # 2. Tags that were seen again are no longer untracked
+            await db.execute(delete(UntrackedTag).where(UntrackedTag.tag_id.in_(seen)))
+
+        history_table = LocationHistory.__table__
+        if closed_existing:
+            # 3. Close visits that were open before this batch: primary-key updates.
+            # Core table UPDATE so the parameter list runs as executemany.
+            await db.execute(
+                update(history_table).where(
+                    history_table.c.id == bindparam("b_id"),
+                    history_table.c.entered_at == bindparam("b_entered_at"),
+                    history_table.c.exited_at.is_(None)
+                ).values(exited_at=bindparam("b_exited_at")),
+                closed_existing
+            )
+
+        if new_visits:
+            # 4. New visits (ids returned in parameter order for live_locations and the tag state store)
+            result = await db.execute(
+                insert(history_table).returning(history_table.c.id, sort_by_parameter_order=True),
+                new_visits
+            )
+            visit_ids = result.scalars().all()
+
+        # 5. Hourly occupancy rollup, committed with the visits it counts
+        await occupancy_rollup.record(db, closed_visits)
+
+        if seen:
+            # 6. Final live location and open visit per tag
+            live_upsert = pg_insert(LiveLocation)
+            await db.execute(
+                live_upsert.on_conflict_do_update(
+                    index_elements=[LiveLocation.tag_id],
+                    set_={
+                        "room_id": live_upsert.excluded.room_id,
+                        "updated_at": live_upsert.excluded.updated_at,
+                        "open_history_id": live_upsert.excluded.open_history_id,
+                        "open_entered_at": live_upsert.excluded.open_entered_at
+                    }
+                ),
+                [
+                    {
+                        "tag_id": tag_id,
+                        "room_id": touched[tag_id]["room_id"],
+                        "updated_at": touched[tag_id]["room_updated_at"],
+                        **self._open_visit_pointer(touched[tag_id], new_visits, visit_ids)
+                    }
+                    for tag_id in seen
+                ]
+            )
+
+        closed_only = [
+            tag_id for tag_id, state in touched.items()
+            if not state["seen_in_batch"] and state["status"] == TagStatus.offline
+        ]
+        if closed_only:
+            # Tags lost without being seen in this batch: their visit is closed, room kept
+            live_locations = LiveLocation.__table__
+            await db.execute(
+                update(live_locations).where(
+                    live_locations.c.tag_id.in_(closed_only)
+                ).values(
+                    open_history_id=None,
+                    open_entered_at=None,
+                    updated_at=live_locations.c.updated_at  # Not a move: suppress onupdate
+                )
+            )
+
+        lost_records = [record for state in touched.values() for record in state["lost_records"]]
+        if lost_records:
+            # 7. Tags that ended the batch lost
+            await db.execute(insert(UntrackedTag), lost_records)
+
+        await db.commit()
+
+        logger.info(
+            f"Batch processed: {len(events)} events, {len(touched)} tags, "
+            f"{len(new_visits)} visits opened, {len(closed_existing)} visits closed"
         )
-        db.add(new_history)
 
-        # Get room name before commit (to avoid detached instance error)
-        room_name = to_room.room_name if to_room else "Unknown"
+        if from_memory:
+            return results  # Memory is already ahead of the DB; events were broadcast when deferred
+
+        for tag_id, state in touched.items():
+            tag_state_store.put(TagState(
+                tag_id=tag_id,
+                status=state["status"],
+                last_seen=state["last_seen"],
+                room_id=state["room_id"],
+                room_name=state["room_name"],
+                room_updated_at=state["room_updated_at"],
+                assigned_user_id=state["user_id"],
+                user_name=state["user_name"]
+            ))
+            if state["status"] == TagStatus.active:
+                missing_person_detector.schedule(tag_id, state["last_seen"])
+
+        # Broadcast WebSocket events in timestamp order
+        for message in broadcasts:
+            await websocket_manager.broadcast(message)
+
+        return results
+
+    def _close_batch_visit(self, state: dict, tag_id: str, timestamp: datetime, new_visits: List[dict],
+                           closed_existing: List[dict], closed_visits: List[ClosedVisit]):
+        """
+        Close the tag's currently open visit while planning a batch.
+
+        Visits opened earlier in the batch are closed in memory (they are
+        inserted already closed); a visit that was open before the batch
+        is queued for the bulk UPDATE. Either way the visit is queued for
+        the occupancy rollup.
+        """
+        if state["open_visit"] is not None:
+            visit = new_visits[state["open_visit"]]
+            visit["exited_at"] = timestamp
+            closed_visits.append(ClosedVisit(tag_id, visit["room_id"], visit["entered_at"], timestamp))
+            state["open_visit"] = None
+        elif state["existing_visit"] is not None:
+            history_id, entered_at = state["existing_visit"]
+            closed_existing.append({"b_id": history_id, "b_entered_at": entered_at, "b_exited_at": timestamp})
+            closed_visits.append(ClosedVisit(tag_id, state["room_id"], entered_at, timestamp))
+        state["existing_visit"] = None
+
+    @staticmethod
+    def _open_visit_pointer(state: dict, new_visits: List[dict], visit_ids: List[int]) -> Dict:
+        """live_locations open-visit columns for a tag at the end of a batch."""
+        if state["open_visit"] is None:
+            return {"open_history_id": None, "open_entered_at": None}
+        return {
+            "open_history_id": visit_ids[state["open_visit"]],
+            "open_entered_at": new_visits[state["open_visit"]]["entered_at"]
+        }
+
+    async def _handle_location_change(self, db: AsyncSession, event: LocationEvent) -> Dict[str, str]:
+        """
+        Handle LOCATION_CHANGE event.
 
-        db.commit()
+        Steps:
+        1. Lookup to_room by name (cache)
+        2. Apply the move with a single upsert statement (see _apply_location)
+        3. Update tag state store
+        4. Broadcast WebSocket event
+        """
+        timestamp = datetime.fromtimestamp(event.timestamp, tz=timezone.utc)
+        to_room = await room_cache.get_room_by_name(db, event.to_room) if event.to_room else None
+
+        if not to_room and event.to_room:
+            logger.warning(f"Unknown room: {event.to_room} for tag {event.tag_id}")
+            # Continue processing with room_id=None
+
+        applied = await self._apply_location(db, event.tag_id, to_room.id if to_room else None, timestamp)
+        await db.commit()
         logger.info(f"LOCATION_CHANGE: Tag {event.tag_id} moved to {event.to_room}")
 
+        self._remember_location(event.tag_id, applied, to_room, timestamp)
+
         # Broadcast WebSocket event
-        await self._broadcast_location_update(tag, room_name, timestamp)
+        await self._broadcast_location_update(
+            event.tag_id, applied.user_name, to_room.room_name if to_room else "Unknown",
+            to_room.id if to_room else None, timestamp
+        )
 
         return {"status": "success", "message": "Location updated"}
 
-    async def _handle_initial_location(self, db: Session, event: LocationEvent) -> Dict[str, str]:
+    async def _handle_initial_location(self, db: AsyncSession, event: LocationEvent) -> Dict[str, str]:
         """
         Handle INITIAL_LOCATION event (first time seeing tag).
 
         Steps:
-        1. Lookup to_room by name
-        2. Create or update tag
-        3. Insert live_locations
-        4. Insert location_history
-        5. Broadcast WebSocket event
+        1. Lookup to_room by name (cache)
+        2. Apply the move with a single upsert statement (see _apply_location)
+        3. Update tag state store
+        4. Broadcast WebSocket event
         """
         timestamp = datetime.fromtimestamp(event.timestamp, tz=timezone.utc)
         to_room = await room_cache.get_room_by_name(db, event.to_room) if event.to_room else None
@@ -148,136 +790,290 @@ class LocationService:
         if not to_room and event.to_room:
             logger.warning(f"Unknown room: {event.to_room} for tag {event.tag_id}")
 
-        # Create or update tag
-        tag = db.query(Tag).filter(Tag.tag_id == event.tag_id).first()
-        if not tag:
-            logger.info(f"Creating new tag: {event.tag_id}")
-            tag = Tag(tag_id=event.tag_id, status=TagStatus.active, last_seen=timestamp)
-            db.add(tag)
-        else:
-            tag.last_seen = timestamp
-            tag.status = TagStatus.active
-
-        # Remove from untracked_tags if it was marked as lost before
-        db.query(UntrackedTag).filter(UntrackedTag.tag_id == event.tag_id).delete()
-
-        # Insert or update live location
-        live_loc = db.query(LiveLocation).filter(LiveLocation.tag_id == event.tag_id).first()
-        if live_loc:
-            # Already exists, update it
-            live_loc.room_id = to_room.id if to_room else None
-            live_loc.updated_at = timestamp
-        else:
-            # Create new
-            live_loc = LiveLocation(
-                tag_id=event.tag_id,
-                room_id=to_room.id if to_room else None,
-                updated_at=timestamp
-            )
-            db.add(live_loc)
+        applied = await self._apply_location(db, event.tag_id, to_room.id if to_room else None, timestamp)
+        await db.commit()
+        logger.info(f"INITIAL_LOCATION: Tag {event.tag_id} detected in {event.to_room}")
 
-        # Insert history entry
-        history = LocationHistory(
-            tag_id=event.tag_id,
-            room_id=to_room.id if to_room else None,
-            entered_at=timestamp
+        self._remember_location(event.tag_id, applied, to_room, timestamp)
+
+        # Broadcast WebSocket event
+        await self._broadcast_location_update(
+            event.tag_id, applied.user_name, to_room.room_name if to_room else "Unknown",
+            to_room.id if to_room else None, timestamp
         )
-        db.add(history)
 
-        # Get room name before commit (to avoid detached instance error)
-        room_name = to_room.room_name if to_room else "Unknown"
+        return {"status": "success", "message": "Initial location recorded"}
 
-        db.commit()
-        logger.info(f"INITIAL_LOCATION: Tag {event.tag_id} detected in {event.to_room}")
+    def _remember_location(self, tag_id: str, applied: Row, to_room: Optional[RoomRecord], timestamp: datetime):
+        """Record a committed move in the tag state store."""
+        tag_state_store.put(TagState(
+            tag_id=tag_id,
+            status=TagStatus.active,
+            last_seen=timestamp,
+            room_id=to_room.id if to_room else None,
+            room_name=to_room.room_name if to_room else None,
+            room_updated_at=timestamp,
+            assigned_user_id=applied.assigned_user_id,
+            user_name=applied.user_name
+        ))
+        missing_person_detector.schedule(tag_id, timestamp)
 
-        # Broadcast WebSocket event
-        await self._broadcast_location_update(tag, room_name, timestamp)
+    async def _apply_location(self, db: AsyncSession, tag_id: str, room_id: Optional[int], timestamp: datetime) -> Row:
+        """
+        Record that a tag is now in a room, in one round-trip.
 
-        return {"status": "success", "message": "Initial location recorded"}
+        Runs a single statement built from data-modifying CTEs:
+        - upsert_tag:      INSERT tags ... ON CONFLICT DO UPDATE (get-or-create, status='active', last_seen)
+        - purge_untracked: DELETE FROM untracked_tags for the tag
+        - close_visit:     UPDATE location_history SET exited_at for the open visit,
+                           by primary key (live_locations.open_history_id/open_entered_at)
+        - open_visit:      INSERT the new location_history row
+        - upsert_live:     INSERT live_locations ... ON CONFLICT DO UPDATE (room_id,
+                           updated_at, and the new visit as the open one)
+
+        The closed visit (if any) is then added to the hourly occupancy rollup.
+
+        All CTEs see the same snapshot, so close_visit reads the pointer as it
+        was before upsert_live moves it and never touches the row inserted by
+        open_visit. ON CONFLICT makes concurrent events for a
+        brand-new tag safe (no IntegrityError on the tags primary key).
+
+        Args:
+            db: Async database session (caller commits)
+            tag_id: BLE MAC address
+            room_id: Destination room (None if unknown)
+            timestamp: Event timestamp
+
+        Returns:
+            Row with assigned_user_id, user_name, history_id (the new visit) and
+            closed_room_id/closed_entered_at (the visit it closed, None if none)
+        """
+        tags = Tag.__table__
+        users = User.__table__
+        live_locations = LiveLocation.__table__
+        history = LocationHistory.__table__
+        untracked = UntrackedTag.__table__
+
+        tag_insert = pg_insert(tags).values(tag_id=tag_id, status=TagStatus.active, last_seen=timestamp)
+        upsert_tag = tag_insert.on_conflict_do_update(
+            index_elements=[tags.c.tag_id],
+            set_={"status": tag_insert.excluded.status, "last_seen": tag_insert.excluded.last_seen}
+        ).returning(tags.c.tag_id, tags.c.assigned_user_id).cte("upsert_tag")
+
+        purge_untracked = delete(untracked).where(untracked.c.tag_id == tag_id).cte("purge_untracked")
+
+        # Previous open visit's primary key, read from the pre-statement snapshot of
+        # live_locations; scalar subqueries let PostgreSQL prune history partitions
+        previous_visit = select(live_locations).where(live_locations.c.tag_id == tag_id)
+        close_visit = update(history).where(
+            history.c.id == previous_visit.with_only_columns(live_locations.c.open_history_id).scalar_subquery(),
+            history.c.entered_at == previous_visit.with_only_columns(live_locations.c.open_entered_at).scalar_subquery(),
+            history.c.exited_at.is_(None)
+        ).values(exited_at=timestamp).returning(history.c.room_id, history.c.entered_at).cte("close_visit")
+
+        open_visit = insert(history).from_select(
+            ["tag_id", "room_id", "entered_at"],
+            select(
+                upsert_tag.c.tag_id,
+                literal(room_id, Integer),
+                literal(timestamp, DateTime(timezone=True))
+            )
+        ).returning(history.c.id, history.c.tag_id, history.c.entered_at).cte("open_visit")
+
+        live_insert = pg_insert(live_locations).from_select(
+            ["tag_id", "room_id", "updated_at", "open_history_id", "open_entered_at"],
+            select(
+                open_visit.c.tag_id,
+                literal(room_id, Integer),
+                literal(timestamp, DateTime(timezone=True)),
+                open_visit.c.id,
+                open_visit.c.entered_at
+            )
+        )
+        upsert_live = live_insert.on_conflict_do_update(
+            index_elements=[live_locations.c.tag_id],
+            set_={
+                "room_id": live_insert.excluded.room_id,
+                "updated_at": live_insert.excluded.updated_at,
+                "open_history_id": live_insert.excluded.open_history_id,
+                "open_entered_at": live_insert.excluded.open_entered_at
+            }
+        ).cte("upsert_live")
+
+        statement = select(
+            upsert_tag.c.assigned_user_id,
+            users.c.name.label("user_name"),
+            open_visit.c.id.label("history_id"),
+            select(close_visit.c.room_id).scalar_subquery().label("closed_room_id"),
+            select(close_visit.c.entered_at).scalar_subquery().label("closed_entered_at")
+        ).select_from(
+            upsert_tag.join(
+                open_visit, open_visit.c.tag_id == upsert_tag.c.tag_id
+            ).outerjoin(
+                users, upsert_tag.c.assigned_user_id == users.c.user_id
+            )
+        ).add_cte(purge_untracked, upsert_live, close_visit)
+
+        applied = (await db.execute(statement)).one()
+        if applied.closed_entered_at is not None:
+            await occupancy_rollup.record(db, [
+                ClosedVisit(tag_id, applied.closed_room_id, applied.closed_entered_at, timestamp)
+            ])
+        return applied
 
-    async def _handle_tag_lost(self, db: Session, event: LocationEvent) -> Dict[str, str]:
+    async def _handle_tag_lost(self, db: AsyncSession, event: LocationEvent) -> Dict[str, str]:
         """
         Handle TAG_LOST event (tag not seen for X seconds).
 
         Steps:
-        1. Update tag status to 'offline'
-        2. Close open location_history entry
-        3. Save untracked tag record with last known information
-        4. Broadcast WebSocket event
+        1. Load tag, assigned user and last known room (one query)
+        2. Update tag status to 'offline'
+        3. Close open location_history entry (and add it to the occupancy rollup)
+        4. Save untracked tag record with last known information
+        5. Update tag state store
+        6. Broadcast WebSocket event
         """
         timestamp = datetime.fromtimestamp(event.timestamp, tz=timezone.utc)
 
-        # Update tag status
-        tag = db.query(Tag).filter(Tag.tag_id == event.tag_id).first()
-        if tag:
-            tag.status = TagStatus.offline
-        else:
+        context = (await self._load_tag_context(db, {event.tag_id})).get(event.tag_id)
+        if not context:
             logger.warning(f"TAG_LOST event for unknown tag: {event.tag_id}")
             return {"status": "error", "message": "Tag not found"}
 
         # Get last known location from live_locations
-        live_loc = db.query(LiveLocation).filter(LiveLocation.tag_id == event.tag_id).first()
-        last_room = None
+        last_room_id = None
         last_room_name = None
-        last_seen_at = tag.last_seen or timestamp
+        last_seen_at = context.last_seen or timestamp
 
-        if live_loc and live_loc.room:
-            last_room = live_loc.room
-            last_room_name = live_loc.room.room_name
-            last_seen_at = live_loc.updated_at or last_seen_at
+        if context.room_name:
+            last_room_id = context.room_id
+            last_room_name = context.room_name
+            last_seen_at = context.updated_at or last_seen_at
         elif event.last_room:
             # Try to get room from event data
             last_room = await room_cache.get_room_by_name(db, event.last_room)
+            last_room_id = last_room.id if last_room else None
             last_room_name = event.last_room
 
-        # Close open history entry
-        history = db.query(LocationHistory).filter(
-            LocationHistory.tag_id == event.tag_id,
-            LocationHistory.exited_at.is_(None)
-        ).first()
-        if history:
-            history.exited_at = timestamp
+        # Update tag status
+        await db.execute(
+            update(Tag).where(Tag.tag_id == event.tag_id).values(status=TagStatus.offline)
+        )
+
+        # Close open history entry (primary-key update via the live_locations pointer)
+        if context.open_history_id is not None:
+            closed = await db.execute(
+                update(LocationHistory).where(
+                    LocationHistory.id == context.open_history_id,
+                    LocationHistory.entered_at == context.open_entered_at,
+                    LocationHistory.exited_at.is_(None)
+                ).values(exited_at=timestamp).returning(LocationHistory.room_id)
+            )
+            closed_visit = closed.first()
+            if closed_visit is not None:
+                await occupancy_rollup.record(db, [
+                    ClosedVisit(event.tag_id, closed_visit.room_id, context.open_entered_at, timestamp)
+                ])
+            await db.execute(
+                update(LiveLocation).where(LiveLocation.tag_id == event.tag_id).values(
+                    open_history_id=None,
+                    open_entered_at=None,
+                    updated_at=LiveLocation.updated_at  # Not a move: suppress onupdate
+                )
+            )
 
         # Create untracked tag record
-        untracked_tag = UntrackedTag(
+        db.add(UntrackedTag(
             tag_id=event.tag_id,
-            user_id=tag.assigned_user_id,
-            user_name=tag.assigned_user.name if tag.assigned_user else None,
-            last_room_id=last_room.id if last_room else None,
+            user_id=context.assigned_user_id,
+            user_name=context.user_name,
+            last_room_id=last_room_id,
             last_room_name=last_room_name,
             last_seen_at=last_seen_at,
             marked_untracked_at=timestamp
-        )
-        db.add(untracked_tag)
+        ))
 
-        db.commit()
+        await db.commit()
         logger.info(f"TAG_LOST: Tag {event.tag_id} marked as offline and saved to untracked_tags")
 
+        tag_state_store.put(TagState(
+            tag_id=event.tag_id,
+            status=TagStatus.offline,
+            last_seen=context.last_seen,
+            room_id=context.room_id,
+            room_name=context.room_name,
+            room_updated_at=context.updated_at,
+            assigned_user_id=context.assigned_user_id,
+            user_name=context.user_name
+        ))
+
         # Broadcast WebSocket event
         await websocket_manager.broadcast({
             "type": "TAG_LOST",
             "tag_id": event.tag_id,
-            "user_name": tag.assigned_user.name if tag.assigned_user else "Unknown",
+            "user_name": context.user_name or "Unknown",
             "last_room": last_room_name or "Unknown",
+            "room_id": last_room_id,
             "timestamp": event.timestamp
         })
 
         return {"status": "success", "message": "Tag marked as lost"}
 
-    async def _broadcast_location_update(self, tag: Tag, room_name: str, timestamp: datetime):
+    async def _load_tag_context(self, db: AsyncSession, tag_ids: Set[str]) -> Dict[str, Row]:
+        """
+        Load tags with their assigned user name and live location in one query.
+
+        Args:
+            db: Async database session
+            tag_ids: Tags to load
+
+        Returns:
+            dict: tag_id -> row (tag_id, status, assigned_user_id, last_seen,
+            user_name, room_id, updated_at, open_history_id, open_entered_at,
+            room_name); unknown tags are absent
+        """
+        result = await db.execute(
+            select(
+                Tag.tag_id,
+                Tag.status,
+                Tag.assigned_user_id,
+                Tag.last_seen,
+                User.name.label("user_name"),
+                LiveLocation.room_id,
+                LiveLocation.updated_at,
+                LiveLocation.open_history_id,
+                LiveLocation.open_entered_at,
+                Room.room_name
+            ).outerjoin(
+                User, Tag.assigned_user_id == User.user_id
+            ).outerjoin(
+                LiveLocation, Tag.tag_id == LiveLocation.tag_id
+            ).outerjoin(
+                Room, LiveLocation.room_id == Room.id
+            ).where(
+                Tag.tag_id.in_(tag_ids)
+            )
+        )
+        return {row.tag_id: row for row in result}
+
+    async def _broadcast_location_update(self, tag_id: str, user_name: Optional[str], room_name: str,
+                                         room_id: Optional[int], timestamp: datetime):
         """
-        Broadcast location update to all WebSocket clients.
+        Broadcast location update to subscribed WebSocket clients.
 
         Args:
-            tag: Tag object
+            tag_id: BLE MAC address
+            user_name: Name of the assigned user (None if unassigned)
             room_name: Name of the room
+            room_id: Room primary key (None if unknown; used for topic routing)
             timestamp: Timestamp of the event
         """
         await websocket_manager.broadcast({
             "type": "LOCATION_UPDATE",
-            "tag_id": tag.tag_id,
-            "user_name": tag.assigned_user.name if tag.assigned_user else "Unknown",
+            "tag_id": tag_id,
+            "user_name": user_name or "Unknown",
             "room": room_name,
+            "room_id": room_id,
             "timestamp": int(timestamp.timestamp())
         })
 
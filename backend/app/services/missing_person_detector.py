@@ -1,97 +1,461 @@
 """
 Missing person detector - background task that monitors tags for inactivity.
 """
-from sqlalchemy.orm import Session
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set, Tuple
 import asyncio
+import heapq
 import logging
+import time
 
 from app.models.tag import Tag
+from app.models.user import User
 from app.models.live_location import LiveLocation
+from app.models.room import Room
+from app.database import AsyncSessionLocal, async_engine
 from app.utils.enums import TagStatus
+from app.services.tag_state import tag_state_store
 from app.services.websocket_manager import websocket_manager
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Held by the one worker that runs detection when several share the database (arbitrary app-wide key)
+LEADER_LOCK_KEY = 7_240_002
+
+
+@dataclass
+class AlertEpisode:
+    """One open missing-person alert: from raised until the tag is seen, lost or removed."""
+    tag_id: str
+    user_name: Optional[str]
+    room_id: Optional[int]
+    room_name: Optional[str]
+    last_seen: datetime
+    raised_at: datetime
+    checked_at: datetime  # Last time the tag was confirmed still missing
+
 
 class MissingPersonDetector:
     """
-    Background task: Check for missing persons every X seconds.
+    Background task: Detect tags not seen for MISSING_PERSON_THRESHOLD_SECONDS.
+
+    Poll mode (MISSING_PERSON_DETECTION_MODE=poll), every X seconds:
+    1. One query for active tags with last_seen older than THRESHOLD, joined
+       with their user and room names (uses ix_tags_status_last_seen)
+    2. Stale tags without an open episode raise one; open episodes whose
+       tag is no longer stale are cleared
+
+    Deadline mode (MISSING_PERSON_DETECTION_MODE=deadline):
+    - Min-heap of (deadline, tag_id), one entry per tracked tag, seeded
+      from the tag state store at startup; LocationService calls
+      schedule() when a tag is located
+    - One task sleeps until the earliest deadline, so alerts fire as the
+      threshold is crossed, with no periodic DB scan
+    - Entries are checked against the tag state store when they expire:
+      a tag seen since then is re-pushed at its real deadline, so updates
+      for already-tracked tags cost O(1) and each re-push O(log n)
+    - While missing, a tag is re-checked every CHECK_INTERVAL (to notice
+      it was lost or removed)
+
+    Alert episodes (both modes):
+    - raised: broadcast MISSING_PERSON (state "raised") once
+    - ongoing: nothing is broadcast; GET /api/alerts/missing-persons lists
+      open episodes
+    - cleared: broadcast MISSING_PERSON_CLEARED (reason seen/lost/removed);
+      LocationService calls schedule() for every sighting (moves and
+      same-room no-ops alike), which clears an open episode immediately;
+      lost/removed tags are cleared by the next sweep or deadline check
+    So the alert stream costs O(changes), not O(missing tags x cycles).
 
-    Logic:
-    1. Query all tags with status='active'
-    2. For each tag: if (current_time - last_seen) > THRESHOLD:
-        - Broadcast MISSING_PERSON WebSocket event
+    Several workers (WS_BROADCAST_BACKEND=postgres):
+    - Only the worker holding a PostgreSQL advisory lock (pg_try_advisory_lock
+      on a dedicated connection) detects and broadcasts; the others retry
+      every CHECK_INTERVAL and take over if its connection goes away
+    - Followers mirror open episodes from the MISSING_PERSON /
+      MISSING_PERSON_CLEARED broadcasts, so every worker serves the same
+      alert list; the leader hears about moves on other workers from their
+      LOCATION_UPDATE broadcasts, and in deadline mode re-reads
+      tags.last_seen before raising (stationary tags only update the database)
     """
 
-    async def run(self, db: Session):
+    def __init__(self):
+        """Initialize detector (deadline heap is empty until run())."""
+        self._heap: List[Tuple[float, str]] = []
+        self._scheduled: Dict[str, float] = {}  # tag_id -> its deadline in the heap
+        self._wakeup: Optional[asyncio.Event] = None
+        self._episodes: Dict[str, AlertEpisode] = {}
+        self._leading = False  # This worker runs detection
+        self._clear_tasks: Set[asyncio.Task] = set()  # Broadcasts of immediate clears
+
+    def open_episodes(self) -> List[AlertEpisode]:
+        """Currently open missing-person episodes, longest missing first."""
+        return sorted(self._episodes.values(), key=lambda episode: episode.last_seen)
+
+    @property
+    def deadline_mode(self) -> bool:
+        return settings.MISSING_PERSON_DETECTION_MODE == "deadline"
+
+    @property
+    def elect_leader(self) -> bool:
+        """Several workers share the database: one of them detects."""
+        return settings.WS_BROADCAST_BACKEND == "postgres"
+
+    def schedule(self, tag_id: str, last_seen: Optional[datetime]):
         """
-        Main loop for missing person detection.
+        A tag was seen: clear its open episode now and make sure it has a
+        missing-person deadline (deadline mode).
 
         Args:
-            db: Database session
+            tag_id: BLE MAC address
+            last_seen: When the tag was last detected
+        """
+        if not self._leading or last_seen is None:
+            return
+
+        episode = self._episodes.get(tag_id)
+        if episode and last_seen > episode.last_seen:
+            del self._episodes[tag_id]
+            task = asyncio.create_task(self._announce_cleared(tag_id, episode, datetime.now(timezone.utc)))
+            self._clear_tasks.add(task)
+            task.add_done_callback(self._clear_tasks.discard)
+
+        if self.deadline_mode and tag_id not in self._scheduled:
+            self._push(tag_id, last_seen.timestamp() + settings.MISSING_PERSON_THRESHOLD_SECONDS)
+
+    def _push(self, tag_id: str, deadline: float):
+        self._scheduled[tag_id] = deadline
+        heapq.heappush(self._heap, (deadline, tag_id))
+        if self._wakeup and self._heap[0][1] == tag_id:
+            # New earliest deadline: let the sleeping task recompute its timeout
+            self._wakeup.set()
+
+    async def apply_broadcast(self, message: dict):
+        """
+        Follow another worker's event (broadcast listener).
+
+        Followers mirror the leader's episodes; the leader treats a
+        LOCATION_UPDATE as a sighting.
+
+        Args:
+            message: Broadcast message received from another worker
+        """
+        message_type = message.get("type")
+        tag_id = message.get("tag_id")
+        if message_type == "LOCATION_UPDATE":
+            self.schedule(tag_id, datetime.fromtimestamp(message["timestamp"], tz=timezone.utc))
+        elif self._leading:
+            return
+        elif message_type == "MISSING_PERSON":
+            raised_at = datetime.fromtimestamp(message["raised_at"], tz=timezone.utc)
+            self._episodes[tag_id] = AlertEpisode(
+                tag_id=tag_id,
+                user_name=message.get("user_name") if message.get("user_name") != "Unknown" else None,
+                room_id=message.get("room_id"),
+                room_name=message.get("last_room"),
+                last_seen=datetime.fromtimestamp(message["last_seen"], tz=timezone.utc),
+                raised_at=raised_at,
+                checked_at=raised_at
+            )
+        elif message_type == "MISSING_PERSON_CLEARED":
+            self._episodes.pop(tag_id, None)
+
+    async def run(self):
+        """
+        Main loop for missing person detection.
 
-        Runs indefinitely until cancelled.
+        With several workers, first waits to become the leader. Runs
+        indefinitely until cancelled.
         """
         logger.info(
-            f"Missing person detector started (threshold: {settings.MISSING_PERSON_THRESHOLD_SECONDS}s, "
+            f"Missing person detector started (mode: {settings.MISSING_PERSON_DETECTION_MODE}, "
+            f"threshold: {settings.MISSING_PERSON_THRESHOLD_SECONDS}s, "
             f"interval: {settings.MISSING_PERSON_CHECK_INTERVAL_SECONDS}s)"
         )
 
+        if not self.elect_leader:
+            self._leading = True
+            await self._detect()
+            return
+
+        while True:
+            try:
+                await self._lead()
+            except Exception as e:
+                logger.error(f"Error in missing person leader election: {e}", exc_info=True)
+            await asyncio.sleep(settings.MISSING_PERSON_CHECK_INTERVAL_SECONDS)
+
+    async def _lead(self):
+        """
+        Try to become the detecting worker; if so, detect for as long as the lock is held.
+        """
+        async with async_engine.connect() as conn:
+            try:
+                acquired = (await conn.execute(
+                    text("SELECT pg_try_advisory_lock(:key)"), {"key": LEADER_LOCK_KEY}
+                )).scalar()
+                await conn.commit()
+                if not acquired:
+                    return
+
+                logger.info("This worker now runs missing person detection")
+                self._leading = True
+                detect = asyncio.create_task(self._detect())
+                try:
+                    while not detect.done():
+                        await asyncio.wait({detect}, timeout=settings.MISSING_PERSON_CHECK_INTERVAL_SECONDS)
+                        # The lock lasts as long as this connection: make sure it is still there
+                        await conn.execute(text("SELECT 1"))
+                        await conn.commit()
+                finally:
+                    self._leading = False
+                    detect.cancel()
+                    await asyncio.gather(detect, return_exceptions=True)
+                    self._heap = []
+                    self._scheduled = {}
+                    logger.info("This worker stopped running missing person detection")
+            finally:
+                # Never return a connection holding the lock to the pool
+                await conn.invalidate()
+
+    async def _detect(self):
+        """
+        Detection loop (poll or deadline mode).
+
+        Poll mode opens a fresh async session for each check so no
+        connection is held between cycles.
+        """
+        if self.deadline_mode:
+            await self._run_deadlines()
+            return
+
         while True:
             try:
-                await self._check_missing_persons(db)
+                async with AsyncSessionLocal() as db:
+                    await self._check_missing_persons(db)
             except Exception as e:
                 logger.error(f"Error in missing person detection: {e}", exc_info=True)
 
             await asyncio.sleep(settings.MISSING_PERSON_CHECK_INTERVAL_SECONDS)
 
-    async def _check_missing_persons(self, db: Session):
+    async def _check_missing_persons(self, db: AsyncSession):
         """
         Check for missing persons and broadcast alerts.
 
         Args:
-            db: Database session
+            db: Async database session
         """
         threshold = timedelta(seconds=settings.MISSING_PERSON_THRESHOLD_SECONDS)
         current_time = datetime.now(timezone.utc)
 
-        # Query active tags
-        active_tags = db.query(Tag).filter(Tag.status == TagStatus.active).all()
+        result = await db.execute(self.stale_tags_query(current_time - threshold))
+        stale_tags = result.all()
+
+        logger.debug(f"Missing person sweep: {len(stale_tags)} stale active tags")
+
+        stale_ids = set()
+        for row in stale_tags:
+            stale_ids.add(row.tag_id)
+            await self._missing(row.tag_id, row.user_name, row.room_id, row.room_name, row.last_seen, current_time)
+
+        for tag_id in [tag_id for tag_id in self._episodes if tag_id not in stale_ids]:
+            await self._clear(tag_id, current_time)
+
+    async def _run_deadlines(self):
+        """
+        Deadline mode loop: sleep until the earliest deadline, then check that tag.
+        """
+        self._wakeup = asyncio.Event()
+        self._heap = []
+        self._scheduled = {}
+        for state in tag_state_store.all():
+            if state.status == TagStatus.active:
+                self.schedule(state.tag_id, state.last_seen)
+        logger.info(f"Missing person deadlines scheduled for {len(self._scheduled)} tags")
 
-        logger.debug(f"Checking {len(active_tags)} active tags for missing persons")
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
 
-        for tag in active_tags:
-            if not tag.last_seen:
+            delay = self._heap[0][0] - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
                 continue
 
-            time_since_seen = current_time - tag.last_seen
-
-            if time_since_seen > threshold:
-                # Get last known location
-                live_loc = db.query(LiveLocation).filter(
-                    LiveLocation.tag_id == tag.tag_id
-                ).first()
-
-                last_room = "Unknown"
-                if live_loc and live_loc.room:
-                    last_room = live_loc.room.room_name
-
-                # Broadcast missing person alert
-                await websocket_manager.broadcast({
-                    "type": "MISSING_PERSON",
-                    "tag_id": tag.tag_id,
-                    "user_name": tag.assigned_user.name if tag.assigned_user else "Unknown",
-                    "last_room": last_room,
-                    "last_seen": int(tag.last_seen.timestamp()),
-                    "missing_duration_seconds": int(time_since_seen.total_seconds())
-                })
-
-                logger.warning(
-                    f"Missing person alert: {tag.tag_id} "
-                    f"(last seen {time_since_seen.total_seconds():.0f}s ago in {last_room})"
-                )
+            deadline, tag_id = heapq.heappop(self._heap)
+            if self._scheduled.get(tag_id) != deadline:
+                continue  # Superseded entry
+            del self._scheduled[tag_id]
+
+            try:
+                await self._check_deadline(tag_id)
+            except Exception as e:
+                logger.error(f"Error in missing person detection for {tag_id}: {e}", exc_info=True)
+
+    async def _check_deadline(self, tag_id: str):
+        """
+        A tag's deadline expired: alert if it is still unseen, else re-arm.
+
+        Args:
+            tag_id: BLE MAC address
+        """
+        state = tag_state_store.get(tag_id)
+        now = time.time()
+        current_time = datetime.fromtimestamp(now, tz=timezone.utc)
+
+        if not state or state.status != TagStatus.active or not state.last_seen:
+            # Lost, deleted or never seen: stop tracking
+            if tag_id in self._episodes:
+                await self._clear(tag_id, current_time)
+            return
+
+        if self.elect_leader:
+            # Sightings in the same room on other workers only reach tags.last_seen
+            async with AsyncSessionLocal() as db:
+                stored = (await db.execute(select(Tag.last_seen).where(Tag.tag_id == tag_id))).scalar()
+            if stored and stored > state.last_seen:
+                state.last_seen = stored
+
+        deadline = state.last_seen.timestamp() + settings.MISSING_PERSON_THRESHOLD_SECONDS
+        if deadline > now:
+            # Seen since the entry was pushed
+            if tag_id in self._episodes:
+                await self._clear(tag_id, current_time)
+            self._push(tag_id, deadline)
+            return
+
+        await self._missing(tag_id, state.user_name, state.room_id, state.room_name, state.last_seen, current_time)
+        self._push(tag_id, now + settings.MISSING_PERSON_CHECK_INTERVAL_SECONDS)
+
+    async def _missing(self, tag_id: str, user_name: Optional[str], room_id: Optional[int],
+                       room_name: Optional[str], last_seen: datetime, current_time: datetime):
+        """
+        A tag is past the threshold: raise an episode, or note it is ongoing.
+
+        Args:
+            tag_id: BLE MAC address
+            user_name: Assigned user's name (None if unassigned)
+            room_id: Last known room id
+            room_name: Last known room name
+            last_seen: When the tag was last detected
+            current_time: Now
+        """
+        episode = self._episodes.get(tag_id)
+        if episode:
+            episode.user_name = user_name
+            episode.room_id = room_id
+            episode.room_name = room_name
+            episode.last_seen = last_seen
+            episode.checked_at = current_time
+            return
+
+        episode = self._episodes[tag_id] = AlertEpisode(
+            tag_id=tag_id,
+            user_name=user_name,
+            room_id=room_id,
+            room_name=room_name,
+            last_seen=last_seen,
+            raised_at=current_time,
+            checked_at=current_time
+        )
+        time_since_seen = current_time - last_seen
+        last_room = room_name or "Unknown"
+
+        # Broadcast missing person alert
+        await websocket_manager.broadcast({
+            "type": "MISSING_PERSON",
+            "state": "raised",
+            "tag_id": tag_id,
+            "user_name": user_name or "Unknown",
+            "last_room": last_room,
+            "room_id": room_id,
+            "last_seen": int(last_seen.timestamp()),
+            "raised_at": int(episode.raised_at.timestamp()),
+            "missing_duration_seconds": int(time_since_seen.total_seconds())
+        })
+
+        logger.warning(
+            f"Missing person alert raised: {tag_id} "
+            f"(last seen {time_since_seen.total_seconds():.0f}s ago in {last_room})"
+        )
+
+    async def _clear(self, tag_id: str, current_time: datetime):
+        """
+        Close a tag's open episode (if still open) and broadcast MISSING_PERSON_CLEARED.
+
+        Args:
+            tag_id: BLE MAC address
+            current_time: Now
+        """
+        episode = self._episodes.pop(tag_id, None)
+        if episode:
+            await self._announce_cleared(tag_id, episode, current_time)
+
+    async def _announce_cleared(self, tag_id: str, episode: AlertEpisode, current_time: datetime):
+        """
+        Broadcast MISSING_PERSON_CLEARED for an episode already removed from the open set.
+
+        Args:
+            tag_id: BLE MAC address
+            episode: The closed episode
+            current_time: Now
+        """
+        state = tag_state_store.get(tag_id)
+        if not state:
+            reason = "removed"
+        elif state.status != TagStatus.active:
+            reason = "lost"
+        else:
+            reason = "seen"
+
+        await websocket_manager.broadcast({
+            "type": "MISSING_PERSON_CLEARED",
+            "tag_id": tag_id,
+            "user_name": episode.user_name or "Unknown",
+            "last_room": episode.room_name or "Unknown",
+            "room_id": episode.room_id,
+            "reason": reason,
+            "raised_at": int(episode.raised_at.timestamp()),
+            "cleared_at": int(current_time.timestamp())
+        })
+
+        logger.info(f"Missing person alert cleared: {tag_id} ({reason})")
+
+    @staticmethod
+    def stale_tags_query(cutoff: datetime):
+        """
+        Active tags not seen since cutoff, with user and room names.
+
+        Args:
+            cutoff: Tags with last_seen before this are stale
+
+        Returns:
+            Select of tag_id, last_seen, user_name, room_id, room_name
+        """
+        return select(
+            Tag.tag_id,
+            Tag.last_seen,
+            User.name.label("user_name"),
+            LiveLocation.room_id,
+            Room.room_name
+        ).outerjoin(
+            User, Tag.assigned_user_id == User.user_id
+        ).outerjoin(
+            LiveLocation, Tag.tag_id == LiveLocation.tag_id
+        ).outerjoin(
+            Room, LiveLocation.room_id == Room.id
+        ).where(
+            Tag.status == TagStatus.active,
+            Tag.last_seen < cutoff
+        )
 
 
 # Global missing person detector instance
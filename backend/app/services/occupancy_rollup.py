@@ -0,0 +1,296 @@
+"""
+Occupancy rollup - keeps room_occupancy_hourly current as visits close and tags move.
+Capacity-planning dashboards read the rollup instead of scanning location_history.
+"""
+from sqlalchemy import event, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Collection, Dict, Iterable, List, Optional, Set, Tuple
+import asyncio
+import logging
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.room import Room
+from app.models.room_occupancy_hourly import RoomOccupancyHourly
+from app.utils.enums import TagStatus
+
+logger = logging.getLogger(__name__)
+
+HOUR = timedelta(hours=1)
+
+# Session.info key for distinct_tags bookkeeping waiting for its transaction
+COUNTED_INFO_KEY = "occupancy_counted"
+
+
+def hour_start(value: datetime) -> datetime:
+    """Start of the UTC hour containing value."""
+    return value.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+@dataclass(frozen=True)
+class ClosedVisit:
+    """A location_history row that has just been closed (or inserted closed)."""
+    tag_id: str
+    room_id: Optional[int]
+    entered_at: datetime
+    exited_at: datetime
+
+
+class OccupancyRollup:
+    """
+    Incremental maintenance of room_occupancy_hourly.
+
+    Design:
+    - record(): LocationService passes every visit it closes; visits,
+      distinct_tags and dwell_seconds are added with one upsert per call,
+      in the caller's transaction (so history and rollup commit together)
+    - A tag is only ever in one room at a time and its visits close in
+      order, so only the first hour of a visit can already contain the tag;
+      the rooms a tag was counted in during its latest hour are kept in
+      memory to decide that (after a restart, or if one tag's events are
+      spread over several workers, distinct_tags can overcount; the backfill
+      script recomputes it exactly); that memory only changes once the
+      transaction commits, so a rolled-back batch is counted again on retry
+    - track(): TagStateStore reports every state change (local events and
+      other workers' broadcasts); current occupancy per room is kept in
+      memory and the highest value per room-hour is flushed every
+      ROLLUP_FLUSH_INTERVAL_SECONDS with GREATEST, which is idempotent
+      across workers
+    - Each flush also raises the current hour to the current occupancy, so
+      tags sitting in a room across an hour boundary count in the new hour
+    - Deleted rooms are forgotten (forget_rooms()); peaks for a room deleted
+      by another worker before it pruned are dropped when the flush fails
+      on the foreign key, not retried
+    """
+
+    def __init__(self):
+        """Initialize empty occupancy (call rebuild() at startup)."""
+        self._room_of: Dict[str, int] = {}  # tag_id -> room it is active in
+        self._occupancy: Dict[int, int] = {}  # room_id -> tags in it now
+        self._peaks: Dict[Tuple[int, datetime], int] = {}  # (room_id, hour) -> peak not yet flushed
+        self._counted: Dict[str, Tuple[datetime, Set[int]]] = {}  # tag_id -> (hour, rooms counted in it)
+
+    def rebuild(self, states: Iterable):
+        """
+        Rebuild current occupancy from every TagState (startup).
+
+        Args:
+            states: Every TagState
+        """
+        self._room_of = {}
+        self._occupancy = {}
+        for state in states:
+            if state.status == TagStatus.active and state.room_id is not None:
+                self._room_of[state.tag_id] = state.room_id
+                self._occupancy[state.room_id] = self._occupancy.get(state.room_id, 0) + 1
+        logger.info(f"Occupancy rebuilt: {len(self._room_of)} tags in {len(self._occupancy)} rooms")
+
+    def _raise_peak(self, room_id: int, hour: datetime, count: int):
+        key = (room_id, hour)
+        if count > self._peaks.get(key, 0):
+            self._peaks[key] = count
+
+    def _move(self, tag_id: str, room_id: Optional[int], at: datetime):
+        previous = self._room_of.get(tag_id)
+        if previous == room_id:
+            return
+        if previous is not None:
+            remaining = self._occupancy.get(previous, 1) - 1
+            if remaining:
+                self._occupancy[previous] = remaining
+            else:
+                self._occupancy.pop(previous, None)
+            del self._room_of[tag_id]
+        if room_id is not None:
+            self._room_of[tag_id] = room_id
+            count = self._occupancy[room_id] = self._occupancy.get(room_id, 0) + 1
+            self._raise_peak(room_id, hour_start(at), count)
+
+    def track(self, state):
+        """Update occupancy after a tag's state changed."""
+        room_id = state.room_id if state.status == TagStatus.active else None
+        self._move(state.tag_id, room_id, state.room_updated_at or datetime.now(timezone.utc))
+
+    def forget(self, tag_id: str):
+        """A tag was deleted: it no longer occupies its room."""
+        self._move(tag_id, None, datetime.now(timezone.utc))
+        self._counted.pop(tag_id, None)
+
+    def forget_rooms(self, room_ids: Collection[int]):
+        """
+        Rooms were deleted: drop their occupancy and unflushed peaks.
+
+        TagStateStore.forget_rooms() moves the tags out first; whatever is
+        left here would otherwise be flushed against a missing room.
+
+        Args:
+            room_ids: Deleted rooms
+        """
+        for tag_id in [tag_id for tag_id, room_id in self._room_of.items() if room_id in room_ids]:
+            del self._room_of[tag_id]
+        for room_id in room_ids:
+            self._occupancy.pop(room_id, None)
+        self._peaks = {key: count for key, count in self._peaks.items() if key[0] not in room_ids}
+
+    def _rows(self, visits: Iterable[ClosedVisit],
+              counted: Dict[str, Tuple[datetime, Set[int]]]) -> List[dict]:
+        """
+        Split closed visits into per room-hour increments.
+
+        Args:
+            visits: Closed visits, in time order per tag
+            counted: Updates to _counted made by this transaction so far
+                (extended here; applied to _counted on commit)
+        """
+        buckets: Dict[Tuple[int, datetime], dict] = {}
+        for visit in visits:
+            if visit.room_id is None:
+                continue
+            first = hour = hour_start(visit.entered_at)
+            while True:
+                bucket = buckets.setdefault((visit.room_id, hour), {
+                    "room_id": visit.room_id,
+                    "hour_start": hour,
+                    "visits": 0,
+                    "distinct_tags": 0,
+                    "dwell_seconds": 0.0,
+                    "peak_occupancy": 0
+                })
+                end = hour + HOUR
+                overlap = min(visit.exited_at, end) - max(visit.entered_at, hour)
+                bucket["dwell_seconds"] += max(overlap.total_seconds(), 0.0)
+                if hour == first:
+                    bucket["visits"] += 1
+                    counted_hour, rooms = counted.get(visit.tag_id) or self._counted.get(visit.tag_id, (None, ()))
+                    if not (counted_hour == hour and visit.room_id in rooms):
+                        bucket["distinct_tags"] += 1
+                else:
+                    bucket["distinct_tags"] += 1  # Later hours only held this visit of the tag
+                if visit.exited_at <= end:
+                    break
+                hour = end
+
+            counted_hour, rooms = counted.get(visit.tag_id) or self._counted.get(visit.tag_id, (None, ()))
+            if counted_hour == hour:
+                counted[visit.tag_id] = (hour, {*rooms, visit.room_id})
+            else:
+                counted[visit.tag_id] = (hour, {visit.room_id})
+        return list(buckets.values())
+
+    def _committed(self, counted: Dict[str, Tuple[datetime, Set[int]]]):
+        """The transaction that recorded visits committed: keep its distinct_tags bookkeeping."""
+        self._counted.update(counted)
+
+    async def record(self, db: AsyncSession, visits: Iterable[ClosedVisit]):
+        """
+        Add closed visits to the rollup (caller commits).
+
+        Which rooms each tag was counted in is only remembered once the
+        caller's transaction commits (see the session event listeners below).
+
+        Args:
+            db: Async database session of the transaction that closed the visits
+            visits: Visits closed in that transaction, in time order per tag
+        """
+        rows = self._rows(visits, db.info.setdefault(COUNTED_INFO_KEY, {}))
+        if not rows:
+            return
+        table = RoomOccupancyHourly.__table__
+        upsert = pg_insert(table)
+        await db.execute(
+            upsert.on_conflict_do_update(
+                index_elements=[table.c.room_id, table.c.hour_start],
+                set_={
+                    "visits": table.c.visits + upsert.excluded.visits,
+                    "distinct_tags": table.c.distinct_tags + upsert.excluded.distinct_tags,
+                    "dwell_seconds": table.c.dwell_seconds + upsert.excluded.dwell_seconds
+                }
+            ),
+            rows
+        )
+
+    async def flush(self):
+        """Write pending peak occupancy (with the current hour raised to current occupancy)."""
+        now_hour = hour_start(datetime.now(timezone.utc))
+        for room_id, count in self._occupancy.items():
+            self._raise_peak(room_id, now_hour, count)
+        if not self._peaks:
+            return
+
+        peaks, self._peaks = self._peaks, {}
+        table = RoomOccupancyHourly.__table__
+        upsert = pg_insert(table)
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    upsert.on_conflict_do_update(
+                        index_elements=[table.c.room_id, table.c.hour_start],
+                        set_={"peak_occupancy": func.greatest(table.c.peak_occupancy, upsert.excluded.peak_occupancy)}
+                    ),
+                    [
+                        {
+                            "room_id": room_id,
+                            "hour_start": hour,
+                            "visits": 0,
+                            "distinct_tags": 0,
+                            "dwell_seconds": 0.0,
+                            "peak_occupancy": count
+                        }
+                        for (room_id, hour), count in peaks.items()
+                    ]
+                )
+                await db.commit()
+        except IntegrityError:
+            # A room was deleted (by another worker, or between the peak and
+            # this flush): keep only the peaks of rooms that still exist
+            async with AsyncSessionLocal() as db:
+                existing = set((await db.execute(
+                    select(Room.id).where(Room.id.in_({room_id for room_id, _ in peaks}))
+                )).scalars().all())
+            dropped = {room_id for room_id, _ in peaks} - existing
+            logger.warning(f"Dropping peak occupancy for deleted rooms: {sorted(dropped)}")
+            self.forget_rooms(dropped)
+            for (room_id, hour), count in peaks.items():
+                if room_id in existing:
+                    self._raise_peak(room_id, hour, count)
+        except Exception:
+            # Keep the peaks for the next attempt
+            for (room_id, hour), count in peaks.items():
+                self._raise_peak(room_id, hour, count)
+            raise
+
+    async def run(self):
+        """
+        Background task: flush peak occupancy every ROLLUP_FLUSH_INTERVAL_SECONDS.
+        Runs indefinitely until cancelled.
+        """
+        while True:
+            await asyncio.sleep(settings.ROLLUP_FLUSH_INTERVAL_SECONDS)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing occupancy rollup: {e}", exc_info=True)
+
+
+# Global occupancy rollup instance
+occupancy_rollup = OccupancyRollup()
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_counted(session: Session):
+    """Keep distinct_tags bookkeeping of a committed transaction."""
+    counted = session.info.pop(COUNTED_INFO_KEY, None)
+    if counted:
+        occupancy_rollup._committed(counted)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_counted(session: Session, transaction):
+    """Forget distinct_tags bookkeeping of a transaction that did not commit."""
+    if transaction.parent is None:
+        session.info.pop(COUNTED_INFO_KEY, None)
@@ -2,83 +2,228 @@
 Room cache service - provides fast in-memory lookups for rooms by name.
 CRITICAL: This is used extensively during event processing.
 """
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.models.room import Room
-from typing import Optional
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional
 import logging
+import time
+
+from app.config import settings
+from app.models.room import Room
+from app.models.floor import Floor
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass(frozen=True)
+class RoomRecord:
+    """Lightweight, immutable copy of a room row (safe to share across sessions)."""
+    id: int
+    room_name: str
+    room_type: Optional[str]
+    floor_id: int
+    building_id: int
+
+
 class RoomCache:
     """
-    In-memory cache for room lookups by name.
+    In-memory directory of all rooms.
 
     Design:
-    - Simple dictionary-based cache (fast lookups)
-    - FIFO eviction when cache is full
-    - Invalidation support for CRUD operations
+    - Full snapshot of every room (positive entries), loaded at startup
+    - Snapshot is immutable; rebuilds swap it in with one assignment,
+      so readers never see a half-built directory
+    - Cache hits never touch the database
+    - Rebuilt by the rooms/floors/buildings CRUD endpoints after changes,
+      and reloaded when older than the positive TTL (catches rooms added
+      by other processes or directly in the database)
+    - Unknown names are cached as negative entries in a bounded LRU with
+      their own (short) TTL; once expired the name is looked up again,
+      so a new anchor's room does not stay "Unknown" forever
+    - Hit/miss/eviction counters are exposed via /api/admin/room-cache
     """
 
-    def __init__(self, maxsize: int = 256):
+    def __init__(self, positive_ttl: int = 300, negative_ttl: int = 30, negative_maxsize: int = 1024):
         """
-        Initialize room cache.
+        Initialize empty room cache (call load() at startup).
 
         Args:
-            maxsize: Maximum number of rooms to cache
+            positive_ttl: Seconds before the room snapshot is reloaded (0 = never)
+            negative_ttl: Seconds an unknown room name is remembered as unknown
+            negative_maxsize: Maximum number of unknown names kept (LRU eviction)
         """
-        self.maxsize = maxsize
-        self._cache = {}
-
-    async def get_room_by_name(self, db: Session, room_name: str) -> Optional[Room]:
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.negative_maxsize = negative_maxsize
+        self._by_name: Mapping[str, RoomRecord] = MappingProxyType({})
+        self._by_id: Mapping[int, RoomRecord] = MappingProxyType({})
+        self._negative: "OrderedDict[str, float]" = OrderedDict()  # room_name -> expiry (monotonic)
+        self._loaded_at = 0.0
+        self.reset_stats()
+
+    @staticmethod
+    def _snapshot_query():
+        """All rooms with their building id."""
+        return select(
+            Room.id,
+            Room.room_name,
+            Room.room_type,
+            Room.floor_id,
+            Floor.building_id
+        ).join(Floor, Room.floor_id == Floor.id)
+
+    def _swap(self, rows):
+        """Build a new snapshot from query rows and publish it."""
+        records = [
+            RoomRecord(
+                id=row.id,
+                room_name=row.room_name,
+                room_type=row.room_type,
+                floor_id=row.floor_id,
+                building_id=row.building_id
+            )
+            for row in rows
+        ]
+        by_name = MappingProxyType({record.room_name: record for record in records})
+        by_id = MappingProxyType({record.id: record for record in records})
+        self._by_name, self._by_id = by_name, by_id
+        self._negative.clear()
+        self._loaded_at = time.monotonic()
+        self.reloads += 1
+        logger.info(f"Room cache loaded: {len(records)} rooms")
+
+    def _add(self, record: RoomRecord):
+        """Publish a snapshot that also contains one newly found room."""
+        by_name = dict(self._by_name)
+        by_id = dict(self._by_id)
+        by_name[record.room_name] = record
+        by_id[record.id] = record
+        self._by_name, self._by_id = MappingProxyType(by_name), MappingProxyType(by_id)
+
+    async def load(self, db: AsyncSession):
         """
-        Get room by name with caching.
+        Load the room snapshot (startup, positive TTL expiry).
 
         Args:
-            db: Database session
-            room_name: Name of the room (e.g., "Room 104")
-
-        Returns:
-            Room object if found, None otherwise
+            db: Async database session
         """
-        # Check cache for room_id
-        if room_name in self._cache:
-            logger.debug(f"Room cache HIT: {room_name}")
-            room_id = self._cache[room_name]
-            if room_id is None:
-                return None
-            # Re-query from current session to avoid detached instance
-            return db.query(Room).filter(Room.id == room_id).first()
+        # Mark as fresh before awaiting so concurrent lookups do not reload too
+        self._loaded_at = time.monotonic()
+        result = await db.execute(self._snapshot_query())
+        self._swap(result)
 
-        logger.debug(f"Room cache MISS: {room_name}")
+    def reload(self, db: Session):
+        """
+        Rebuild the room snapshot after a room/floor/building change.
 
-        # Query database
-        room = db.query(Room).filter(Room.room_name == room_name).first()
+        Args:
+            db: Database session (CRUD endpoints)
+        """
+        self._swap(db.execute(self._snapshot_query()))
 
-        # Cache only the room_id (not the object itself to avoid detached instances)
-        if len(self._cache) >= self.maxsize:
-            # Simple FIFO eviction (pop first item)
-            self._cache.pop(next(iter(self._cache)))
+    async def get_room_by_name(self, db: AsyncSession, room_name: str) -> Optional[RoomRecord]:
+        """
+        Get room by name.
 
-        self._cache[room_name] = room.id if room else None
-        return room
+        Args:
+            db: Async database session (only used on a miss or snapshot expiry)
+            room_name: Name of the room (e.g., "Room 104")
 
-    def invalidate(self, room_name: str = None):
+        Returns:
+            RoomRecord if found, None otherwise
+        """
+        now = time.monotonic()
+        if self.positive_ttl and now - self._loaded_at > self.positive_ttl:
+            await self.load(db)
+
+        record = self._by_name.get(room_name)
+        if record:
+            self.hits += 1
+            return record
+
+        expires_at = self._negative.get(room_name)
+        if expires_at is not None and expires_at > now:
+            self._negative.move_to_end(room_name)
+            self.negative_hits += 1
+            return None
+
+        self.misses += 1
+        result = await db.execute(self._snapshot_query().where(Room.room_name == room_name))
+        row = result.first()
+        if row:
+            record = RoomRecord(
+                id=row.id,
+                room_name=row.room_name,
+                room_type=row.room_type,
+                floor_id=row.floor_id,
+                building_id=row.building_id
+            )
+            self._negative.pop(room_name, None)
+            self._add(record)
+            return record
+
+        self._negative[room_name] = now + self.negative_ttl
+        self._negative.move_to_end(room_name)
+        if len(self._negative) > self.negative_maxsize:
+            self._negative.popitem(last=False)
+            self.evictions += 1
+        return None
+
+    def get_room(self, room_id: int) -> Optional[RoomRecord]:
         """
-        Invalidate cache for specific room or entire cache.
+        Get room by id.
 
         Args:
-            room_name: Room name to invalidate (None = invalidate all)
+            room_id: Room primary key
 
-        Call this when rooms are created/updated/deleted.
+        Returns:
+            RoomRecord if found, None otherwise
+        """
+        return self._by_id.get(room_id)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Cache effectiveness counters since startup (or the last reset).
+
+        Returns:
+            dict: hits, misses, negative_hits, evictions, reloads, hit_ratio,
+            rooms, negative_entries, snapshot_age_seconds and the configured policy
         """
-        if room_name:
-            self._cache.pop(room_name, None)
-            logger.info(f"Room cache invalidated for: {room_name}")
-        else:
-            self._cache.clear()
-            logger.info("Room cache cleared completely")
+        lookups = self.hits + self.misses + self.negative_hits
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "negative_hits": self.negative_hits,
+            "evictions": self.evictions,
+            "reloads": self.reloads,
+            "hit_ratio": (self.hits + self.negative_hits) / lookups if lookups else 0.0,
+            "rooms": len(self._by_name),
+            "negative_entries": len(self._negative),
+            "snapshot_age_seconds": time.monotonic() - self._loaded_at if self._loaded_at else 0.0,
+            "positive_ttl_seconds": self.positive_ttl,
+            "negative_ttl_seconds": self.negative_ttl,
+            "negative_maxsize": self.negative_maxsize,
+        }
+
+    def reset_stats(self):
+        """Reset hit/miss/eviction counters."""
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.evictions = 0
+        self.reloads = 0
+
+    def __len__(self) -> int:
+        return len(self._by_name)
 
 
 # Global room cache instance
-room_cache = RoomCache()
+room_cache = RoomCache(
+    positive_ttl=settings.ROOM_CACHE_POSITIVE_TTL_SECONDS,
+    negative_ttl=settings.ROOM_CACHE_NEGATIVE_TTL_SECONDS,
+    negative_maxsize=settings.ROOM_CACHE_NEGATIVE_MAXSIZE
+)
@@ -0,0 +1,212 @@
+"""
+Tag state store - in-memory view of every tag's current state.
+CRITICAL: LocationService treats this as the authoritative state on the hot path.
+"""
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Collection, Dict, List, Optional
+import logging
+
+from app.models.tag import Tag
+from app.models.user import User
+from app.models.live_location import LiveLocation
+from app.models.room import Room
+from app.services.live_view import live_view
+from app.services.occupancy_rollup import occupancy_rollup
+from app.utils.enums import TagStatus
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TagState:
+    """Current state of one tag (mirrors tags + live_locations)."""
+    tag_id: str
+    status: TagStatus = TagStatus.active
+    last_seen: Optional[datetime] = None
+    room_id: Optional[int] = None
+    room_name: Optional[str] = None
+    room_updated_at: Optional[datetime] = None
+    assigned_user_id: Optional[str] = None
+    user_name: Optional[str] = None
+
+
+class TagStateStore:
+    """
+    In-memory table of TagState keyed by tag_id.
+
+    Design:
+    - Rebuilt from tags/live_locations at startup
+    - Kept current by LocationService on every applied event
+    - Kept current by tags/users CRUD endpoints (assignment, status, names, deletes)
+    - Lookups never touch the database
+    - Every change is forwarded to live_view and occupancy_rollup (put()
+      after in-place edits)
+
+    With several workers, events ingested by other workers arrive over the
+    WebSocket broadcast bus (apply_broadcast), so positions stay current in
+    every process; write-behind remains single-process only.
+    """
+
+    def __init__(self):
+        """Initialize empty store (call load() at startup)."""
+        self._states: Dict[str, TagState] = {}
+        self.loaded = False
+
+    async def load(self, db: AsyncSession):
+        """
+        Rebuild the store from the database.
+
+        Args:
+            db: Async database session
+        """
+        result = await db.execute(
+            select(
+                Tag.tag_id,
+                Tag.status,
+                Tag.last_seen,
+                Tag.assigned_user_id,
+                User.name.label("user_name"),
+                LiveLocation.room_id,
+                LiveLocation.updated_at,
+                Room.room_name
+            ).outerjoin(
+                User, Tag.assigned_user_id == User.user_id
+            ).outerjoin(
+                LiveLocation, Tag.tag_id == LiveLocation.tag_id
+            ).outerjoin(
+                Room, LiveLocation.room_id == Room.id
+            )
+        )
+
+        self._states = {
+            row.tag_id: TagState(
+                tag_id=row.tag_id,
+                status=row.status,
+                last_seen=row.last_seen,
+                room_id=row.room_id,
+                room_name=row.room_name,
+                room_updated_at=row.updated_at,
+                assigned_user_id=row.assigned_user_id,
+                user_name=row.user_name
+            )
+            for row in result
+        }
+        roles = await db.execute(select(User.user_id, User.role))
+        self.loaded = True
+        live_view.rebuild(self._states.values(), dict(roles.all()))
+        occupancy_rollup.rebuild(self._states.values())
+        logger.info(f"Tag state loaded: {len(self._states)} tags")
+
+    @staticmethod
+    def _notify(state: TagState):
+        """Forward a changed state to the views derived from it."""
+        live_view.apply(state)
+        occupancy_rollup.track(state)
+
+    def get(self, tag_id: str) -> Optional[TagState]:
+        """Get a tag's state (None if unknown)."""
+        return self._states.get(tag_id)
+
+    def all(self) -> List[TagState]:
+        """All tag states (a list copy, safe to iterate while events are applied)."""
+        return list(self._states.values())
+
+    def put(self, state: TagState):
+        """Insert or replace a tag's state (also after editing a state in place)."""
+        self._states[state.tag_id] = state
+        self._notify(state)
+
+    def remove(self, tag_id: str):
+        """Forget a tag (call when the tag is deleted)."""
+        self._states.pop(tag_id, None)
+        live_view.remove(tag_id)
+        occupancy_rollup.forget(tag_id)
+
+    def sync_tag(self, tag_id: str, status: TagStatus, last_seen: Optional[datetime],
+                 assigned_user_id: Optional[str], user_name: Optional[str]):
+        """
+        Apply a tags-table change made outside LocationService (CRUD).
+
+        Location fields are kept; a new tag starts without a location.
+        """
+        state = self._states.get(tag_id)
+        if not state:
+            state = self._states[tag_id] = TagState(tag_id=tag_id)
+        state.status = status
+        state.last_seen = last_seen
+        state.assigned_user_id = assigned_user_id
+        state.user_name = user_name
+        self._notify(state)
+
+    def apply_broadcast(self, message: dict):
+        """
+        Apply an event ingested by another worker (received over the broadcast bus).
+
+        Keeps every worker's view of positions current.
+
+        Args:
+            message: LOCATION_UPDATE or TAG_LOST broadcast message
+        """
+        tag_id = message.get("tag_id")
+        state = self._states.get(tag_id)
+
+        if message.get("type") == "TAG_LOST":
+            if state:
+                state.status = TagStatus.offline
+                self._notify(state)
+            return
+
+        if message.get("type") != "LOCATION_UPDATE":
+            return
+        if not state:
+            state = self._states[tag_id] = TagState(tag_id=tag_id)
+        timestamp = datetime.fromtimestamp(message["timestamp"], tz=timezone.utc)
+        state.status = TagStatus.active
+        state.last_seen = max(state.last_seen, timestamp) if state.last_seen else timestamp
+        state.room_id = message.get("room_id")
+        state.room_name = message.get("room") if state.room_id is not None else None
+        state.room_updated_at = timestamp
+        if message.get("user_name") != "Unknown":
+            state.user_name = message.get("user_name")
+        self._notify(state)
+
+    def forget_rooms(self, room_ids: Collection[int]):
+        """
+        Rooms were deleted: their tags no longer have a room (the database
+        sets live_locations.room_id to NULL the same way).
+
+        Args:
+            room_ids: Deleted rooms
+        """
+        if not room_ids:
+            return
+        for state in self._states.values():
+            if state.room_id in room_ids:
+                state.room_id = None
+                state.room_name = None
+                self._notify(state)
+        occupancy_rollup.forget_rooms(room_ids)
+
+    def rename_room(self, room_id: int, room_name: str):
+        """Propagate a room's new name to the tags in it."""
+        for state in self._states.values():
+            if state.room_id == room_id and state.room_name != room_name:
+                state.room_name = room_name
+                self._notify(state)
+
+    def rename_user(self, user_id: str, user_name: str):
+        """Propagate a user's new name to their tags."""
+        for state in self._states.values():
+            if state.assigned_user_id == user_id:
+                state.user_name = user_name
+                self._notify(state)
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+
+# Global tag state store instance
+tag_state_store = TagStateStore()
@@ -2,14 +2,69 @@
 WebSocket manager - handles real-time connections and message broadcasting.
 """
 from fastapi import WebSocket
-from typing import Dict
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+import itertools
 import uuid
 import logging
 import asyncio
 import time
 
+from app.config import settings
+from app.utils.json_encoding import encode_json
+from app.services.broadcast_backend import BroadcastBackend, InMemoryBroadcastBackend, create_broadcast_backend
+from app.services.location_index import location_index
+from app.services.tag_state import tag_state_store
+
 logger = logging.getLogger(__name__)
 
+# Queue priorities. Events are never reordered among themselves: clients
+# drop anything at or below the highest seq they have seen
+SYNC_PRIORITY = 0  # Snapshot/replay on connect: always first
+MESSAGE_PRIORITY = 1
+
+# Message types that get a sequence number and go into the replay buffer
+SEQUENCED_TYPES = frozenset({"LOCATION_UPDATE", "TAG_LOST", "MISSING_PERSON", "MISSING_PERSON_CLEARED"})
+
+# Called with each message (or control message) received from another worker
+MessageListener = Callable[[dict], Awaitable[None]]
+
+# Subscription topic -> message field it matches
+LOCATION_TOPICS = {
+    "buildings": "building_id",
+    "floors": "floor_id",
+    "rooms": "room_id",
+    "tags": "tag_id",
+}
+TOPICS = (*LOCATION_TOPICS, "types")
+
+
+def encode_message(message: dict) -> str:
+    """Encode a message to a JSON text frame (once per broadcast, not per client)."""
+    return encode_json(message)
+
+
+class Connection:
+    """
+    One connected client: its socket, outbound queue and writer task.
+
+    Queue entries are (priority, sequence, frame); the sequence keeps
+    messages of the same priority in the order they were queued, so
+    events leave in seq order. Frames are pre-encoded JSON text shared by
+    every connection.
+    """
+
+    def __init__(self, connection_id: str, websocket: WebSocket, queue_size: int):
+        self.connection_id = connection_id
+        self.websocket = websocket
+        self.queue: asyncio.PriorityQueue = asyncio.PriorityQueue(maxsize=queue_size)
+        self.writer: Optional[asyncio.Task] = None
+        self.subscriptions: Dict[str, Set] = {topic: set() for topic in TOPICS}
+
+    @property
+    def has_location_filter(self) -> bool:
+        return any(self.subscriptions[topic] for topic in LOCATION_TOPICS)
+
 
 class WebSocketManager:
     """
@@ -18,66 +73,448 @@ class WebSocketManager:
     Design:
     - In-memory dictionary of active connections
     - UUID-based connection IDs
-    - Graceful cleanup of dead connections
+    - Each connection has a bounded outbound queue drained by its own
+      writer task, so broadcast() only enqueues and never waits on a socket
+    - Each message is JSON-encoded once and the same frame is sent to
+      every connection
+    - Topic subscriptions (building, floor, room, tag, event type) are
+      indexed topic -> value -> connection ids, so an event is only queued
+      for interested connections; clients without subscriptions get everything
+    - Optional coalescing (WS_COALESCE_WINDOW_MS > 0): LOCATION_UPDATEs are
+      buffered for one window, only the latest per tag is kept, and each
+      client gets one LOCATION_BATCH per window; any other event (alerts)
+      ends the window early, so the batch still goes out before it
+    - Every event gets a monotonically increasing "seq" and is kept in a
+      bounded replay buffer; a new connection first gets a SNAPSHOT of all
+      tag positions at the current seq, while a reconnect with
+      ?resume_from=<seq>&epoch=<epoch> gets only the missed events
+      (REPLAY), or a SNAPSHOT when they are no longer buffered
+    - Events are also published on a broadcast backend (in-memory, or
+      PostgreSQL LISTEN/NOTIFY with several workers); each worker delivers
+      other workers' events to its own sockets and applies them to its
+      tag state store and registered listeners
+    - Control messages (cache invalidations) travel on the same backend
+      but only reach control handlers, never clients
+    - Each connection sends events in seq order (the resume contract);
+      alerts are not moved ahead of queued updates. Queues stay short
+      because slow consumers are dropped and coalescing batches updates
+    - Slow consumers are dropped: queue overflow or a send slower than
+      WS_SEND_TIMEOUT_SECONDS closes the connection
     - Periodic heartbeat to keep connections alive
     """
 
-    def __init__(self):
-        """Initialize WebSocket manager."""
-        self.active_connections: Dict[str, WebSocket] = {}
+    def __init__(self, queue_size: int = 256, send_timeout: float = 5.0, coalesce_window_ms: int = 0,
+                 replay_size: int = 1000, backend: Optional[BroadcastBackend] = None):
+        """
+        Initialize WebSocket manager.
+
+        Args:
+            queue_size: Maximum messages queued per connection before it is dropped
+            send_timeout: Seconds a single send may take before the connection is dropped
+            coalesce_window_ms: LOCATION_UPDATE coalescing window (0 = send each update)
+            replay_size: Number of recent events kept for resuming clients
+            backend: Cross-worker broadcast transport (default: in-memory, single worker)
+        """
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.coalesce_window = coalesce_window_ms / 1000
+        self._coalesced: Dict[str, dict] = {}  # tag_id -> latest buffered LOCATION_UPDATE
+        self._coalesce_timer: Optional[asyncio.TimerHandle] = None
+        self.active_connections: Dict[str, Connection] = {}
+        self._sequence = itertools.count()  # queue tie-breaker (send order)
+        # Event sequence numbers restart with the process; the epoch tells clients when that happened
+        self.epoch = uuid.uuid4().hex
+        self.seq = 0
+        self._replay: Deque[Tuple[int, dict]] = deque(maxlen=replay_size)
+        self.backend = backend or InMemoryBroadcastBackend()
+        # topic -> value -> connection ids
+        self._index: Dict[str, Dict[object, Set[str]]] = {topic: {} for topic in TOPICS}
+        self._any_location: Set[str] = set()  # connections without building/floor/room/tag topics
+        self._any_type: Set[str] = set()      # connections without type topics
+        self._listeners: List[MessageListener] = []
+        self._control_handlers: List[MessageListener] = []
+
+    def add_listener(self, listener: MessageListener):
+        """Also pass every event received from another worker to listener (startup)."""
+        self._listeners.append(listener)
 
-    async def connect(self, websocket: WebSocket) -> str:
+    def add_control_handler(self, handler: MessageListener):
+        """Pass every control message received from another worker to handler (startup)."""
+        self._control_handlers.append(handler)
+
+    async def connect(self, websocket: WebSocket, resume_from: Optional[int] = None,
+                      epoch: Optional[str] = None) -> str:
         """
-        Accept WebSocket connection and assign unique ID.
+        Accept WebSocket connection, assign unique ID and queue the initial sync.
 
         Args:
             websocket: FastAPI WebSocket object
+            resume_from: Last seq the client saw (reconnects)
+            epoch: Epoch of the server that seq came from
 
         Returns:
             str: Unique connection ID
         """
         await websocket.accept()
         connection_id = str(uuid.uuid4())
-        self.active_connections[connection_id] = websocket
-        logger.info(f"WebSocket connected: {connection_id} (total: {len(self.active_connections)})")
+        connection = Connection(connection_id, websocket, self.queue_size)
+        connection.writer = asyncio.create_task(self._writer(connection))
+        self.active_connections[connection_id] = connection
+        self._any_location.add(connection_id)
+        self._any_type.add(connection_id)
+
+        missed = self._missed_since(resume_from) if epoch == self.epoch else None
+        if missed is not None:
+            sync = {"type": "REPLAY", "epoch": self.epoch, "seq": self.seq, "messages": missed}
+        else:
+            sync = self._snapshot()
+        self._enqueue(connection, (SYNC_PRIORITY, next(self._sequence), encode_message(sync)))
+
+        logger.info(
+            f"WebSocket connected: {connection_id} (total: {len(self.active_connections)}, "
+            f"sync: {sync['type']})"
+        )
         return connection_id
 
+    def _missed_since(self, resume_from: Optional[int]) -> Optional[List[dict]]:
+        """
+        Buffered events after resume_from, or None if the gap is not fully buffered.
+        """
+        if resume_from is None or resume_from > self.seq:
+            return None
+        oldest = self._replay[0][0] if self._replay else self.seq + 1
+        if resume_from + 1 < oldest:
+            return None
+        return [message for seq, message in self._replay if seq > resume_from]
+
+    def _snapshot(self) -> dict:
+        """Current position of every located tag, tagged with the current seq."""
+        positions = []
+        for state in tag_state_store.all():
+            if state.room_id is None:
+                continue
+            location = location_index.get(state.room_id)
+            positions.append({
+                "tag_id": state.tag_id,
+                "user_name": state.user_name or "Unknown",
+                "status": state.status.value,
+                "room": state.room_name or "Unknown",
+                "room_id": state.room_id,
+                "floor_id": location.floor_id if location else None,
+                "building_id": location.building_id if location else None,
+                "timestamp": int(state.room_updated_at.timestamp()) if state.room_updated_at else None
+            })
+        return {"type": "SNAPSHOT", "epoch": self.epoch, "seq": self.seq, "positions": positions}
+
     def disconnect(self, connection_id: str):
         """
-        Remove connection from active connections.
+        Remove connection from active connections and stop its writer.
 
         Args:
             connection_id: Connection ID to remove
         """
-        if connection_id in self.active_connections:
-            del self.active_connections[connection_id]
+        connection = self.active_connections.pop(connection_id, None)
+        if connection:
+            self._unindex(connection)
+            self._any_location.discard(connection_id)
+            self._any_type.discard(connection_id)
+            if connection.writer and connection.writer is not asyncio.current_task():
+                connection.writer.cancel()
             logger.info(f"WebSocket disconnected: {connection_id} (remaining: {len(self.active_connections)})")
 
-    async def broadcast(self, message: dict):
+    def _drop(self, connection: Connection, reason: str):
+        """
+        Evict a slow or broken client and close its socket in the background.
+
+        The endpoint's receive loop then ends with a disconnect, which is a no-op here.
+        """
+        if connection.connection_id not in self.active_connections:
+            return
+        logger.warning(f"Dropping WebSocket {connection.connection_id}: {reason}")
+        self.disconnect(connection.connection_id)
+        asyncio.create_task(self._close(connection.websocket))
+
+    async def _close(self, websocket: WebSocket):
+        try:
+            # 1013 = try again later
+            await asyncio.wait_for(websocket.close(code=1013), timeout=self.send_timeout)
+        except Exception:
+            pass
+
+    async def _writer(self, connection: Connection):
+        """
+        Per-connection task: send queued messages (sync first, then in queue order).
+
+        Args:
+            connection: Connection to drain
+        """
+        while True:
+            _, _, frame = await connection.queue.get()
+            try:
+                async with asyncio.timeout(self.send_timeout):
+                    await connection.websocket.send_text(frame)
+            except asyncio.TimeoutError:
+                self._drop(connection, f"send timed out after {self.send_timeout}s")
+                return
+            except Exception as e:
+                logger.warning(f"Failed to send to {connection.connection_id}: {e}")
+                self.disconnect(connection.connection_id)
+                return
+
+    def _index_connection(self, connection: Connection):
+        """Add a connection's subscriptions to the topic index."""
+        for topic, values in connection.subscriptions.items():
+            for value in values:
+                self._index[topic].setdefault(value, set()).add(connection.connection_id)
+
+        if connection.has_location_filter:
+            self._any_location.discard(connection.connection_id)
+        else:
+            self._any_location.add(connection.connection_id)
+        if connection.subscriptions["types"]:
+            self._any_type.discard(connection.connection_id)
+        else:
+            self._any_type.add(connection.connection_id)
+
+    def _unindex(self, connection: Connection):
+        """Remove a connection's subscriptions from the topic index."""
+        for topic, values in connection.subscriptions.items():
+            by_value = self._index[topic]
+            for value in values:
+                subscribers = by_value.get(value)
+                if subscribers:
+                    subscribers.discard(connection.connection_id)
+                    if not subscribers:
+                        del by_value[value]
+
+    def subscribe(self, connection_id: str, topics: Dict[str, Iterable]) -> Dict[str, list]:
+        """
+        Add topics to a connection's subscriptions.
+
+        Args:
+            connection_id: Connection ID
+            topics: topic name (buildings/floors/rooms/tags/types) -> values
+
+        Returns:
+            dict: The connection's subscriptions after the change
+        """
+        return self._update_subscriptions(connection_id, topics, add=True)
+
+    def unsubscribe(self, connection_id: str, topics: Dict[str, Iterable]) -> Dict[str, list]:
         """
-        Broadcast message to all active connections.
+        Remove topics from a connection's subscriptions (all of them if none given).
 
         Args:
+            connection_id: Connection ID
+            topics: topic name (buildings/floors/rooms/tags/types) -> values
+
+        Returns:
+            dict: The connection's subscriptions after the change
+        """
+        return self._update_subscriptions(connection_id, topics, add=False)
+
+    def _update_subscriptions(self, connection_id: str, topics: Dict[str, Iterable], add: bool) -> Dict[str, list]:
+        connection = self.active_connections.get(connection_id)
+        if not connection:
+            return {}
+
+        self._unindex(connection)
+        if not add and not any(topics.get(topic) for topic in TOPICS):
+            for values in connection.subscriptions.values():
+                values.clear()
+        for topic in TOPICS:
+            values = set(topics.get(topic) or ())
+            if add:
+                connection.subscriptions[topic] |= values
+            else:
+                connection.subscriptions[topic] -= values
+        self._index_connection(connection)
+
+        return {topic: sorted(values) for topic, values in connection.subscriptions.items()}
+
+    def _recipients(self, message: dict) -> Set[str]:
+        """Connection ids whose subscriptions match a message."""
+        if message.get("type") == "HEARTBEAT":
+            return set(self.active_connections)
+
+        by_location = set(self._any_location)
+        for topic, field in LOCATION_TOPICS.items():
+            value = message.get(field)
+            if value is not None:
+                by_location |= self._index[topic].get(value, set())
+
+        by_type = self._any_type | self._index["types"].get(message.get("type"), set())
+        return by_location & by_type
+
+    @staticmethod
+    def _with_hierarchy(message: dict) -> dict:
+        """Add floor_id/building_id for the message's room (routing and client-side filtering)."""
+        location = location_index.get(message.get("room_id"))
+        if not location:
+            return message
+        return {**message, "floor_id": location.floor_id, "building_id": location.building_id}
+
+    def _enqueue(self, connection: Connection, entry: tuple):
+        try:
+            connection.queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            self._drop(connection, f"outbound queue full ({self.queue_size} messages)")
+
+    async def send(self, connection_id: str, message: dict):
+        """
+        Queue a message for one connection (e.g., a reply to a client request).
+
+        Args:
+            connection_id: Connection ID
             message: Dictionary to send as JSON
+        """
+        connection = self.active_connections.get(connection_id)
+        if connection:
+            self._enqueue(connection, (MESSAGE_PRIORITY, next(self._sequence), encode_message(message)))
+
+    async def start(self):
+        """Start receiving other workers' broadcasts (startup)."""
+        await self.backend.start(self._receive)
+
+    async def broadcast(self, message: dict):
+        """
+        Send an event to subscribed clients of every worker.
+
+        Args:
+            message: Dictionary to send as JSON (room_id and tag_id are used for routing)
+
+        Returns immediately; writer tasks do the sending. Connections whose
+        queue is full are dropped.
+        """
+        await self._deliver(message)
+        await self.backend.publish({"origin": self.epoch, "message": message})
+
+    async def publish_control(self, message: dict):
+        """
+        Send a control message to every other worker (not to clients).
 
-        Handles disconnected clients gracefully (removes from pool).
+        Args:
+            message: Dictionary with a "type" (e.g. INVALIDATE)
         """
-        dead_connections = []
+        await self.backend.publish({"origin": self.epoch, "control": message})
+
+    async def _receive(self, envelope: dict):
+        """Deliver an event (or control message) published by another worker."""
+        if envelope.get("origin") == self.epoch:
+            return
+
+        control = envelope.get("control")
+        if control is not None:
+            for handler in self._control_handlers:
+                try:
+                    await handler(control)
+                except Exception as e:
+                    logger.error(f"Error handling control message {control.get('type')}: {e}", exc_info=True)
+            return
 
-        for connection_id, websocket in self.active_connections.items():
+        message = envelope["message"]
+        tag_state_store.apply_broadcast(message)
+        for listener in self._listeners:
             try:
-                print("yesyseydcsdc")
-                await websocket.send_json(message)
-                print(f"Message sent to {connection_id}: {message.get('type')}")
-                logger.info(f"Message sent to {connection_id}: {message.get('type')}")
-                logger.debug(f"Message sent to {connection_id}: {message.get('type')}")
+                await listener(message)
             except Exception as e:
-                logger.warning(f"Failed to send to {connection_id}: {e}")
-                dead_connections.append(connection_id)
+                logger.error(f"Error in broadcast listener for {message.get('type')}: {e}", exc_info=True)
+        await self._deliver(message)
+
+    async def _deliver(self, message: dict):
+        """
+        Queue a message for every local connection subscribed to it.
+
+        Args:
+            message: Dictionary to send as JSON
+        """
+        message = self._with_hierarchy(message)
+        sequenced = message.get("type") in SEQUENCED_TYPES
+        if sequenced:
+            self.seq += 1
+            message = {**message, "seq": self.seq}
+            self._replay.append((self.seq, message))
+
+        if not self.active_connections:
+            return
+
+        if self.coalesce_window > 0 and sequenced:
+            if message.get("type") == "LOCATION_UPDATE":
+                self._coalesce(message)
+                return
+            # Send the buffered updates (lower seqs) before this event
+            self._end_window()
+
+        recipients = self._recipients(message)
+        if not recipients:
+            return
 
-        # Clean up dead connections
-        for connection_id in dead_connections:
+        entry = (MESSAGE_PRIORITY, next(self._sequence), encode_message(message))
+
+        for connection_id in recipients:
+            connection = self.active_connections.get(connection_id)
+            if connection:
+                self._enqueue(connection, entry)
+
+    def _coalesce(self, message: dict):
+        """Buffer a LOCATION_UPDATE (latest per tag) and arm the window timer."""
+        self._coalesced[message.get("tag_id")] = message
+        if self._coalesce_timer is None:
+            loop = asyncio.get_running_loop()
+            self._coalesce_timer = loop.call_later(self.coalesce_window, self._flush_coalesced)
+
+    def _end_window(self):
+        """Flush the coalescing window now (before another event is queued)."""
+        if self._coalesce_timer is not None:
+            self._coalesce_timer.cancel()
+            self._flush_coalesced()
+
+    def _flush_coalesced(self):
+        """
+        End of window: send each client one LOCATION_BATCH with its matching updates.
+
+        Clients with identical matches share one encoded frame (with no
+        subscriptions that is a single encode for everyone).
+        """
+        self._coalesce_timer = None
+        updates = list(self._coalesced.values())
+        self._coalesced = {}
+        if not updates or not self.active_connections:
+            return
+
+        per_connection: Dict[str, list] = {}
+        for position, update in enumerate(updates):
+            for connection_id in self._recipients(update):
+                per_connection.setdefault(connection_id, []).append(position)
+
+        frames: Dict[tuple, tuple] = {}
+        for connection_id, positions in per_connection.items():
+            key = tuple(positions)
+            entry = frames.get(key)
+            if entry is None:
+                batch = [updates[position] for position in positions]
+                entry = frames[key] = (MESSAGE_PRIORITY, next(self._sequence), encode_message({
+                    "type": "LOCATION_BATCH",
+                    "updates": batch,
+                    "seq": max(update["seq"] for update in batch),
+                    "timestamp": int(time.time())
+                }))
+            connection = self.active_connections.get(connection_id)
+            if connection:
+                self._enqueue(connection, entry)
+
+    async def close(self):
+        """Stop all writer tasks (shutdown)."""
+        if self._coalesce_timer:
+            self._coalesce_timer.cancel()
+            self._coalesce_timer = None
+        writers = [c.writer for c in self.active_connections.values() if c.writer]
+        for writer in writers:
+            writer.cancel()
+        await asyncio.gather(*writers, return_exceptions=True)
+        for connection_id in list(self.active_connections):
             self.disconnect(connection_id)
+        await self.backend.stop()
 
     async def send_heartbeat(self):
         """
@@ -85,13 +522,12 @@ class WebSocketManager:
 
         Runs every WS_HEARTBEAT_INTERVAL_SECONDS.
         """
-        from app.config import settings
-
         while True:
             await asyncio.sleep(settings.WS_HEARTBEAT_INTERVAL_SECONDS)
 
             if self.active_connections:
-                await self.broadcast({
+                # Local only: every worker sends its own heartbeats
+                await self._deliver({
                     "type": "HEARTBEAT",
                     "timestamp": int(time.time())
                 })
@@ -99,4 +535,10 @@ class WebSocketManager:
 
 
 # Global WebSocket manager instance
-websocket_manager = WebSocketManager()
+websocket_manager = WebSocketManager(
+    queue_size=settings.WS_SEND_QUEUE_SIZE,
+    send_timeout=settings.WS_SEND_TIMEOUT_SECONDS,
+    coalesce_window_ms=settings.WS_COALESCE_WINDOW_MS,
+    replay_size=settings.WS_REPLAY_BUFFER_SIZE,
+    backend=create_broadcast_backend()
+)
@@ -0,0 +1,28 @@
+"""
+Keyset pagination cursors over (timestamp, id) pairs.
+Cursors are URL-safe strings: "<timestamp in epoch microseconds>_<id>".
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Tuple
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """Cursor pointing just past the row (timestamp, row_id)."""
+    return f"{(timestamp - EPOCH) // timedelta(microseconds=1)}_{row_id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Split a cursor back into (timestamp, id).
+
+    Raises:
+        ValueError: If the cursor is malformed or its timestamp is out of range
+    """
+    micros, row_id = cursor.split("_")
+    try:
+        timestamp = EPOCH + timedelta(microseconds=int(micros))
+    except OverflowError:
+        raise ValueError(f"Cursor timestamp out of range: {micros}")
+    return timestamp, int(row_id)
@@ -0,0 +1,20 @@
+"""
+Fast JSON encoding for pre-serialized payloads (WebSocket frames, cached API rows).
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+
+def encode_json(value) -> str:
+    """
+    Encode a value to compact JSON text.
+
+    Uses orjson when installed, falling back to the standard library.
+    """
+    if orjson is not None:
+        return orjson.dumps(value, default=str).decode()
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
@@ -0,0 +1,17 @@
+"""
+Timestamp helpers for query parameters.
+"""
+from datetime import datetime, timezone
+from typing import Optional
+
+
+def as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """
+    Treat a timestamp without an offset as UTC (None passes through).
+
+    Every stored timestamp is UTC, so from/to query parameters given
+    without an offset mean the same range on every endpoint.
+    """
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Rebuild room_occupancy_hourly from location_history.
+Run from backend/ after migrations: python scripts/backfill_room_rollup.py
+
+Recomputes every hour bucket in one transaction (run once after migration
+007, or any time to correct drift). The rollup table is locked for the
+duration: running backends wait to add visits until the rebuild commits,
+so nothing is counted twice or lost.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text  # noqa: E402
+
+from app.database import SessionLocal  # noqa: E402
+
+# Hour buckets of one visit: every hour it overlaps. A visit ending exactly
+# on the hour does not reach the next bucket (same split as OccupancyRollup).
+VISIT_HOURS = """
+    generate_series(
+        date_trunc('hour', h.entered_at),
+        greatest({end} - interval '1 microsecond', h.entered_at),
+        interval '1 hour'
+    ) AS b(hour_start)
+"""
+
+# visits / distinct_tags / dwell_seconds from closed visits
+CLOSED_VISITS = f"""
+INSERT INTO room_occupancy_hourly (room_id, hour_start, visits, distinct_tags, dwell_seconds, peak_occupancy)
+SELECT
+    h.room_id,
+    b.hour_start,
+    count(*) FILTER (WHERE b.hour_start = date_trunc('hour', h.entered_at)),
+    count(DISTINCT h.tag_id),
+    sum(extract(epoch FROM least(h.exited_at, b.hour_start + interval '1 hour')
+                         - greatest(h.entered_at, b.hour_start)))::float,
+    0
+FROM location_history h
+CROSS JOIN LATERAL {VISIT_HOURS.format(end="h.exited_at")}
+WHERE h.room_id IS NOT NULL AND h.exited_at IS NOT NULL
+GROUP BY h.room_id, b.hour_start
+"""
+
+# peak_occupancy: the higher of the occupancy at the start of the hour and
+# the running maximum over the entries/exits inside it (open visits included;
+# at equal timestamps exits are applied first)
+PEAKS = f"""
+WITH changes AS (
+    SELECT room_id, entered_at AS at, 1 AS delta
+    FROM location_history WHERE room_id IS NOT NULL
+    UNION ALL
+    SELECT room_id, exited_at, -1
+    FROM location_history WHERE room_id IS NOT NULL AND exited_at IS NOT NULL
+),
+running AS (
+    SELECT room_id, at,
+           sum(delta) OVER (PARTITION BY room_id ORDER BY at, delta ROWS UNBOUNDED PRECEDING) AS occupancy
+    FROM changes
+),
+at_hour_start AS (
+    SELECT h.room_id, b.hour_start, count(*) AS occupancy
+    FROM location_history h
+    CROSS JOIN LATERAL {VISIT_HOURS.format(end="coalesce(h.exited_at, now())")}
+    WHERE h.room_id IS NOT NULL AND b.hour_start >= h.entered_at
+    GROUP BY h.room_id, b.hour_start
+),
+peaks AS (
+    SELECT room_id, date_trunc('hour', at) AS hour_start, occupancy FROM running
+    UNION ALL
+    SELECT room_id, hour_start, occupancy FROM at_hour_start
+)
+INSERT INTO room_occupancy_hourly (room_id, hour_start, visits, distinct_tags, dwell_seconds, peak_occupancy)
+SELECT room_id, hour_start, 0, 0, 0, max(occupancy)
+FROM peaks
+GROUP BY room_id, hour_start
+ON CONFLICT (room_id, hour_start) DO UPDATE
+SET peak_occupancy = greatest(room_occupancy_hourly.peak_occupancy, excluded.peak_occupancy)
+"""
+
+
+def backfill():
+    """Replace the rollup with one computed from the full history."""
+    db = SessionLocal()
+
+    try:
+        start = time.perf_counter()
+        print("Rebuilding room_occupancy_hourly...")
+
+        db.execute(text("SET LOCAL TIME ZONE 'UTC'"))  # date_trunc buckets are UTC hours
+        db.execute(text("LOCK TABLE room_occupancy_hourly IN EXCLUSIVE MODE"))
+        deleted = db.execute(text("DELETE FROM room_occupancy_hourly")).rowcount
+        print(f"✓ Removed {deleted} existing rows")
+
+        inserted = db.execute(text(CLOSED_VISITS)).rowcount
+        print(f"✓ Aggregated closed visits into {inserted} room-hours")
+
+        peaks = db.execute(text(PEAKS)).rowcount
+        print(f"✓ Computed peak occupancy for {peaks} room-hours")
+
+        db.commit()
+        print(f"\n✅ Rollup rebuilt in {time.perf_counter() - start:.1f}s")
+    except Exception as e:
+        print(f"❌ Error rebuilding rollup: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    backfill()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark WebSocket broadcast cost per event with many connected dashboards.
+Run from backend/: python scripts/benchmark_broadcast.py [--connections 500] [--events 2000]
+
+Compares the old per-connection send_json loop (encode + print + log per client)
+with WebSocketManager.broadcast (encode once, shared frame, per-client writer task).
+Sockets are in-process fakes and log output goes to /dev/null with the app's log
+format, so the numbers isolate server-side CPU cost.
+
+Two numbers are reported for the manager: the time broadcast() itself takes
+(what the event request waits for) and the time until every writer has sent.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.websocket_manager import WebSocketManager  # noqa: E402
+
+logger = logging.getLogger("benchmark")
+
+
+class FakeWebSocket:
+    """Accepts frames without doing I/O."""
+
+    async def accept(self):
+        pass
+
+    async def send_json(self, data):
+        # Same encoding Starlette's send_json does
+        await self.send_text(json.dumps(data, separators=(",", ":"), ensure_ascii=False))
+
+    async def send_text(self, data):
+        pass
+
+    async def close(self, code=1000):
+        pass
+
+
+def sample_event(i: int) -> dict:
+    return {
+        "type": "LOCATION_UPDATE",
+        "tag_id": f"TAG_{i % 300:04d}",
+        "user_name": "Jane Doe",
+        "room": f"Room {100 + i % 40}",
+        "timestamp": 1700000000 + i
+    }
+
+
+async def bench_per_connection(connections: int, events: int, out) -> float:
+    """Old broadcast: await send_json on every connection in turn."""
+    sockets = {str(i): FakeWebSocket() for i in range(connections)}
+    start = time.perf_counter()
+    for i in range(events):
+        message = sample_event(i)
+        for connection_id, websocket in sockets.items():
+            print("yesyseydcsdc", file=out)
+            await websocket.send_json(message)
+            print(f"Message sent to {connection_id}: {message.get('type')}", file=out)
+            logger.info(f"Message sent to {connection_id}: {message.get('type')}")
+            logger.debug(f"Message sent to {connection_id}: {message.get('type')}")
+    return time.perf_counter() - start
+
+
+async def bench_manager(connections: int, events: int):
+    """WebSocketManager: encode once, enqueue, writers drain."""
+    manager = WebSocketManager(queue_size=events + 1, send_timeout=5.0)
+    for _ in range(connections):
+        await manager.connect(FakeWebSocket())
+
+    enqueue = 0.0
+    start = time.perf_counter()
+    for i in range(events):
+        before = time.perf_counter()
+        await manager.broadcast(sample_event(i))
+        enqueue += time.perf_counter() - before
+    # Include the writers' send time, not just enqueueing
+    while any(not c.queue.empty() for c in manager.active_connections.values()):
+        await asyncio.sleep(0)
+    delivered = time.perf_counter() - start
+
+    await manager.close()
+    return enqueue, delivered
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--connections", type=int, default=500)
+    parser.add_argument("--events", type=int, default=2000)
+    args = parser.parse_args()
+
+    with open(os.devnull, "w") as out:
+        # INFO logging with the app's format, written to /dev/null so the terminal is not the bottleneck
+        logging.basicConfig(
+            level=logging.INFO,
+            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            stream=out
+        )
+
+        print(f"Broadcasting {args.events} events to {args.connections} connections...")
+        old = await bench_per_connection(args.connections, args.events, out)
+        enqueue, delivered = await bench_manager(args.connections, args.events)
+
+    rows = (
+        ("per-connection send_json", old),
+        ("broadcast() call", enqueue),
+        ("broadcast() + delivery", delivered),
+    )
+    for label, elapsed in rows:
+        print(f"  {label:26s} {elapsed:8.3f}s total  {elapsed / args.events * 1000:8.3f} ms/event")
+    print(f"  event path speedup: {old / enqueue:.1f}x   end-to-end speedup: {old / delivered:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark the missing-person sweep at scale.
+Run from backend/ after migrations: python scripts/benchmark_missing_sweep.py [--tags 10000] [--stale 0.05]
+
+Inserts N active tags (with users, live locations and one room) inside a
+transaction, compares the old per-tag query pattern (1 query + 3 per stale
+tag) with MissingPersonDetector.stale_tags_query, prints the query plan and
+rolls everything back, so the database is left unchanged.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, text  # noqa: E402
+
+from app.database import SessionLocal  # noqa: E402
+from app.models.building import Building  # noqa: E402
+from app.models.floor import Floor  # noqa: E402
+from app.models.room import Room  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.models.tag import Tag  # noqa: E402
+from app.models.live_location import LiveLocation  # noqa: E402
+from app.services.missing_person_detector import MissingPersonDetector  # noqa: E402
+from app.utils.enums import TagStatus  # noqa: E402
+
+
+def seed(db, tags: int, stale_fraction: float, now: datetime, threshold: timedelta):
+    """Insert benchmark rows (caller rolls back)."""
+    building = Building(name="Benchmark Building")
+    db.add(building)
+    db.flush()
+    floor = Floor(building_id=building.id, floor_number=1)
+    db.add(floor)
+    db.flush()
+    room = Room(floor_id=floor.id, room_name="Benchmark Room", room_type="Ward")
+    db.add(room)
+    db.flush()
+
+    stale_every = max(1, round(1 / stale_fraction)) if stale_fraction > 0 else None
+    users, tag_rows, live_rows = [], [], []
+    for i in range(tags):
+        stale = stale_every is not None and i % stale_every == 0
+        last_seen = now - (threshold * 2 if stale else timedelta(seconds=5))
+        users.append({"user_id": f"BENCH-{i:06d}", "name": f"Bench User {i}"})
+        tag_rows.append({
+            "tag_id": f"BENCH:{i:06d}",
+            "assigned_user_id": f"BENCH-{i:06d}",
+            "status": TagStatus.active,
+            "last_seen": last_seen
+        })
+        live_rows.append({"tag_id": f"BENCH:{i:06d}", "room_id": room.id, "updated_at": last_seen})
+
+    db.execute(User.__table__.insert(), users)
+    db.execute(Tag.__table__.insert(), tag_rows)
+    db.execute(LiveLocation.__table__.insert(), live_rows)
+    db.execute(text("ANALYZE tags"))
+
+
+def per_tag_sweep(db, now: datetime, threshold: timedelta) -> Tuple[int, int]:
+    """Old pattern: load all active tags, then 3 lookups per stale tag."""
+    queries = 1
+    found = 0
+    for tag_id, assigned_user_id, last_seen in db.execute(
+        select(Tag.tag_id, Tag.assigned_user_id, Tag.last_seen).where(Tag.status == TagStatus.active)
+    ):
+        if not last_seen or now - last_seen <= threshold:
+            continue
+        live = db.execute(select(LiveLocation).where(LiveLocation.tag_id == tag_id)).scalar_one_or_none()
+        if live and live.room_id:
+            db.execute(select(Room.room_name).where(Room.id == live.room_id)).scalar()
+        if assigned_user_id:
+            db.execute(select(User.name).where(User.user_id == assigned_user_id)).scalar()
+        queries += 3
+        found += 1
+    return found, queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tags", type=int, default=10000)
+    parser.add_argument("--stale", type=float, default=0.05, help="fraction of tags past the threshold")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    threshold = timedelta(seconds=300)
+    now = datetime.now(timezone.utc)
+    db = SessionLocal()
+
+    try:
+        print(f"Seeding {args.tags} active tags ({args.stale:.0%} stale)...")
+        seed(db, args.tags, args.stale, now, threshold)
+        query = MissingPersonDetector.stale_tags_query(now - threshold)
+
+        old_times, new_times = [], []
+        for _ in range(args.runs):
+            db.expunge_all()
+            start = time.perf_counter()
+            old_found, old_queries = per_tag_sweep(db, now, threshold)
+            old_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            new_found = len(db.execute(query).all())
+            new_times.append(time.perf_counter() - start)
+
+        old_ms, new_ms = min(old_times) * 1000, min(new_times) * 1000
+        print(f"  per-tag queries   {old_ms:9.1f} ms  ({old_queries} queries, {old_found} stale)")
+        print(f"  set-based query   {new_ms:9.1f} ms  (1 query, {new_found} stale)")
+        print(f"  speedup: {old_ms / new_ms:.1f}x  (best of {args.runs})")
+
+        compiled = query.compile(db.bind, compile_kwargs={"literal_binds": True})
+        print("\nQuery plan:")
+        for (line,) in db.connection().exec_driver_sql(f"EXPLAIN ANALYZE {compiled}"):
+            print(f"  {line}")
+    finally:
+        db.rollback()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -44,7 +44,14 @@ api.interceptors.response.use(
 // Live Positions
 export const fetchLivePositions = async () => {
   try {
+    // Responses are paginated: follow nextCursor to collect every position
     const response = await api.get('/positions/live');
+    let cursor = response.nextCursor;
+    while (cursor) {
+      const page = await api.get('/positions/live', { params: { after: cursor } });
+      response.positions = response.positions.concat(page.positions);
+      cursor = page.nextCursor;
+    }
     return response;
   } catch (error) {
     console.error('Error fetching live positions:', error);